@@ -0,0 +1,45 @@
+# async_database.py
+
+import asyncio
+import functools
+import inspect
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+
+# --- Async Data-Access Layer ---
+# database.py ထဲက function များ (pymongo - synchronous) ကို bounded thread pool ပေါ်မှာ run ပြီး
+# asyncio handler များက `await` လုပ်နိုင်အောင် ပြန်ထုတ်ပေးပါသည်။
+# (Mongo round trip တစ်ခု နှေးနေလည်း PTB event loop တစ်ခုလုံး မရပ်သွားတော့ပါ)
+#
+# ဥပမာ:
+#     import async_database as adb
+#     user_doc = await adb.get_user(user_id)
+
+# Thread pool အရွယ်အစား (MongoClient ၏ connection pool ထက် မကျော်စေရ)
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="mongo")
+
+
+def _to_async(func):
+    """Sync DB function တစ်ခုကို executor ပေါ်မှာ run မယ့် coroutine function အဖြစ် ပြောင်းပါ။"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+# database.py ထဲမှာ သတ်မှတ်ထားတဲ့ public function အားလုံးကို (နာမည်တူ) async version ထုတ်ပါ
+for _name, _func in inspect.getmembers(db, inspect.isfunction):
+    if _func.__module__ == db.__name__ and not _name.startswith("_"):
+        globals()[_name] = _to_async(_func)
+
+del _name, _func
+
+
+def shutdown():
+    """Bot ပိတ်ချိန်မှာ thread pool ကို ရှင်းပါ။"""
+    _executor.shutdown(wait=False)
@@ -0,0 +1,8 @@
+# conftest.py
+# main.py / database.py က import လုပ်ချိန်မှာ env vars လိုအပ်ပါသည်။ (MongoClient က lazy - တကယ် မချိတ်)
+import os
+
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMIN_ID", "1")
+os.environ.setdefault("ADMIN_GROUP_ID", "-100")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=100")
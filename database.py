@@ -1,8 +1,15 @@
 # database.py
 
 import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+import csv
+import gzip
+import io
 import os
-from datetime import datetime
+import secrets
+import threading
+from datetime import datetime, timedelta
 
 # --- MongoDB Connection ---
 # Environment Variables များကို os module ဖြင့် import လုပ်ပါ
@@ -24,19 +31,149 @@ try:
     db = client["mlbb_bot_db"] # Database နာမည်
     
     users_collection = db["users"]
+    orders_collection = db["orders"] # (အသစ်) Order မှတ်တမ်းများ (user doc ထဲက ခွဲထုတ်)
+    topups_collection = db["topups"] # (အသစ်) Topup မှတ်တမ်းများ (user doc ထဲက ခွဲထုတ်)
     prices_collection = db["prices"]
     pubg_prices_collection = db["pubg_prices"] # (PUBG အတွက် ထည့်ထား)
-    auth_collection = db["authorized_users"]
+    auth_collection = db["authorized_users"] # (auth_meta version doc + auth_list အဟောင်း)
+    authorized_index_collection = db["authorized_index"] # (အသစ်) User တစ်ယောက် document တစ်ခု (_id = user_id)
     admins_collection = db["admins"]
     settings_collection = db["settings"]
     auto_delete_collection = db["auto_delete_messages"] # (Auto-Delete အတွက် အသစ်)
     all_groups_collection = db["all_groups"] # (Broadcast အတွက် အသစ်)
+    daily_stats_collection = db["daily_stats"] # (အသစ်) ရက်အလိုက် အရောင်း rollup (_id = "YYYY-MM-DD")
+    counters_collection = db["counters"] # (အသစ်) Order/Topup ID sequence များ (_id = prefix)
+    outbox_collection = db["outbox"] # (အသစ်) ပို့ရန်ကျန်သော notification များ (chat တစ်ခု document တစ်ခု)
+    outbox_dead_collection = db["outbox_dead"] # (အသစ်) ပြန်ကြိုးစားလို့ မရတော့သော notification များ
+    broadcasts_collection = db["broadcasts"] # (အသစ်) Broadcast job state (ပြန်စနိုင်ရန် cursor checkpoint)
 
     print("✅ MongoDB database နှင့် အောင်မြင်စွာ ချိတ်ဆက်ပြီးပါပြီ။")
 except Exception as e:
     print(f"❌ MongoDB ချိတ်ဆက်ရာတွင် Error ဖြစ်နေပါသည်: {e}")
     client = None
 
+# --- (အသစ်) Index Definitions ---
+# Query path တိုင်းအတွက် လိုအပ်တဲ့ index များ (collection name -> [(keys, options)])
+# Bot စတက်ချိန် (post_init) မှာ ensure_indexes() က မရှိသေးတာတွေကို ဆောက်ပေးပါသည်။
+ASC, DESC = pymongo.ASCENDING, pymongo.DESCENDING
+
+INDEX_SPECS = {
+    "users": [
+        ([("user_id", ASC)], {"unique": True}),                 # get_user, update_balance, place_order
+    ],
+    "orders": [
+        ([("order_id", ASC)], {"unique": True}),                # find_and_update_order, get_order_by_id
+        ([("user_id", ASC), ("timestamp", DESC), ("_id", DESC)], {}), # history (keyset page), export
+        ([("status", ASC), ("timestamp", DESC)], {}),
+        ([("status", ASC), ("confirmed_at", ASC)], {}),         # rebuild_daily_stats
+    ],
+    "topups": [
+        ([("topup_id", ASC)], {"unique": True}),                # find_and_update_topup, get_topup_by_id
+        ([("user_id", ASC), ("status", ASC), ("timestamp", DESC)], {}), # pending topup checks
+        ([("user_id", ASC), ("timestamp", DESC), ("_id", DESC)], {}), # history (keyset page), export
+        ([("status", ASC), ("timestamp", DESC)], {}),
+        ([("status", ASC), ("approved_at", ASC)], {}),          # rebuild_daily_stats
+    ],
+    "auto_delete_messages": [
+        ([("delete_at", ASC)], {}),                             # get_expired_messages, get_next_delete_deadline
+    ],
+    "outbox": [
+        ([("status", ASC), ("next_attempt_at", ASC)], {}),      # claim_outbox_messages
+    ],
+    "broadcasts": [
+        ([("status", ASC)], {}),                                # get_running_broadcasts
+    ],
+}
+
+def _existing_indexes(collection):
+    """Collection ထဲရှိပြီးသား index များ (keys tuple -> index info)"""
+    return {
+        tuple((field, int(direction)) for field, direction in info["key"]): dict(info, name=name)
+        for name, info in collection.index_information().items()
+    }
+
+def _has_duplicates(collection, keys):
+    """Unique index မဆောက်ခင် keys တန်ဖိုး ထပ်နေတဲ့ document ရှိမရှိ စစ်ပါ။"""
+    group_id = {f"k{i}": f"${field}" for i, (field, _) in enumerate(keys)}
+    pipeline = [
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": 1},
+    ]
+    return bool(list(collection.aggregate(pipeline, allowDiskUse=True)))
+
+def ensure_indexes(allow_unique=True):
+    """
+    INDEX_SPECS ထဲက index များကို ဆောက်ပါ။ (ရှိပြီးသားဆိုရင် ကျော်)
+    Unique index က data ထပ်နေလို့ ဆောက်မရရင် non-unique အဖြစ်သာ ထားပြီး သတိပေးပါ။ (ဆောက်ပြီးသား စာရင်းမှာ မပါ)
+    allow_unique=False - Migration မတိုင်ခင် unique မပါဘဲ ဆောက်ပါ (နောက်တစ်ကြိမ် ခေါ်ရင် unique သို့ upgrade)
+    """
+    if not client: return []
+    created = []
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = _existing_indexes(collection)
+        for keys, options in specs:
+            if not allow_unique:
+                options = {key: value for key, value in options.items() if key != "unique"}
+            info = existing.get(tuple(keys))
+            if info and (not allow_unique or bool(info.get("unique")) == bool(options.get("unique"))):
+                continue
+            try:
+                if options.get("unique") and _has_duplicates(collection, keys):
+                    # (ပြင်ဆင်ပြီး) Unique ဆောက်လို့ မရနိုင်ရင် index ရှိပြီးသားကို မဖြုတ်ဘဲ ထားပါ (/indexreport မှာ ပြမည်)
+                    print(f"⚠️ {collection_name} {keys}: duplicate values, keeping a non-unique index")
+                    if not info:
+                        collection.create_index(keys)
+                    continue
+                if info:
+                    collection.drop_index(info["name"]) # Option မတူတဲ့ index အဟောင်း
+                collection.create_index(keys, **options)
+            except pymongo.errors.DuplicateKeyError as e:
+                # Duplicate စစ်ပြီးမှ ဝင်လာတဲ့ data - non-unique ဖြင့်သာ ပြန်ဆောက်ပါ
+                print(f"⚠️ {collection_name} {keys}: duplicate values, creating non-unique index instead ({e})")
+                collection.create_index(keys)
+                continue
+            except pymongo.errors.PyMongoError as e:
+                print(f"❌ {collection_name} {keys}: index ဆောက်ရာတွင် Error - {e}")
+                continue
+            created.append(f"{collection_name}.{'_'.join(field for field, _ in keys)}")
+    if created:
+        print(f"✅ Created {len(created)} indexes: {', '.join(created)}")
+    return created
+
+def get_index_report():
+    """
+    Collection တစ်ခုချင်းစီအတွက် index အခြေအနေကို ပြန်ပေးပါ။
+    {"missing": [...], "unused": [...], "undeclared": [...]}
+    unused = server restart ကတည်းက ($indexStats) တစ်ခါမှ မသုံးရသေးတဲ့ index
+    """
+    if not client: return {}
+    report = {}
+    for collection_name, specs in INDEX_SPECS.items():
+        collection = db[collection_name]
+        existing = _existing_indexes(collection)
+        declared = {tuple(keys) for keys, _ in specs}
+        missing = [
+            "_".join(field for field, _ in keys)
+            for keys, options in specs
+            if tuple(keys) not in existing
+            or bool(existing[tuple(keys)].get("unique")) != bool(options.get("unique"))
+        ]
+        undeclared = [
+            info["name"] for keys, info in existing.items()
+            if keys not in declared and info["name"] != "_id_"
+        ]
+        try:
+            unused = [
+                stat["name"] for stat in collection.aggregate([{"$indexStats": {}}])
+                if stat["name"] != "_id_" and stat.get("accesses", {}).get("ops", 0) == 0
+            ]
+        except pymongo.errors.PyMongoError:
+            unused = [] # $indexStats permission မရှိရင် ကျော်
+        report[collection_name] = {"missing": missing, "unused": unused, "undeclared": undeclared}
+    return report
+
 # --- User Functions ---
 
 def get_user(user_id):
@@ -44,10 +181,24 @@ def get_user(user_id):
     if not client: return None
     return users_collection.find_one({"user_id": str(user_id)})
     
-def get_all_users():
-    """User တွေအားလုံးရဲ့ data ကို list အဖြစ် ယူပါ။"""
-    if not client: return []
-    return list(users_collection.find({}))
+# (အသစ်) Handler များ (auth/pending-topup/balance/checkuser/affiliate) လိုအပ်တဲ့ field များသာ
+USER_CONTEXT_FIELDS = [
+    "user_id", "name", "username", "balance", "joined_at", "referred_by", "referral_earnings",
+    "order_count", "topup_count", "pending_topup_count", "pending_topup_amount",
+]
+
+def get_user_context(user_id):
+    """
+    (အသစ်) Update တစ်ခုအတွက် လိုအပ်တဲ့ user field များကို projection ဖြင့် ယူပါ။ User မရှိရင် None
+    (ပြင်ဆင်ပြီး) has_pending_topup ကို user doc ပေါ်က pending_topup_count counter ကနေ တွက်ပါ။
+    """
+    if not client: return None
+    projection = {field: 1 for field in USER_CONTEXT_FIELDS}
+    projection["_id"] = 0
+    user_doc = users_collection.find_one({"user_id": str(user_id)}, projection)
+    if user_doc:
+        user_doc["has_pending_topup"] = user_doc.get("pending_topup_count", 0) > 0
+    return user_doc
 
 def create_user(user_id, name, username, referrer_id=None): # <--- referrer_id=None ထည့်ပါ
     """User အသစ်ကို database တွင် ထည့်သွင်းပါ။ (Affiliate feature ပါ)"""
@@ -57,11 +208,14 @@ def create_user(user_id, name, username, referrer_id=None): # <--- referrer_id=N
         "name": name,
         "username": username,
         "balance": 0,
-        "orders": [],
-        "topups": [],
         "joined_at": datetime.now().isoformat(),
         "referred_by": str(referrer_id) if referrer_id else None, # <-- Affiliate Field
-        "referral_earnings": 0  # <-- Affiliate Field
+        "referral_earnings": 0,  # <-- Affiliate Field
+        # (အသစ်) Denormalized counters (order/topup state ပြောင်းတိုင်း $inc)
+        "order_count": 0,
+        "topup_count": 0,
+        "pending_topup_count": 0,
+        "pending_topup_amount": 0
     }
     users_collection.update_one(
         {"user_id": str(user_id)},
@@ -74,7 +228,24 @@ def update_user_profile(user_id, name, username):
     if not client: return None
     users_collection.update_one(
         {"user_id": str(user_id)},
-        {"$set": {"name": name, "username": username}}
+        # (ပြင်ဆင်ပြီး) Bot ကို ပြန်သုံးလာရင် inactive flag ကိုပါ ဖြုတ် (broadcast target ပြန်ဖြစ်)
+        {"$set": {"name": name, "username": username}, "$unset": {"inactive": "", "inactive_reason": "", "inactive_at": ""}}
+    )
+
+def mark_user_inactive(user_id, reason):
+    """(အသစ်) Bot ကို block ထား / account ဖျက်ထားတဲ့ user ကို broadcast target ကနေ ဖယ်ပါ။"""
+    if not client: return
+    users_collection.update_one(
+        {"user_id": str(user_id)},
+        {"$set": {"inactive": True, "inactive_reason": reason, "inactive_at": datetime.now().isoformat()}}
+    )
+
+def reactivate_user(user_id):
+    """(အသစ်) Inactive ဖြစ်နေတဲ့ user ကို ပြန် active လုပ်ပါ။ (Inactive မဟုတ်ရင် ဘာမှမပြောင်း)"""
+    if not client: return
+    users_collection.update_one(
+        {"user_id": str(user_id), "inactive": True},
+        {"$unset": {"inactive": "", "inactive_reason": "", "inactive_at": ""}}
     )
 
 def get_balance(user_id):
@@ -82,12 +253,13 @@ def get_balance(user_id):
     user = get_user(user_id)
     return user.get("balance", 0) if user else 0
 
-def update_balance(user_id, amount_change):
+def update_balance(user_id, amount_change, session=None):
     """User ၏ balance ကို တိုး/လျော့ ပါ။ (User ရှိပြီးသားဖြစ်ရမည်)"""
     if not client: return None
     users_collection.update_one(
         {"user_id": str(user_id)},
-        {"$inc": {"balance": amount_change}}
+        {"$inc": {"balance": amount_change}},
+        session=session
     )
 
 def set_balance(user_id, amount_to_set):
@@ -112,92 +284,558 @@ def update_referral_earnings(user_id, commission_amount):
     )
 
 # --- Order & Topup Functions ---
+# --- (အသစ်) Order / Topup ID Generator ---
+# ID = prefix + YYYYMMDDHHMMSS + sequence (6 လုံး)
+# Sequence ကို counters collection ထဲက $inc ဖြင့် block လိုက် ကြိုယူထားလို့
+# တစ်စက္ကန့်အတွင်း order အများကြီး ဝင်လာလည်း၊ bot replica အများကြီး run နေလည်း ID မထပ်ပါ။
 
-def add_order(user_id, order_data):
-    if not client: return None
-    users_collection.update_one(
-        {"user_id": str(user_id)},
-        {"$push": {"orders": order_data}}
+ID_BLOCK_SIZE = 50 # DB round trip တစ်ခါမှာ sequence ဘယ်နှခု ကြိုယူမလဲ
+_id_lock = threading.Lock()
+_id_blocks = {} # prefix -> [next_seq, last_seq]
+
+def _reserve_id_block(prefix):
+    doc = counters_collection.find_one_and_update(
+        {"_id": prefix},
+        {"$inc": {"seq": ID_BLOCK_SIZE}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER
     )
+    last_seq = doc["seq"]
+    return [last_seq - ID_BLOCK_SIZE + 1, last_seq]
+
+def next_id(prefix):
+    """ORD / PUBG / TOP စသည့် prefix အတွက် unique ID အသစ်ကို ထုတ်ပေးပါ။"""
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    if not client:
+        return f"{prefix}{timestamp}{secrets.token_hex(3).upper()}"
+    with _id_lock:
+        block = _id_blocks.get(prefix)
+        if not block or block[0] > block[1]:
+            block = _id_blocks[prefix] = _reserve_id_block(prefix)
+        seq = block[0]
+        block[0] += 1
+    return f"{prefix}{timestamp}{seq % 1000000:06d}"
 
-def add_topup(user_id, topup_data):
+# --- (အသစ်) Transaction Helper ---
+# Replica set / mongos ဆိုရင် state ပြောင်းခြင်းနဲ့ outbox ရေးခြင်းကို transaction တစ်ခုတည်းမှာ လုပ်ပါ။
+# Standalone server (transaction မရ) ဆိုရင် session မပါဘဲ အစဉ်လိုက် run ပြီး
+# မအောင်မြင်ရင် ကိုယ်တိုင် ပြန်ပြင် (compensate) ပါသည်။
+
+_transactions_supported = True
+
+def _run_transaction(operation):
+    """operation(session) ကို transaction ထဲမှာ run ပါ။ (မရရင် session=None ဖြင့်)"""
+    global _transactions_supported
+    if _transactions_supported:
+        try:
+            with client.start_session() as session:
+                return session.with_transaction(operation)
+        except pymongo.errors.OperationFailure as e:
+            if e.code != 20: # IllegalOperation - replica set မဟုတ်
+                raise
+            _transactions_supported = False
+            print("ℹ️ MongoDB transactions not supported; using compensating writes.")
+    return operation(None)
+
+# (ပြင်ဆင်ပြီး) Order/Topup များကို user document ထဲ $push မလုပ်တော့ဘဲ
+# သီးသန့် collection (orders / topups) ထဲမှာ user_id နဲ့ သိမ်းပါသည်။
+
+def add_order(user_id, order_data, session=None):
     if not client: return None
-    users_collection.update_one(
-        {"user_id": str(user_id)},
-        {"$push": {"topups": topup_data}}
-    )
+    order_doc = dict(order_data)
+    order_doc["user_id"] = str(user_id)
+    orders_collection.insert_one(order_doc, session=session)
 
-def find_and_update_order(order_id, updates):
-    """Order ID ဖြင့် order ကိုရှာပြီး update လုပ်ပါ။"""
+def place_order(user_id, order_data, notifications=None):
+    """
+    (Atomic) balance >= price ဖြစ်မှသာ ငွေနုတ်ပြီး order ကို မှတ်ပါ။ (notifications ကို outbox ထဲ တစ်ခါတည်း)
+    ငွေမလုံလောက်ရင် None၊ အောင်မြင်ရင် ငွေနုတ်ပြီးနောက် balance အမှန်ကို ပြန်ပေးပါ။
+    """
     if not client: return None
-    filter_query = {"orders.order_id": order_id, "orders.status": "pending"}
-    update_fields = {}
-    for key, value in updates.items():
-        update_fields[f"orders.$.{key}"] = value
-        
-    result = users_collection.find_one_and_update(
-        filter_query, {"$set": update_fields}
-    )
-    return result.get("user_id") if result else None
+    price = order_data["price"]
+
+    def operation(session):
+        user_doc = users_collection.find_one_and_update(
+            {"user_id": str(user_id), "balance": {"$gte": price}},
+            {"$inc": {"balance": -price, "order_count": 1}},
+            projection={"balance": 1},
+            return_document=pymongo.ReturnDocument.AFTER,
+            session=session
+        )
+        if not user_doc:
+            return None
+        try:
+            add_order(user_id, order_data, session=session)
+            enqueue_notifications(notifications, session=session)
+        except Exception:
+            if session is None:
+                # Order/outbox မှတ်လို့မရရင် နုတ်ထားတဲ့ငွေကို ပြန်ထည့်ပြီး order ကို ဖယ်ပါ
+                orders_collection.delete_one({"order_id": order_data.get("order_id"), "user_id": str(user_id)})
+                users_collection.update_one({"user_id": str(user_id)}, {"$inc": {"balance": price, "order_count": -1}})
+            raise
+        return user_doc.get("balance", 0)
+
+    return _run_transaction(operation)
 
-def find_and_update_topup(topup_id, updates):
-    """Topup ID ဖြင့် topup ကိုရှာပြီး update လုပ်ပါ။"""
+def add_topup(user_id, topup_data, notifications=None):
+    """Topup request ကို မှတ်ပြီး admin notifications ကို outbox ထဲ တစ်ခါတည်း ထည့်ပါ။"""
     if not client: return None
-    filter_query = {"topups.topup_id": topup_id, "topups.status": "pending"}
-    update_fields = {}
-    for key, value in updates.items():
-        update_fields[f"topups.$.{key}"] = value
-        
-    result = users_collection.find_one_and_update(
-        filter_query, {"$set": update_fields}
-    )
-    
-    if result:
-        user_id = result.get("user_id")
-        # Topup approve ဖြစ်ရင် balance ပါ တစ်ခါတည်း တိုးပေး
-        if updates.get("status") == "approved":
-            # Find the exact amount from the matched topup
-            topup_amount = 0
-            for topup in result.get("topups", []):
-                if topup.get("topup_id") == topup_id:
-                    topup_amount = topup.get("amount", 0)
-                    break
-            if topup_amount > 0:
-                update_balance(user_id, topup_amount)
+
+    amount = topup_data.get("amount", 0)
+    pending_inc = {"topup_count": 1, "pending_topup_count": 1, "pending_topup_amount": amount}
+
+    def operation(session):
+        topup_doc = dict(topup_data)
+        topup_doc["user_id"] = str(user_id)
+        topups_collection.insert_one(topup_doc, session=session)
+        try:
+            users_collection.update_one({"user_id": str(user_id)}, {"$inc": pending_inc}, session=session)
+            enqueue_notifications(notifications, session=session)
+        except Exception:
+            if session is None:
+                topups_collection.delete_one({"_id": topup_doc["_id"]})
+                users_collection.update_one(
+                    {"user_id": str(user_id)}, {"$inc": {key: -value for key, value in pending_inc.items()}}
+                )
+            raise
+
+    return _run_transaction(operation)
+
+def _reset_to_pending(collection, doc_id, updates):
+    """(Compensation) $set လုပ်ခဲ့တဲ့ status ပြောင်းမှုကို ပြန်ဖျက်ပြီး pending အဖြစ် ပြန်ထားပါ။ (Admin ပြန်လုပ်နိုင်ရန်)"""
+    unset = {field: "" for field in updates if field != "status"}
+    update = {"$set": {"status": "pending"}}
+    if unset:
+        update["$unset"] = unset
+    collection.update_one({"_id": doc_id}, update)
+
+def find_and_update_order(order_id, updates, notifications=None):
+    """
+    Order ID ဖြင့် pending order ကိုရှာပြီး update လုပ်ပါ။
+    Confirm ဆိုရင် report rollup ကိုပါ၊ cancel ဆိုရင် ငွေပြန်အမ်းခြင်းကိုပါ တစ်ခါတည်း လုပ်ပါ။
+    """
+    if not client: return None
+
+    def operation(session):
+        result = orders_collection.find_one_and_update(
+            {"order_id": order_id, "status": "pending"},
+            {"$set": updates},
+            projection={"user_id": 1, "amount": 1, "price": 1},
+            session=session
+        )
+        if not result:
+            return None
+        user_id, price = result.get("user_id"), result.get("price", 0)
+        undo = [] # (Standalone server) မအောင်မြင်ရင် ပြန်ပြင်ရမယ့် အဆင့်များ
+        try:
+            # Order confirm ဖြစ်ရင် daily_stats rollup ကိုပါ တစ်ခါတည်း တိုး
+            if updates.get("status") == "confirmed":
+                record_order_stat(result, updates.get("confirmed_at"), session=session)
+                undo.append(lambda: record_order_stat(result, updates.get("confirmed_at"), sign=-1))
+            elif updates.get("status") == "cancelled":
+                update_balance(user_id, price, session=session) # Refund
+                undo.append(lambda: update_balance(user_id, -price))
+            enqueue_notifications(notifications, session=session)
+        except Exception:
+            if session is None:
+                for step in reversed(undo):
+                    step()
+                _reset_to_pending(orders_collection, result["_id"], updates)
+            raise
         return user_id
-    return None
 
-def get_user_orders(user_id, limit=999999999):
-    user = get_user(user_id)
-    if not user: return []
-    # Sort descending by timestamp
-    orders = sorted(user.get("orders", []), key=lambda x: x.get('timestamp', ''), reverse=True)
-    return orders[:limit]
+    return _run_transaction(operation)
 
-def get_user_topups(user_id, limit=999999999):
-    user = get_user(user_id)
-    if not user: return []
-    # Sort descending by timestamp
-    topups = sorted(user.get("topups", []), key=lambda x: x.get('timestamp', ''), reverse=True)
-    return topups[:limit]
+def find_and_update_topup(topup_id, updates, notifications=None):
+    """
+    Topup ID ဖြင့် pending topup ကိုရှာပြီး update လုပ်ပါ။
+    notifications - list သို့မဟုတ် (update ပြီးသား user doc ကိုယူပြီး list ပြန်ပေးမယ့်) function
+    Update ပြီးသား user doc (user_id, name, balance, referred_by) ကို ပြန်ပေးပါ။ (မတွေ့ရင် None)
+    """
+    if not client: return None
 
-def get_order_by_id(order_id):
-    """Nested array ထဲက order ကို ID နဲ့ဆွဲထုတ်ပါ။"""
+    def operation(session):
+        # (update မလုပ်ခင်) document ကို ပြန်ယူ - amount ကို သုံးဖို့
+        result = topups_collection.find_one_and_update(
+            {"topup_id": topup_id, "status": "pending"},
+            {"$set": updates},
+            projection={"user_id": 1, "amount": 1},
+            session=session
+        )
+        if not result:
+            return None
+        user_id = result.get("user_id")
+        topup_amount = result.get("amount", 0)
+        # (ပြင်ဆင်ပြီး) Pending counter များ လျော့ + approve ဖြစ်ရင် balance ပါ update တစ်ခုတည်းနဲ့ တိုးပေး
+        user_inc = {"pending_topup_count": -1, "pending_topup_amount": -topup_amount}
+        if updates.get("status") == "approved" and topup_amount > 0:
+            user_inc["balance"] = topup_amount
+        undo = [] # (Standalone server) မအောင်မြင်ရင် ပြန်ပြင်ရမယ့် အဆင့်များ
+        try:
+            # (ပြင်ဆင်ပြီး) Update ပြီးသား balance ကို notification မှာ ပြနိုင်ရန် AFTER document ကို ယူပါ
+            user_doc = users_collection.find_one_and_update(
+                {"user_id": str(user_id)},
+                {"$inc": user_inc},
+                projection={"_id": 0, "user_id": 1, "name": 1, "balance": 1, "referred_by": 1},
+                return_document=pymongo.ReturnDocument.AFTER,
+                session=session
+            ) or {"user_id": user_id}
+            undo.append(lambda: users_collection.update_one(
+                {"user_id": str(user_id)}, {"$inc": {key: -value for key, value in user_inc.items()}}
+            ))
+            if updates.get("status") == "approved":
+                # daily_stats rollup ကိုပါ တစ်ခါတည်း တိုး
+                record_topup_stat(topup_amount, updates.get("approved_at"), session=session)
+                undo.append(lambda: record_topup_stat(topup_amount, updates.get("approved_at"), sign=-1))
+            enqueue_notifications(notifications(user_doc) if callable(notifications) else notifications, session=session)
+        except Exception:
+            if session is None:
+                for step in reversed(undo):
+                    step()
+                _reset_to_pending(topups_collection, result["_id"], updates)
+            raise
+        return user_doc
+
+    return _run_transaction(operation)
+
+def find_pending_topup(user_id, amount):
+    """User ၏ (နောက်ဆုံး) pending topup ကို amount ဖြင့် ရှာပါ။"""
     if not client: return None
-    result = users_collection.find_one(
-        {"orders.order_id": order_id},
-        {"_id": 0, "orders.$": 1}
+    return topups_collection.find_one(
+        {"user_id": str(user_id), "status": "pending", "amount": amount},
+        {"_id": 0},
+        sort=[("timestamp", pymongo.DESCENDING)]
+    )
+
+def backfill_user_counters():
+    """
+    (အသစ်) order_count / topup_count / pending_topup_* counter မရှိသေးတဲ့ user များအတွက်
+    orders/topups collection ကနေ တွက်ပြီး ဖြည့်ပါ။ (တစ်ကြိမ်သာ အလုပ်လုပ်)
+    """
+    if not client: return 0
+    missing = {"order_count": {"$exists": False}}
+    if not users_collection.find_one(missing, {"_id": 1}):
+        return 0
+
+    order_counts, topup_counts = get_history_counts()
+    pending = {
+        doc["_id"]: doc for doc in topups_collection.aggregate([
+            {"$match": {"status": "pending"}},
+            {"$group": {"_id": "$user_id", "count": {"$sum": 1}, "amount": {"$sum": "$amount"}}}
+        ])
+    }
+    updates = []
+    for doc in users_collection.find(missing, {"user_id": 1}):
+        uid = doc.get("user_id")
+        updates.append(pymongo.UpdateOne({"_id": doc["_id"]}, {"$set": {
+            "order_count": order_counts.get(uid, 0),
+            "topup_count": topup_counts.get(uid, 0),
+            "pending_topup_count": pending.get(uid, {}).get("count", 0),
+            "pending_topup_amount": pending.get(uid, {}).get("amount", 0),
+        }}))
+    if updates:
+        users_collection.bulk_write(updates, ordered=False)
+        print(f"Backfilled account counters for {len(updates)} users.")
+    return len(updates)
+
+def get_history_counts():
+    """User တစ်ယောက်ချင်းစီ၏ order/topup အရေအတွက်ကို dict နှစ်ခုဖြင့် ပြန်ပေးပါ။"""
+    if not client: return {}, {}
+    group_stage = {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    order_counts = {doc["_id"]: doc["count"] for doc in orders_collection.aggregate([group_stage])}
+    topup_counts = {doc["_id"]: doc["count"] for doc in topups_collection.aggregate([group_stage])}
+    return order_counts, topup_counts
+
+# /history page တစ်ခုမှာ ပြမယ့် field များ
+# (_id က page cursor - timestamp တူနေတဲ့ row များကို ခွဲခြားရန်)
+HISTORY_FIELDS = {
+    "orders": {"order_id": 1, "amount": 1, "price": 1, "status": 1, "timestamp": 1},
+    "topups": {"topup_id": 1, "amount": 1, "status": 1, "timestamp": 1},
+}
+
+def get_history_page(user_id, kind, cursor=None, direction="older", limit=5):
+    """
+    (အသစ်) Order/Topup history ကို (timestamp, _id) keyset ဖြင့် page လိုက် ယူပါ။ ((user_id, timestamp, _id) index သုံး)
+    cursor - page အစွန်က row ၏ _id (hex)၊ timestamp တူတဲ့ row များ page ကြားမှာ မပျောက်/မထပ်စေရန် _id နဲ့ ခွဲ
+    direction="older" - cursor ထက် စောတာ၊ "newer" - cursor ထက် နောက်ကျတာ
+    (နောက်ဆုံးမှ အရင် အစဉ်ဖြင့် items, ဒီ direction မှာ ထပ်ရှိသေးလား) ကို ပြန်ပေးပါ။
+    """
+    if not client: return [], False
+    collection = orders_collection if kind == "orders" else topups_collection
+    query = {"user_id": str(user_id)}
+    anchor = None
+    if cursor:
+        try:
+            anchor = collection.find_one({"_id": ObjectId(cursor), "user_id": str(user_id)}, {"timestamp": 1})
+        except InvalidId:
+            anchor = None
+    if not anchor:
+        direction = "older" # Cursor row မရှိတော့ရင် (ဥပမာ history ဖျက်ပြီး) အသစ်ဆုံး page ကနေ ပြန်စ
+    if direction == "newer":
+        op, sort_order = "$gt", pymongo.ASCENDING
+    else:
+        op, sort_order = "$lt", pymongo.DESCENDING
+    if anchor:
+        query["$or"] = [
+            {"timestamp": {op: anchor.get("timestamp")}},
+            {"timestamp": anchor.get("timestamp"), "_id": {op: anchor["_id"]}},
+        ]
+    items = list(
+        collection.find(query, HISTORY_FIELDS[kind])
+        .sort([("timestamp", sort_order), ("_id", sort_order)])
+        .limit(limit + 1)
     )
-    return result.get("orders", [{}])[0] if result else None
+    has_more = len(items) > limit
+    items = items[:limit]
+    if direction == "newer":
+        items.reverse()
+    return items, has_more
+
+# --- (အသစ်) Export Functions ---
+# Cursor ကနေ row တစ်ကြောင်းချင်း file object ထဲ တိုက်ရိုက်ရေးပါသည်။ (List အပြည့် မဆောက်)
+
+EXPORT_BATCH_SIZE = 500
+
+HISTORY_EXPORT_COLUMNS = [
+    "type", "id", "game", "game_id", "server_id", "player_id", "amount", "price", "payment_method",
+    "status", "timestamp", "confirmed_at", "cancelled_at", "approved_at", "rejected_at",
+]
+
+def export_user_history_csv(user_id, fileobj):
+    """
+    (အသစ်) User တစ်ယောက်၏ order/topup history အားလုံးကို gzip CSV အဖြစ် fileobj ထဲ ရေးပါ။
+    ရေးလိုက်တဲ့ row အရေအတွက်ကို ပြန်ပေးပါ။
+    """
+    if not client: return 0
+    count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as gz:
+        with io.TextIOWrapper(gz, encoding="utf-8-sig", newline="") as text:
+            writer = csv.DictWriter(text, fieldnames=HISTORY_EXPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            for kind, collection, id_field in (("order", orders_collection, "order_id"),
+                                               ("topup", topups_collection, "topup_id")):
+                cursor = collection.find({"user_id": str(user_id)}, {"_id": 0}) \
+                    .sort("timestamp", pymongo.ASCENDING).batch_size(EXPORT_BATCH_SIZE)
+                for doc in cursor:
+                    writer.writerow(dict(doc, type=kind, id=doc.get(id_field)))
+                    count += 1
+    return count
+
+USER_EXPORT_COLUMNS = ["user_id", "name", "balance", "order_count", "topup_count", "referral_earnings"]
+
+# sort key -> (field, direction) (ဂဏန်းများ အများဆုံးကနေ စီ၊ name က A-Z)
+USER_EXPORT_SORTS = {
+    "balance": ("balance", pymongo.DESCENDING),
+    "orders": ("order_count", pymongo.DESCENDING),
+    "topups": ("topup_count", pymongo.DESCENDING),
+    "commission": ("referral_earnings", pymongo.DESCENDING),
+    "name": ("name", pymongo.ASCENDING),
+}
+
+def export_users_csv(fileobj, sort_by=None, balance_above=None, limit=None):
+    """
+    (အသစ်) User report ကို CSV အဖြစ် fileobj ထဲ ရေးပါ။ (Projected cursor - order/topup history မပါ)
+    sort_by - USER_EXPORT_SORTS key၊ balance_above - balance > balance_above သာ (0 = လက်ကျန်ရှိသူများ)၊ limit - ထိပ်ဆုံး N ယောက်
+    ရေးလိုက်တဲ့ row အရေအတွက်ကို ပြန်ပေးပါ။
+    """
+    if not client: return 0
+    query = {}
+    if balance_above is not None:
+        query["balance"] = {"$gt": balance_above}
+    projection = {field: 1 for field in USER_EXPORT_COLUMNS}
+    projection["_id"] = 0
+
+    cursor = users_collection.find(query, projection, allow_disk_use=True).batch_size(EXPORT_BATCH_SIZE)
+    if sort_by:
+        cursor = cursor.sort(*USER_EXPORT_SORTS[sort_by])
+    if limit:
+        cursor = cursor.limit(limit)
+
+    count = 0
+    # utf-8-sig - Excel မှာ ဖွင့်ရင် မြန်မာစာ မပျက်အောင်
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        writer = csv.DictWriter(text, fieldnames=USER_EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for user_doc in cursor:
+            writer.writerow(user_doc)
+            count += 1
+    finally:
+        text.detach() # flush ပြီး fileobj ကို ဆက်ဖွင့်ထားရန် (caller က ပို့ရမည်)
+    return count
+
+def get_order_by_id(order_id):
+    """Order ကို ID နဲ့ဆွဲထုတ်ပါ။"""
+    if not client: return None
+    return orders_collection.find_one({"order_id": order_id}, {"_id": 0})
 
 def get_topup_by_id(topup_id):
-    """Nested array ထဲက topup ကို ID နဲ့ဆွဲထုတ်ပါ။"""
+    """Topup ကို ID နဲ့ဆွဲထုတ်ပါ။"""
     if not client: return None
-    result = users_collection.find_one(
-        {"topups.topup_id": topup_id},
-        {"_id": 0, "topups.$": 1}
+    return topups_collection.find_one({"topup_id": topup_id}, {"_id": 0})
+
+def migrate_embedded_history():
+    """
+    (Migration) User document ထဲမှာ ကျန်နေသေးတဲ့ orders/topups array များကို
+    orders/topups collection များထဲ ရွှေ့ပြီး user document မှ ဖယ်ရှားပါ။
+    """
+    if not client: return 0
+    moved_users = 0
+    legacy_query = {"$or": [{"orders": {"$exists": True}}, {"topups": {"$exists": True}}]}
+    for user in users_collection.find(legacy_query, {"user_id": 1, "orders": 1, "topups": 1}):
+        user_id = user.get("user_id")
+        for order in user.get("orders", []):
+            order["user_id"] = user_id
+            orders_collection.update_one(
+                {"order_id": order.get("order_id"), "user_id": user_id, "timestamp": order.get("timestamp")},
+                {"$setOnInsert": order},
+                upsert=True
+            )
+        for topup in user.get("topups", []):
+            topup["user_id"] = user_id
+            topups_collection.update_one(
+                {"topup_id": topup.get("topup_id"), "user_id": user_id, "timestamp": topup.get("timestamp")},
+                {"$setOnInsert": topup},
+                upsert=True
+            )
+        users_collection.update_one({"_id": user["_id"]}, {"$unset": {"orders": "", "topups": ""}})
+        moved_users += 1
+    if moved_users:
+        print(f"✅ Migrated order/topup history for {moved_users} users.")
+    return moved_users
+
+# --- (အသစ်) Report Engine (MongoDB Aggregation) ---
+
+def _prefix_range(start, end):
+    """
+    ISO string prefix (YYYY / YYYY-MM / YYYY-MM-DD) အပိုင်းအခြားကို Mongo range query အဖြစ် ပြောင်းပါ။
+    ("~" သည် ISO timestamp ထဲက စာလုံးအားလုံးထက် ကြီးသဖြင့် end prefix နဲ့စတဲ့ value အားလုံး ပါဝင်ပါသည်)
+    """
+    return {"$gte": start, "$lt": end + "~"}
+
+def get_sales_report(start, end):
+    """
+    ရက်/လ/နှစ် အပိုင်းအခြား (ISO prefix) အတွက် confirmed order နှင့် approved topup စုစုပေါင်းကို
+    daily_stats rollup (ရက်တစ်ရက် document တစ်ခု) မှ DB ဘက်မှာ ပေါင်းပြီး ပြန်ပေးပါ။
+    (ဥပမာ: "2025-01-15", "2025-01", "2025")
+    """
+    report = {"total_sales": 0, "total_orders": 0, "total_topups": 0, "topup_count": 0}
+    if not client: return report
+    pipeline = [
+        {"$match": {"_id": _prefix_range(start, end)}},
+        {"$group": {
+            "_id": None,
+            "total_sales": {"$sum": "$sales_total"},
+            "total_orders": {"$sum": "$orders_count"},
+            "total_topups": {"$sum": "$topups_total"},
+            "topup_count": {"$sum": "$topups_count"},
+        }}
+    ]
+    result = list(daily_stats_collection.aggregate(pipeline))
+    if result:
+        for key in report:
+            report[key] = result[0].get(key, 0)
+    return report
+
+# --- (အသစ်) Daily Stats Rollup Functions ---
+
+def _stat_day(iso_time):
+    """ISO timestamp မှ rollup bucket ID (YYYY-MM-DD) ကို ယူပါ။"""
+    return (iso_time or datetime.now().isoformat())[:10]
+
+def _stat_item_key(item):
+    """Item နာမည်ကို Mongo field name အဖြစ် သုံးလို့ရအောင် ပြင်ပါ။ ('.' နှင့် '$' မပါရ)"""
+    return str(item).replace(".", "_").replace("$", "_") or "unknown"
+
+def record_order_stat(order, confirmed_at=None, session=None, sign=1):
+    """Confirm ဖြစ်သွားသော order ကို daily_stats ထဲ $inc ဖြင့် atomic ပေါင်းထည့်ပါ။ (sign=-1 - ပြန်နုတ်)"""
+    if not client: return
+    price = order.get("price", 0) * sign
+    item_key = _stat_item_key(order.get("amount"))
+    daily_stats_collection.update_one(
+        {"_id": _stat_day(confirmed_at)},
+        {"$inc": {
+            "orders_count": sign,
+            "sales_total": price,
+            f"items.{item_key}.count": sign,
+            f"items.{item_key}.total": price,
+        }},
+        upsert=True,
+        session=session
+    )
+
+def record_topup_stat(amount, approved_at=None, session=None, sign=1):
+    """Approve ဖြစ်သွားသော topup ကို daily_stats ထဲ $inc ဖြင့် atomic ပေါင်းထည့်ပါ။ (sign=-1 - ပြန်နုတ်)"""
+    if not client: return
+    daily_stats_collection.update_one(
+        {"_id": _stat_day(approved_at)},
+        {"$inc": {"topups_count": sign, "topups_total": amount * sign}},
+        upsert=True,
+        session=session
     )
-    return result.get("topups", [{}])[0] if result else None
+
+def rebuild_daily_stats():
+    """
+    orders/topups history မှ daily_stats rollup ကို အစမှ ပြန်တွက်ပါ။ (Backfill)
+    ရက်အရေအတွက် ပြန်ပေးပါ။
+    (သတိ) Aggregate နဲ့ ရေးချိန်ကြားမှာ confirm/approve ဖြစ်တဲ့ $inc များ ပျောက်နိုင်လို့ order မဝင်တဲ့အချိန်မှာ run ပါ။
+    """
+    if not client: return 0
+    # Rebuild မစခင် ရှိပြီးသား ရက်များ (Rebuild အတွင်း traffic က အသစ်ဆောက်တဲ့ bucket ကို မဖျက်မိစေရန်)
+    existing_days = {doc["_id"] for doc in daily_stats_collection.find({}, {"_id": 1})}
+    day_expr = {"$substrCP": [{"$ifNull": ["$confirmed_at", "$timestamp"]}, 0, 10]}
+    order_rows = orders_collection.aggregate([
+        {"$match": {"status": "confirmed"}},
+        {"$group": {
+            "_id": {"day": day_expr, "item": "$amount"},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$price"},
+        }}
+    ])
+    topup_rows = topups_collection.aggregate([
+        {"$match": {"status": "approved"}},
+        {"$group": {
+            "_id": {"$substrCP": [{"$ifNull": ["$approved_at", "$timestamp"]}, 0, 10]},
+            "count": {"$sum": 1},
+            "total": {"$sum": "$amount"},
+        }}
+    ])
+
+    days = {}
+    def bucket(day):
+        return days.setdefault(day, {
+            "_id": day, "orders_count": 0, "sales_total": 0,
+            "topups_count": 0, "topups_total": 0, "items": {}
+        })
+
+    for row in order_rows:
+        doc = bucket(row["_id"]["day"])
+        doc["orders_count"] += row["count"]
+        doc["sales_total"] += row["total"]
+        item = doc["items"].setdefault(_stat_item_key(row["_id"]["item"]), {"count": 0, "total": 0})
+        item["count"] += row["count"]
+        item["total"] += row["total"]
+    for row in topup_rows:
+        doc = bucket(row["_id"])
+        doc["topups_count"] += row["count"]
+        doc["topups_total"] += row["total"]
+
+    # (ပြင်ဆင်ပြီး) ရက်တစ်ရက်ချင်း upsert ဖြင့် အစားထိုးပါ (delete_many + insert_many ကြားမှာ confirm
+    # တစ်ခု ဝင်လာရင် DuplicateKeyError ဖြစ်ပြီး rollup တစ်ဝက်ပျက်နေတတ်သည်)
+    requests = [pymongo.ReplaceOne({"_id": day}, doc, upsert=True) for day, doc in days.items()]
+    stale_days = list(existing_days - set(days)) # History မရှိတော့တဲ့ ရက်များ
+    if stale_days:
+        requests.append(pymongo.DeleteMany({"_id": {"$in": stale_days}}))
+    if requests:
+        daily_stats_collection.bulk_write(requests, ordered=False)
+    return len(days)
+
+def ensure_daily_stats():
+    """daily_stats မရှိသေးပဲ history ရှိနေရင် (ပထမဆုံး deploy) တစ်ခါ backfill လုပ်ပါ။"""
+    if not client: return
+    if daily_stats_collection.estimated_document_count() == 0 and orders_collection.estimated_document_count() + topups_collection.estimated_document_count() > 0:
+        count = rebuild_daily_stats()
+        print(f"✅ daily_stats rollup backfilled ({count} days).")
 
 # --- Price Functions ---
 
@@ -232,38 +870,76 @@ def save_pubg_prices(prices_dict):
 
 # --- Authorization Functions ---
 
+# (ပြင်ဆင်ပြီး) Array document တစ်ခုတည်းအစား user တစ်ယောက် document တစ်ခု (_id = user_id) ဖြင့် သိမ်းပါ
+# _id index ကြောင့် ban/unban/auto-approve တွေက user အရေအတွက် ဘယ်လောက်ရှိရှိ constant-time ဖြစ်ပါသည်။
+
 def load_authorized_users():
     if not client: return set()
-    doc = auth_collection.find_one({"_id": "auth_list"})
-    return set(doc.get("users", [])) if doc else set()
+    return {doc["_id"] for doc in authorized_index_collection.find({}, {"_id": 1})}
 
 def add_authorized_user(user_id):
-    if not client: return
-    auth_collection.update_one(
-        {"_id": "auth_list"},
-        {"$addToSet": {"users": str(user_id)}},
+    """User ကို authorize လုပ်ပြီး auth version အသစ်ကို ပြန်ပေးပါ။"""
+    if not client: return None
+    authorized_index_collection.update_one(
+        {"_id": str(user_id)},
+        {"$setOnInsert": {"authorized_at": datetime.now().isoformat()}},
         upsert=True
     )
+    return _bump_auth_version()
 
 def remove_authorized_user(user_id):
-    if not client: return
-    auth_collection.update_one(
-        {"_id": "auth_list"},
-        {"$pull": {"users": str(user_id)}}
+    """User ၏ authorization ကို ဖြုတ်ပြီး auth version အသစ်ကို ပြန်ပေးပါ။"""
+    if not client: return None
+    authorized_index_collection.delete_one({"_id": str(user_id)})
+    return _bump_auth_version()
+
+def migrate_auth_list():
+    """
+    (Migration) auth_list array document အဟောင်းထဲက user များကို
+    per-user authorized_index collection ထဲ ရွှေ့ပြီး document အဟောင်းကို ဖျက်ပါ။
+    """
+    if not client: return 0
+    doc = auth_collection.find_one({"_id": "auth_list"})
+    if not doc:
+        return 0
+    users = doc.get("users", [])
+    now = datetime.now().isoformat()
+    if users:
+        authorized_index_collection.bulk_write([
+            pymongo.UpdateOne({"_id": str(uid)}, {"$setOnInsert": {"authorized_at": now}}, upsert=True)
+            for uid in users
+        ], ordered=False)
+    auth_collection.delete_one({"_id": "auth_list"})
+    _bump_auth_version()
+    print(f"✅ Migrated {len(users)} authorized users from auth_list.")
+    return len(users)
+
+def _bump_auth_version():
+    """Auth list ပြောင်းတိုင်း version ကို တိုးပါ။ (Bot instance တွေက cache ကို invalidate လုပ်ဖို့)"""
+    doc = auth_collection.find_one_and_update(
+        {"_id": "auth_meta"},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER
     )
+    return doc.get("version", 0)
+
+def get_auth_version():
+    """လက်ရှိ auth version ကို ယူပါ။ (Document သေးသေးလေး တစ်ခုတည်း)"""
+    if not client: return 0
+    doc = auth_collection.find_one({"_id": "auth_meta"}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
 
 # --- Admin Functions ---
 
 def load_admin_ids(default_owner_id):
+    """Admin ID များကို ဖတ်ရုံသာ (document မရှိရင် owner တစ်ယောက်တည်း)"""
     if not client: return [default_owner_id]
-    doc = admins_collection.find_one({"_id": "admin_list"})
-    if doc:
-        admin_list = doc.get("admins", [])
-        if default_owner_id not in admin_list:
-            admin_list.append(default_owner_id)
-        return admin_list
-    admins_collection.insert_one({"_id": "admin_list", "admins": [default_owner_id]})
-    return [default_owner_id]
+    doc = admins_collection.find_one({"_id": "admin_list"}, {"admins": 1})
+    admin_list = doc.get("admins", []) if doc else []
+    if default_owner_id not in admin_list:
+        admin_list.append(default_owner_id)
+    return admin_list
 
 def add_admin(admin_id):
     if not client: return
@@ -387,32 +1063,257 @@ def remove_group(chat_id):
     if not client: return
     all_groups_collection.delete_one({"_id": chat_id})
 
+def migrate_group(old_chat_id, new_chat_id):
+    """(အသစ်) Supergroup သို့ ပြောင်းသွားတဲ့ group ID ကို ID အသစ်ဖြင့် အစားထိုးပါ။"""
+    if not client: return
+    old_doc = all_groups_collection.find_one({"_id": old_chat_id}) or {}
+    all_groups_collection.update_one(
+        {"_id": new_chat_id},
+        {"$set": {"name": old_doc.get("name"), "joined_at": old_doc.get("joined_at", datetime.now().isoformat()),
+                  "migrated_from": old_chat_id}},
+        upsert=True
+    )
+    all_groups_collection.delete_one({"_id": old_chat_id})
+
 def get_all_groups():
     """Bot ဝင်ထားသော Group ID များအားလုံးကို ယူပါ။"""
     if not client: return []
     # ID list တစ်ခုတည်းကိုပဲ ယူ
     return [doc["_id"] for doc in all_groups_collection.find({}, {"_id": 1})]
 
+# --- (အသစ်) Broadcast Job Functions ---
+# Broadcast တစ်ခု = document တစ်ခု
+# {_id, from_chat_id, message_id, send_to_users, should_pin, status: running/done/cancelled,
+#  phase: users/groups, cursor (နောက်ဆုံး ပို့ပြီးသား user_id / group _id), counters, progress message}
+
+def create_broadcast(broadcast_id, broadcast_data):
+    """Broadcast job အသစ်ကို DB ထဲ မှတ်ပါ။"""
+    if not client: return None
+    broadcast_doc = dict(
+        broadcast_data,
+        _id=broadcast_id,
+        status="running",
+        phase="users" if broadcast_data.get("send_to_users") else "groups",
+        cursor=None,
+        user_success=0, user_fail=0, group_success=0, group_fail=0,
+        created_at=datetime.now()
+    )
+    broadcasts_collection.insert_one(broadcast_doc)
+    return broadcast_doc
+
+def get_broadcast(broadcast_id):
+    if not client: return None
+    return broadcasts_collection.find_one({"_id": broadcast_id})
+
+def get_running_broadcasts():
+    """Bot ပြန်တက်ချိန်မှာ ဆက်ပို့ရမယ့် broadcast များ"""
+    if not client: return []
+    return list(broadcasts_collection.find({"status": "running"}))
+
+def get_broadcast_targets(phase, after=None, limit=200):
+    """
+    Broadcast ပို့ရမယ့် chat ID များကို cursor (after) နောက်ကနေ batch လိုက် ယူပါ။
+    (Projection သုံး - user document အပြည့် မဆွဲ)
+    """
+    if not client: return []
+    if phase == "users":
+        query = {"inactive": {"$ne": True}} # (အသစ်) Block ထားတဲ့ user များကို ကျော်
+        if after is not None:
+            query["user_id"] = {"$gt": after}
+        cursor = users_collection.find(query, {"_id": 0, "user_id": 1}).sort("user_id", ASC).limit(limit)
+        return [doc["user_id"] for doc in cursor]
+    query = {"_id": {"$gt": after}} if after is not None else {}
+    cursor = all_groups_collection.find(query, {"_id": 1}).sort("_id", ASC).limit(limit)
+    return [doc["_id"] for doc in cursor]
+
+def checkpoint_broadcast(broadcast_id, cursor, counters=None, phase=None):
+    """
+    Batch တစ်ခု ပို့ပြီးတိုင်း cursor နဲ့ အောင်မြင်/မအောင်မြင် အရေအတွက်ကို သိမ်းပါ။
+    Cancel လုပ်ထားပြီးသားဆိုရင် False ပြန်ပေးပါ။
+    """
+    if not client: return False
+    updates = {"$set": {"cursor": cursor, "updated_at": datetime.now()}}
+    if phase:
+        updates["$set"]["phase"] = phase
+    if counters:
+        updates["$inc"] = counters
+    result = broadcasts_collection.update_one({"_id": broadcast_id, "status": "running"}, updates)
+    return result.matched_count > 0
+
+def finish_broadcast(broadcast_id, status="done"):
+    """Broadcast ကို done / cancelled အဖြစ် ပိတ်ပြီး နောက်ဆုံး document ကို ပြန်ပေးပါ။"""
+    if not client: return None
+    return broadcasts_collection.find_one_and_update(
+        {"_id": broadcast_id, "status": "running"},
+        {"$set": {"status": status, "finished_at": datetime.now()}},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+
+def cancel_broadcasts(broadcast_id=None):
+    """Run နေသော broadcast (ID မပေးရင် အားလုံး) ကို cancel လုပ်ပါ။ Cancel ဖြစ်သွားတဲ့ အရေအတွက် ပြန်ပေး"""
+    if not client: return 0
+    query = {"status": "running"}
+    if broadcast_id:
+        query["_id"] = broadcast_id
+    result = broadcasts_collection.update_many(
+        query, {"$set": {"status": "cancelled", "finished_at": datetime.now()}}
+    )
+    return result.modified_count
+
+# --- (အသစ်) Notification Outbox Functions ---
+# Notification တစ်ခု = chat တစ်ခု document တစ်ခု
+# {chat_id, text, photo, reply_markup (dict), admin_group, auto_delete,
+#  status: pending/sending, attempts, next_attempt_at, created_at, last_error}
+
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_LOCK_TIMEOUT = 300 # စက္ကန့် - "sending" မှာ ကြာနေရင် (process ကျသွားလို့) ပြန်ယူ
+
+def enqueue_notifications(notifications, session=None):
+    """Notification များကို outbox ထဲ ထည့်ပါ။ (State ပြောင်းတဲ့ transaction ထဲကနေ ခေါ်ဖို့)"""
+    if not client or not notifications: return
+    now = datetime.now()
+    docs = [
+        dict(notification, status="pending", attempts=0, next_attempt_at=now, created_at=now)
+        for notification in notifications
+    ]
+    try:
+        outbox_collection.insert_many(docs, session=session)
+    except Exception:
+        if session is None:
+            # တစ်ဝက်တစ်ပျက် ဝင်သွားတာများကို ဖယ် (caller က state ပြောင်းမှုကို ပြန်ပြင်မည်)
+            outbox_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs if "_id" in doc]}})
+        raise
+
+def claim_outbox_messages(limit=20):
+    """ပို့ချိန်ရောက်ပြီးသား notification များကို "sending" အဖြစ် claim လုပ်ပြီး ပြန်ပေးပါ။"""
+    if not client: return []
+    now = datetime.now()
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "locked_at": {"$lte": now - timedelta(seconds=OUTBOX_LOCK_TIMEOUT)}},
+    ]}
+    claimed = []
+    for _ in range(limit):
+        doc = outbox_collection.find_one_and_update(
+            due,
+            {"$set": {"status": "sending", "locked_at": now}},
+            sort=[("next_attempt_at", pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        if not doc:
+            break
+        claimed.append(doc)
+    return claimed
+
+def complete_outbox_message(outbox_id):
+    """ပို့ပြီးသား (သို့) ကျော်ရမယ့် notification ကို outbox မှ ဖယ်ပါ။"""
+    if not client: return
+    outbox_collection.delete_one({"_id": outbox_id})
+
+def fail_outbox_message(outbox_id, error, retry_after=None, permanent=False):
+    """
+    ပို့မရတဲ့ notification ကို backoff ဖြင့် ပြန်စီပါ။
+    OUTBOX_MAX_ATTEMPTS ပြည့်ရင် (သို့) permanent error (bot block ခံရ) ဆိုရင် outbox_dead (dead-letter) ထဲ ရွှေ့ပါ။
+    """
+    if not client: return
+    doc = outbox_collection.find_one_and_update(
+        {"_id": outbox_id},
+        {"$inc": {"attempts": 1}, "$set": {"last_error": str(error)}},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    if not doc:
+        return
+    if permanent or doc["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+        doc["failed_at"] = datetime.now()
+        outbox_dead_collection.insert_one(doc)
+        outbox_collection.delete_one({"_id": outbox_id})
+        print(f"☠️ Outbox message to {doc.get('chat_id')} moved to dead-letter: {error}")
+        return
+    delay = retry_after if retry_after is not None else 5 * 2 ** (doc["attempts"] - 1)
+    outbox_collection.update_one(
+        {"_id": outbox_id},
+        {"$set": {"status": "pending", "next_attempt_at": datetime.now() + timedelta(seconds=delay)},
+         "$unset": {"locked_at": ""}}
+    )
+
+def retarget_outbox_messages(outbox_id, old_chat_id, new_chat_id):
+    """
+    (အသစ်) Group က supergroup သို့ ပြောင်းသွားရင် (ChatMigrated) notification ကို chat ID အသစ်ဖြင့် ချက်ချင်း ပြန်စီပါ။
+    အဲ့ဒီ group အတွက် ကျန်နေတဲ့ notification များကိုပါ ID အသစ်သို့ ပြောင်းပါ။
+    """
+    if not client: return
+    outbox_collection.update_one(
+        {"_id": outbox_id},
+        {"$inc": {"attempts": 1},
+         "$set": {"chat_id": new_chat_id, "status": "pending", "next_attempt_at": datetime.now(),
+                  "last_error": f"Chat migrated to {new_chat_id}"},
+         "$unset": {"locked_at": ""}}
+    )
+    outbox_collection.update_many({"chat_id": old_chat_id}, {"$set": {"chat_id": new_chat_id}})
+
+def get_outbox_stats():
+    """Outbox ထဲ ကျန်နေသော / dead-letter notification အရေအတွက်"""
+    if not client: return {"pending": 0, "dead": 0}
+    return {
+        "pending": outbox_collection.count_documents({}),
+        "dead": outbox_dead_collection.count_documents({}),
+    }
+
 # --- (အသစ်) Auto-Delete Functions ---
 
-def add_message_to_delete_queue(message_id, chat_id, timestamp):
-    """ဖျက်ပစ်ရမယ့် message ကို DB ထဲ မှတ်ထားပါ။"""
+def add_message_to_delete_queue(message_id, chat_id, delete_at, timestamp=None):
+    """ဖျက်ပစ်ရမယ့် message ကို ဖျက်ရမယ့်အချိန် (delete_at) နဲ့ DB ထဲ မှတ်ထားပါ။"""
     if not client: return
     auto_delete_collection.insert_one({
         "message_id": message_id,
         "chat_id": chat_id,
-        "timestamp": timestamp
+        "timestamp": timestamp or datetime.now(),
+        "delete_at": delete_at
     })
 
-def get_all_messages_to_delete():
-    """ဖျက်ရမယ့် message list အားလုံးကို ယူပါ။"""
+def get_expired_messages(now, limit=1000):
+    """(ပြင်ဆင်ပြီး) ဖျက်ရမယ့်အချိန် ရောက်ပြီးသား message များကိုသာ ယူပါ။ (delete_at index သုံး)"""
     if not client: return []
-    return list(auto_delete_collection.find({}))
+    return list(
+        auto_delete_collection.find({"delete_at": {"$lte": now}}, {"message_id": 1, "chat_id": 1})
+        .sort("delete_at", ASC).limit(limit)
+    )
 
-def remove_message_from_delete_queue(message_id):
-    """ဖျက်ပြီးသား message ကို DB ထဲက ရှင်းပါ။"""
-    if not client: return
-    auto_delete_collection.delete_one({"message_id": message_id})
+def get_next_delete_deadline():
+    """(အသစ်) Queue ထဲမှာ အစောဆုံး ဖျက်ရမယ့်အချိန် (မရှိရင် None)"""
+    if not client: return None
+    doc = auto_delete_collection.find_one({}, {"delete_at": 1}, sort=[("delete_at", ASC)])
+    return doc["delete_at"] if doc else None
+
+def remove_messages_from_delete_queue(queue_ids):
+    """(ပြင်ဆင်ပြီး) ဖျက်ပြီးသား message များကို DB ထဲက တစ်ခါတည်း ရှင်းပါ။"""
+    if not client or not queue_ids: return
+    auto_delete_collection.delete_many({"_id": {"$in": list(queue_ids)}})
+
+def migrate_delete_queue_timestamps(hours_to_keep):
+    """
+    (အသစ်) Queue entry အဟောင်းများကို ပြင်ပါ။ (တစ်ကြိမ်သာ အလုပ်လုပ်)
+    ISO string timestamp -> datetime, delete_at မရှိသေးရင် timestamp + hours_to_keep
+    """
+    if not client: return 0
+    updates = []
+    query = {"$or": [{"timestamp": {"$type": "string"}}, {"delete_at": {"$exists": False}}]}
+    for doc in auto_delete_collection.find(query, {"timestamp": 1, "delete_at": 1}):
+        timestamp = doc.get("timestamp")
+        if isinstance(timestamp, str):
+            try:
+                timestamp = datetime.fromisoformat(timestamp)
+            except ValueError:
+                timestamp = None
+        timestamp = timestamp or datetime.now()
+        delete_at = doc.get("delete_at") or timestamp + timedelta(hours=hours_to_keep)
+        updates.append(pymongo.UpdateOne(
+            {"_id": doc["_id"]}, {"$set": {"timestamp": timestamp, "delete_at": delete_at}}
+        ))
+    if updates:
+        auto_delete_collection.bulk_write(updates, ordered=False)
+        print(f"Migrated {len(updates)} auto-delete queue entries.")
+    return len(updates)
 
 def wipe_auto_delete_collection():
     """Auto-delete collection ကို ရှင်းပါ။ (wipe_all_data က ခေါ်ဖို့)"""
@@ -432,20 +1333,22 @@ def clear_user_history(user_id, balance_to_set=None):
         return False
         
     try:
-        # --- (ပြင်ဆင်ပြီး) Balance Reset Logic ထည့်ရန် ---
-        update_operation = {"$set": {"orders": [], "topups": []}}
-        
+        # User ရှိမရှိ အရင်စစ်
+        if not users_collection.find_one({"user_id": str(user_id)}, {"_id": 1}):
+            return False
+
+        # --- (ပြင်ဆင်ပြီး) orders/topups collection ထဲက user ၏ မှတ်တမ်းများကို ဖျက် ---
+        orders_collection.delete_many({"user_id": str(user_id)})
+        topups_collection.delete_many({"user_id": str(user_id)})
+
+        # (အသစ်) Counter များကိုပါ reset
+        user_updates = {"order_count": 0, "topup_count": 0, "pending_topup_count": 0, "pending_topup_amount": 0}
         if balance_to_set is not None:
-            update_operation["$set"]["balance"] = balance_to_set # Balance ကိုပါ တစ်ခါတည်း set လုပ်
-            
-        result = users_collection.update_one(
-            {"user_id": str(user_id)},
-            update_operation
-        )
+            user_updates["balance"] = balance_to_set # Balance ကိုပါ တစ်ခါတည်း set လုပ်
+        users_collection.update_one({"user_id": str(user_id)}, {"$set": user_updates})
         # --- (ပြီး) ---
-        
-        # user_id ရှိပြီး update ဖြစ်သွားရင် True ပြန်ပေးပါ
-        return result.modified_count > 0 or result.matched_count > 0
+
+        return True
     except Exception as e:
         print(f"Error clearing history for {user_id}: {e}")
         return False
@@ -465,12 +1368,19 @@ def wipe_all_data():
         # --- (ပြင်ဆင်ပြီး) ---
         collections_to_wipe = [
             users_collection,
+            orders_collection,
+            topups_collection,
             prices_collection,
             pubg_prices_collection, # PUBG collection ကိုပါ ထည့်ဖျက်
             auth_collection,
+            authorized_index_collection,
             admins_collection,
             settings_collection,
             all_groups_collection, # Group တွေကိုပါ ရှင်း
+            daily_stats_collection, # Report rollup ကိုပါ ရှင်း
+            outbox_collection,
+            outbox_dead_collection,
+            broadcasts_collection,
             auto_delete_collection # Auto-delete တွေကိုပါ ရှင်း
         ]
         
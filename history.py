@@ -3,7 +3,7 @@
 import os
 from telegram import Update
 from telegram.ext import ContextTypes
-import database as db
+import async_database as adb # Non-blocking DB layer
 
 # (ကိုကို့ main.py ထဲက Helper function တွေကို ဒီမှာ ပြန်ဆောက်ရပါမယ်)
 def is_owner(user_id):
@@ -38,13 +38,13 @@ async def clear_history_command(update: Update, context: ContextTypes.DEFAULT_TY
     target_user_id = args[0]
 
     # User ရှိမရှိ အရင်စစ်
-    user_data = db.get_user(target_user_id)
+    user_data = await adb.get_user(target_user_id)
     if not user_data:
         await update.message.reply_text(f"❌ User ID `{target_user_id}` ကို မတွေ့ရှိပါ။")
         return
 
     # DB function (Response 146) ကို ခေါ်ပါ
-    success = db.clear_user_history(target_user_id)
+    success = await adb.clear_user_history(target_user_id)
 
     if success:
         await update.message.reply_text(
@@ -1,10 +1,11 @@
 # main.py (Clone Bot function များ ဖြုတ်ပြီး)
 
-import asyncio, os, re
+import asyncio, os, re, tempfile
 from datetime import datetime, timedelta
 from telegram import Update, Bot, User
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler, ChatMemberHandler, TypeHandler, ApplicationHandlerStop
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ChatMember
+from telegram.error import RetryAfter, Forbidden, BadRequest, ChatMigrated
 
 # env.py file မှ settings များကို import လုပ်ပါ
 try:
@@ -26,6 +27,7 @@ except Exception as e:
 # Database module ကို import လုပ်ပါ
 try:
     import database as db
+    import async_database as adb # (အသစ်) Handler များအတွက် non-blocking DB layer
 except ImportError:
     print("Error: database.py file ကို မတွေ့ပါ။")
     exit()
@@ -43,11 +45,26 @@ except ImportError:
 
 # --- Global Variables ---
 
-# Authorized users - DB မှ တစ်ခါတည်း load လုပ်ပါ
-AUTHORIZED_USERS = db.load_authorized_users()
+# Authorized users - Bot စတက်ချိန် (post_init) မှာ DB မှ load လုပ်ပါ
+# (ပြင်ဆင်ပြီး) In-process authoritative set - command တိုင်း DB မှ ပြန် load မလုပ်တော့ပါ
+AUTHORIZED_USERS = set()
+AUTH_CACHE_VERSION = None # DB ထဲက auth version (cache invalidation အတွက်)
+AUTH_SYNC_INTERVAL = 60 # စက္ကန့် - auth version ကို ဘယ်နှစ်ခါ စစ်မလဲ
 
-# Admin IDs - DB မှ တစ်ခါတည်း load လုပ်ပါ
-ADMIN_IDS = db.load_admin_ids(ADMIN_ID)
+# Admin IDs - Bot စတက်ချိန် (post_init) မှာ DB မှ load လုပ်ပါ
+ADMIN_IDS = {ADMIN_ID}
+
+# --- (အသစ်) Telegram Metadata Cache (get_me, bot admin status, profile photos) ---
+# key -> (value, expires_at)
+_tg_cache = {}
+BOT_ADMIN_CACHE_TTL = 300 # စက္ကန့် - my_chat_member update ရောက်ရင် ချက်ချင်း update
+PROFILE_PHOTO_CACHE_TTL = 600 # စက္ကန့်
+
+# --- (အသစ်) Admin Notification Dispatcher ---
+NOTIFY_CONCURRENCY = 8 # တစ်ပြိုင်နက် ပို့မယ့် request အများဆုံး
+OUTBOX_POLL_INTERVAL = 5 # စက္ကန့် - outbox ကို ဘယ်နှစ်ခါ စစ်မလဲ (enqueue လုပ်တိုင်းလည်း ချက်ချင်း run)
+_notify_semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+_outbox_running = False
 
 # User states for restricting actions after screenshot (In-memory)
 user_states = {}
@@ -78,36 +95,63 @@ DEFAULT_AUTO_DELETE = {
     "hours": 24       # 24 နာရီ (1 Day)
 }
 
+# --- (အသစ်) Default ဈေးနှုန်းများ (Custom price မရှိရင် သုံးဖို့) ---
+DEFAULT_PRICES = {
+    "wp1": 6000, "wp2": 12000, "wp3": 18000, "wp4": 24000, "wp5": 30000,
+    "wp6": 36000, "wp7": 42000, "wp8": 48000, "wp9": 54000, "wp10": 60000,
+    "11": 950, "22": 1900, "33": 2850, "56": 4200, "86": 5100, "112": 8200,
+    "172": 10200, "257": 15300, "343": 20400, "429": 25500, "514": 30600,
+    "600": 35700, "706": 40800, "878": 51000, "963": 56100, "1049": 61200,
+    "1135": 66300, "1412": 81600, "2195": 122400, "3688": 204000,
+    "5532": 306000, "9288": 510000, "12976": 714000,
+    "55": 3500, "165": 10000, "275": 16000, "565": 33000
+}
+
+# (Default ဈေးနှုန်းများ - ကိုကို ကြိုက်သလို ဒီမှာ ပြင်နိုင်ပါတယ်)
+DEFAULT_PUBG_PRICES = {
+    "60uc": 1500, "325uc": 7500, "660uc": 15000,
+    "1800uc": 37500, "3850uc": 75000, "8100uc": 150000
+}
+
 # Global Settings Variable (Bot စတက်လျှင် DB မှ load လုပ်မည်)
 g_settings = {}
 
+# --- (အသစ်) Price Catalog (Default + Custom ကို တစ်ခါတည်း ပေါင်းထားသည်) ---
+# Bot စတက်ချိန်နဲ့ /setprice, /removeprice, /setpubgprice, /removepubgprice မှာသာ ပြန်တည်ဆောက်ပါ
+CUSTOM_PRICES = {}
+CUSTOM_PUBG_PRICES = {}
+PRICE_CATALOG = dict(DEFAULT_PRICES)
+PUBG_PRICE_CATALOG = dict(DEFAULT_PUBG_PRICES)
+PRICE_TEXT = "" # /price အတွက် ကြိုတင် render လုပ်ထားသော message
+PUBG_PRICE_TEXT = "" # /pubgprice အတွက် ကြိုတင် render လုပ်ထားသော message
+
 # Pending topup process (In-memory)
 pending_topups = {}
 
 # (Clone Bot Variables ဖြုတ်ထားပါသည်)
 # order_queue = asyncio.Queue() # <-- ဖြုတ်ထား
 
-def load_global_settings():
+async def load_global_settings():
     """
     Database မှ settings များကို g_settings global variable ထဲသို့ load လုပ်ပါ။
     """
     global g_settings
     # --- (ပြင်ဆင်ပြီး) Auto Delete Setting ကိုပါ load လုပ်ရန် ---
-    g_settings = db.load_settings(DEFAULT_PAYMENT_INFO, DEFAULT_MAINTENANCE, DEFAULT_AFFILIATE, DEFAULT_AUTO_DELETE)
+    g_settings = await adb.load_settings(DEFAULT_PAYMENT_INFO, DEFAULT_MAINTENANCE, DEFAULT_AFFILIATE, DEFAULT_AUTO_DELETE)
     print("✅ Global settings loaded from MongoDB.")
     
     # (Affiliate setting မရှိသေးရင် default ထည့်ပေးပါ)
     if "affiliate" not in g_settings:
         g_settings["affiliate"] = DEFAULT_AFFILIATE
-        db.update_setting("affiliate", DEFAULT_AFFILIATE)
+        await adb.update_setting("affiliate", DEFAULT_AFFILIATE)
     elif "percentage" not in g_settings["affiliate"]:
         g_settings["affiliate"]["percentage"] = DEFAULT_AFFILIATE["percentage"]
-        db.update_setting("affiliate.percentage", DEFAULT_AFFILIATE["percentage"])
+        await adb.update_setting("affiliate.percentage", DEFAULT_AFFILIATE["percentage"])
         
     # --- (အသစ်) Auto Delete setting မရှိသေးရင် default ထည့်ပေးပါ ---
     if "auto_delete" not in g_settings:
         g_settings["auto_delete"] = DEFAULT_AUTO_DELETE
-        db.update_setting("auto_delete", DEFAULT_AUTO_DELETE)
+        await adb.update_setting("auto_delete", DEFAULT_AUTO_DELETE)
     # --- (ပြီး) ---
 
 
@@ -122,31 +166,270 @@ def is_owner(user_id):
     return int(user_id) == ADMIN_ID
 
 def is_admin(user_id):
-    """Check if user is any admin (uses global list)"""
+    """Check if user is any admin (uses global set)"""
     return int(user_id) in ADMIN_IDS
 
-def load_authorized_users():
+async def load_authorized_users():
     """Reload authorized users from DB into global set"""
-    global AUTHORIZED_USERS
-    AUTHORIZED_USERS = db.load_authorized_users()
+    global AUTHORIZED_USERS, AUTH_CACHE_VERSION
+    AUTH_CACHE_VERSION = await adb.get_auth_version()
+    AUTHORIZED_USERS = await adb.load_authorized_users()
+
+def _track_auth_version(new_version):
+    """ကိုယ့်ဘက်က ပြောင်းလိုက်တဲ့ version ဆိုရင် cache ကို ပြန် load စရာမလို"""
+    global AUTH_CACHE_VERSION
+    if AUTH_CACHE_VERSION is not None and new_version == AUTH_CACHE_VERSION + 1:
+        AUTH_CACHE_VERSION = new_version
+
+async def authorize_user(user_id):
+    """(Write-through) DB ထဲ authorize လုပ်ပြီး local set ကိုပါ တစ်ခါတည်း update လုပ်ပါ။"""
+    new_version = await adb.add_authorized_user(user_id)
+    AUTHORIZED_USERS.add(str(user_id))
+    _track_auth_version(new_version)
+
+async def unauthorize_user(user_id):
+    """(Write-through) DB ထဲက authorization ဖြုတ်ပြီး local set ကိုပါ တစ်ခါတည်း update လုပ်ပါ။"""
+    new_version = await adb.remove_authorized_user(user_id)
+    AUTHORIZED_USERS.discard(str(user_id))
+    _track_auth_version(new_version)
+
+async def sync_authorized_users():
+    """DB ထဲက auth version ပြောင်းနေရင် (တခြား instance က ပြင်ထားရင်) cache ကို ပြန် load လုပ်ပါ။ Reload လုပ်ရင် True"""
+    if await adb.get_auth_version() == AUTH_CACHE_VERSION:
+        return False
+    await load_authorized_users()
+    return True
 
-def load_admin_ids_global():
-    """Reload admin IDs from DB into global list"""
+async def auth_cache_sync_job(context: ContextTypes.DEFAULT_TYPE):
+    """(Timer Job) တခြား bot instance က auth list ပြောင်းထားရင် version စစ်ပြီး cache ကို ပြန် load လုပ်ပါ။"""
+    try:
+        if await sync_authorized_users():
+            print(f"🔄 Authorized users cache reloaded (version {AUTH_CACHE_VERSION}).")
+        await load_admin_ids_global() # တခြား instance က /addadm, /unadm လုပ်ထားတာကိုပါ လိုက်ယူပါ
+    except Exception as e:
+        print(f"Error syncing auth cache: {e}")
+
+async def load_admin_ids_global():
+    """Reload admin IDs from DB into global set"""
     global ADMIN_IDS
-    ADMIN_IDS = db.load_admin_ids(ADMIN_ID)
+    ADMIN_IDS = set(await adb.load_admin_ids(ADMIN_ID))
+
+async def grant_admin(admin_id):
+    """(Write-through) DB ထဲ admin ထည့်ပြီး local set ကိုပါ တစ်ခါတည်း update လုပ်ပါ။"""
+    await adb.add_admin(admin_id)
+    ADMIN_IDS.add(int(admin_id))
+
+async def revoke_admin(admin_id):
+    """(Write-through) DB ထဲက admin ဖြုတ်ပြီး local set ကိုပါ တစ်ခါတည်း update လုပ်ပါ။"""
+    await adb.remove_admin(admin_id)
+    ADMIN_IDS.discard(int(admin_id))
+
+# --- (အသစ်) Telegram Metadata Cache Functions ---
+
+def _cache_get(key):
+    """Cache ထဲမှာ သက်တမ်းမကုန်သေးရင် (True, value) ပြန်ပေးပါ။"""
+    entry = _tg_cache.get(key)
+    if entry and (entry[1] is None or entry[1] > datetime.now()):
+        return True, entry[0]
+    return False, None
+
+def _cache_set(key, value, ttl=None):
+    """ttl (စက္ကန့်) မပေးရင် bot restart မချင်း သိမ်းထားပါ။"""
+    expires_at = datetime.now() + timedelta(seconds=ttl) if ttl else None
+    _tg_cache[key] = (value, expires_at)
+
+async def get_bot_user(bot):
+    """Bot ၏ User object (get_me) - bot identity မပြောင်းလို့ တစ်ကြိမ်သာ ခေါ်ပါ။"""
+    found, me = _cache_get("me")
+    if not found:
+        me = await bot.get_me()
+        _cache_set("me", me)
+    return me
+
+async def get_profile_photo_id(bot, user_id):
+    """User ၏ နောက်ဆုံး profile photo file_id (မရှိရင် None) ကို cache ဖြင့် ယူပါ။"""
+    key = ("photo", int(user_id))
+    found, photo_id = _cache_get(key)
+    if not found:
+        user_photos = await bot.get_user_profile_photos(user_id=int(user_id), limit=1)
+        photo_id = user_photos.photos[0][0].file_id if user_photos.total_count > 0 else None
+        _cache_set(key, photo_id, PROFILE_PHOTO_CACHE_TTL)
+    return photo_id
 
 async def is_bot_admin_in_group(bot, chat_id):
-    """Check if bot is admin in the group"""
+    """Check if bot is admin in the group (cached, invalidated by my_chat_member updates)"""
+    key = ("bot_admin", int(chat_id))
+    found, is_admin = _cache_get(key)
+    if found:
+        return is_admin
     try:
-        me = await bot.get_me()
+        me = await get_bot_user(bot)
         bot_member = await bot.get_chat_member(chat_id, me.id)
         is_admin = bot_member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
         print(f"Bot admin check for group {chat_id}: {is_admin}, status: {bot_member.status}")
+        _cache_set(key, is_admin, BOT_ADMIN_CACHE_TTL)
         return is_admin
     except Exception as e:
         print(f"Error checking bot admin status in group {chat_id}: {e}")
         return False
 
+async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Group ထဲမှာ bot ၏ status ပြောင်းသွားရင် (admin ပေး/ဖြုတ်, kick) cache ကို ချက်ချင်း update လုပ်ပါ။"""
+    member_update = update.my_chat_member
+    if not member_update:
+        return
+    new_status = member_update.new_chat_member.status
+
+    # (အသစ်) Private chat - user က bot ကို block / unblock လုပ်တာ
+    if member_update.chat.type == "private":
+        if new_status == ChatMember.BANNED:
+            await adb.mark_user_inactive(member_update.chat.id, "blocked")
+        elif new_status == ChatMember.MEMBER:
+            await adb.reactivate_user(member_update.chat.id)
+        return
+
+    if new_status in [ChatMember.LEFT, ChatMember.BANNED]:
+        await adb.remove_group(member_update.chat.id) # (အသစ်) Broadcast target ကနေ ဖယ်
+    is_admin = new_status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+    _cache_set(("bot_admin", member_update.chat.id), is_admin, BOT_ADMIN_CACHE_TTL)
+    print(f"Bot status changed in chat {member_update.chat.id}: {new_status}")
+
+# --- (အသစ်) Notification Outbox Functions ---
+# Notification များကို order/topup state ပြောင်းတဲ့ DB write နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပြီး
+# outbox_worker_job က ပြိုင်တူ ပို့ပါသည်။ (မအောင်မြင်ရင် backoff ဖြင့် ပြန်ကြိုးစား၊ နောက်ဆုံး dead-letter)
+
+def _retry_after_seconds(error):
+    """RetryAfter.retry_after က PTB version အလိုက် int / timedelta ဖြစ်နိုင်"""
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+def _is_unreachable_chat(error):
+    """(အသစ်) ဘယ်တော့မှ ပို့လို့မရတော့တဲ့ chat လား (bot block ခံရ / kick ခံရ / chat မရှိ)"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(
+        reason in error.message.lower() for reason in ("chat not found", "user is deactivated", "peer_id_invalid")
+    )
+
+async def prune_unreachable_chat(chat_id, error):
+    """
+    (အသစ်) ပို့မရတဲ့ chat ကို နောက် broadcast / fan-out များကနေ ဖယ်ပါ။
+    User (ID အပေါင်း) - inactive အဖြစ် မှတ်၊ Group (ID အနုတ်) - all_groups ကနေ ဖျက်
+    ChatMigrated ဆိုရင် group ID အသစ်ကို ပြန်ပေးပါ။
+    """
+    if isinstance(error, ChatMigrated):
+        await adb.migrate_group(chat_id, error.new_chat_id)
+        print(f"Group {chat_id} migrated to {error.new_chat_id}")
+        return error.new_chat_id
+    if not _is_unreachable_chat(error):
+        return None
+    if int(chat_id) > 0:
+        await adb.mark_user_inactive(chat_id, str(error))
+    else:
+        await adb.remove_group(chat_id)
+    print(f"Pruned unreachable chat {chat_id}: {error}")
+    return None
+
+def migrate_admin_group(old_chat_id, new_chat_id):
+    """Admin group supergroup ဖြစ်သွားရင် process အတွင်း ID အသစ်ကို သုံးပါ။ (env ADMIN_GROUP_ID ကိုလည်း ပြင်ရန်)"""
+    global ADMIN_GROUP_ID
+    if int(old_chat_id) == ADMIN_GROUP_ID:
+        ADMIN_GROUP_ID = int(new_chat_id)
+        print(f"⚠️ Admin group migrated to {new_chat_id}. Please update ADMIN_GROUP_ID in the environment.")
+
+def outbox_message(chat_id, text, reply_markup=None, photo=None, auto_delete=False, admin_group=False):
+    """Chat တစ်ခုအတွက် outbox document (dict) ကို တည်ဆောက်ပါ။"""
+    return {
+        "chat_id": chat_id,
+        "text": text,
+        "photo": photo,
+        "reply_markup": reply_markup.to_dict() if reply_markup else None,
+        "auto_delete": auto_delete,
+        "admin_group": admin_group,
+    }
+
+def admin_notifications(text, reply_markup=None, photo=None, group_text=None,
+                        group_reply_markup=None, exclude_admin=None,
+                        auto_delete_admins=False, auto_delete_group=False):
+    """
+    Admin DM များနဲ့ admin group (group_text ပေးမှ) အတွက် outbox document များ။
+    exclude_admin - လုပ်ဆောင်သူ admin ကိုယ်တိုင်ကို မပို့ရန်
+    auto_delete_* - ပို့ပြီးသား message များကို auto-delete queue ထဲ ထည့်ရန်
+    """
+    notifications = [
+        outbox_message(admin_id, text, reply_markup, photo, auto_delete_admins)
+        for admin_id in ADMIN_IDS if admin_id != exclude_admin
+    ]
+    if group_text:
+        notifications.append(outbox_message(
+            ADMIN_GROUP_ID, group_text, group_reply_markup, photo, auto_delete_group, admin_group=True
+        ))
+    return notifications
+
+def kick_outbox(context: ContextTypes.DEFAULT_TYPE):
+    """Outbox worker ကို poll interval မစောင့်ဘဲ ချက်ချင်း run ခိုင်းပါ။"""
+    context.job_queue.run_once(outbox_worker_job, 0)
+
+async def _deliver_outbox_message(bot, doc):
+    """Outbox document တစ်ခုကို ပို့ပါ။ (Admin group မှာ bot က admin မဟုတ်ရင် None - ကျော်)"""
+    if doc.get("admin_group") and not await is_bot_admin_in_group(bot, doc["chat_id"]):
+        return None
+    reply_markup = InlineKeyboardMarkup.de_json(doc["reply_markup"], bot) if doc.get("reply_markup") else None
+    async with _notify_semaphore:
+        if doc.get("photo"):
+            return await bot.send_photo(
+                chat_id=doc["chat_id"], photo=doc["photo"], caption=doc["text"],
+                parse_mode="Markdown", reply_markup=reply_markup
+            )
+        return await bot.send_message(
+            chat_id=doc["chat_id"], text=doc["text"],
+            parse_mode="Markdown", reply_markup=reply_markup
+        )
+
+async def _process_outbox_message(context, doc):
+    try:
+        msg_obj = await _deliver_outbox_message(context.bot, doc)
+    except RetryAfter as e:
+        await adb.fail_outbox_message(doc["_id"], e, retry_after=_retry_after_seconds(e))
+        return
+    except ChatMigrated as e:
+        # (ပြင်ဆင်ပြီး) Group က supergroup ဖြစ်သွား - ID အသစ်ဖြင့် ပြန်ပို့ပါ (dead-letter မလုပ်)
+        await adb.retarget_outbox_messages(doc["_id"], doc["chat_id"], e.new_chat_id)
+        await prune_unreachable_chat(doc["chat_id"], e)
+        if doc.get("admin_group"):
+            migrate_admin_group(doc["chat_id"], e.new_chat_id)
+        return
+    except (Forbidden, BadRequest) as e:
+        # Bot block ခံရ / chat မရှိ - ပြန်ကြိုးစားလည်း မရ
+        await adb.fail_outbox_message(doc["_id"], e, permanent=True)
+        if not doc.get("admin_group"):
+            await prune_unreachable_chat(doc["chat_id"], e)
+        return
+    except Exception as e:
+        await adb.fail_outbox_message(doc["_id"], e)
+        return
+
+    await adb.complete_outbox_message(doc["_id"])
+    if msg_obj and doc.get("auto_delete"):
+        await queue_auto_delete(context, msg_obj)
+
+async def outbox_worker_job(context: ContextTypes.DEFAULT_TYPE):
+    """(Timer Job) ပို့ချိန်ရောက်ပြီးသား outbox notification များကို batch လိုက် ပြိုင်တူ ပို့ပါ။"""
+    global _outbox_running
+    if _outbox_running:
+        return
+    _outbox_running = True
+    try:
+        while True:
+            docs = await adb.claim_outbox_messages()
+            if not docs:
+                break
+            await asyncio.gather(*[_process_outbox_message(context, doc) for doc in docs])
+    except Exception as e:
+        print(f"Error in outbox worker: {e}")
+    finally:
+        _outbox_running = False
+
 def simple_reply(message_text):
     """
     Simple auto-replies for common queries
@@ -177,15 +460,117 @@ def simple_reply(message_text):
                 "💰 ***ဈေးနှုန်းများ သိရှိရန် /price နှိပ်ပါ။***\n"
                 "🆘 ***အကူအညီ လိုရင် /start နှိပ်ပါ။***")
 
-# --- Price Functions (Using DB) ---
+# --- Price Functions (Using DB + In-process Catalog) ---
 
-def load_prices():
-    """Load custom prices from DB"""
-    return db.load_prices()
+def _render_price_text():
+    """/price message ကို catalog မှ တည်ဆောက်ပါ။"""
+    custom_prices = CUSTOM_PRICES
+    default_prices = DEFAULT_PRICES
+    current_prices = PRICE_CATALOG
+    price_msg = "💎 ***MLBB Diamond ဈေးနှုန်းများ***\n\n"
+
+    price_msg += "🎟️ ***Weekly Pass***:\n"
+    for i in range(1, 11):
+        wp_key = f"wp{i}"
+        if wp_key in current_prices:
+            price_msg += f"• {wp_key} = {current_prices[wp_key]:,} MMK\n"
+    price_msg += "\n"
+
+    price_msg += "💎 ***Regular Diamonds***:\n"
+    regular_diamonds = ["11", "22", "33", "56", "86", "112", "172", "257", "343",
+                        "429", "514", "600", "706", "878", "963", "1049", "1135",
+                        "1412", "2195", "3688", "5532", "9288", "12976"]
+    for diamond in regular_diamonds:
+        if diamond in current_prices:
+            price_msg += f"• {diamond} = {current_prices[diamond]:,} MMK\n"
+    price_msg += "\n"
+
+    price_msg += "💎 ***2X Diamond Pass***:\n"
+    double_pass = ["55", "165", "275", "565"]
+    for dp in double_pass:
+        if dp in current_prices:
+            price_msg += f"• {dp} = {current_prices[dp]:,} MMK\n"
+    price_msg += "\n"
+
+    other_customs = {k: v for k, v in custom_prices.items() if k not in default_prices}
+    if other_customs:
+        price_msg += "🔥 ***Special Items***:\n"
+        for item, price in other_customs.items():
+            price_msg += f"• {item} = {price:,} MMK\n"
+        price_msg += "\n"
+
+    price_msg += (
+        "***📝 အသုံးပြုနည်း***:\n"
+        "`/mmb gameid serverid amount`\n\n"
+        "***ဥပမာ***:\n"
+        "`/mmb 123456789 12345 wp1`\n"
+        "`/mmb 123456789 12345 86`"
+    )
+
+    return price_msg
 
-def save_prices(prices):
-    """Save prices to DB"""
-    db.save_prices(prices)
+def _render_pubg_price_text():
+    """/pubgprice message ကို catalog မှ တည်ဆောက်ပါ။"""
+    current_prices = PUBG_PRICE_CATALOG
+    price_msg = "💎 ***PUBG UC ဈေးနှုန်းများ***\n\n"
+
+    # Sort keys (60, 325, 660, ...)
+    sorted_keys = sorted(current_prices.keys(), key=lambda x: int(re.sub(r'\D', '', x) or 0))
+
+    for uc in sorted_keys:
+        price_msg += f"• {uc} = {current_prices[uc]:,} MMK\n"
+    
+    price_msg += "\n"
+    price_msg += (
+        "***📝 အသုံးပြုနည်း***:\n"
+        "`/pubg <player_id> <amount>`\n\n"
+        "***ဥပမာ***:\n"
+        "`/pubg 12345678 60uc`"
+    )
+
+    return price_msg
+
+def _rebuild_price_catalog():
+    """
+    Default ဈေးနှုန်းများနဲ့ custom ဈေးနှုန်းများကို catalog တစ်ခုတည်း ပေါင်းပြီး
+    /price, /pubgprice message များကိုပါ ပြန် render လုပ်ပါ။
+    """
+    global PRICE_CATALOG, PUBG_PRICE_CATALOG, PRICE_TEXT, PUBG_PRICE_TEXT
+    PRICE_CATALOG = {**DEFAULT_PRICES, **CUSTOM_PRICES}
+    PUBG_PRICE_CATALOG = {**DEFAULT_PUBG_PRICES, **CUSTOM_PUBG_PRICES}
+    PRICE_TEXT = _render_price_text()
+    PUBG_PRICE_TEXT = _render_pubg_price_text()
+
+_rebuild_price_catalog() # DB မ load ခင် default ဈေးနှုန်းများဖြင့် render ထားပါ
+
+async def load_price_catalog():
+    """DB မှ custom prices (MLBB + PUBG) ကို load လုပ်ပြီး catalog ကို ပြန်တည်ဆောက်ပါ။"""
+    global CUSTOM_PRICES, CUSTOM_PUBG_PRICES
+    CUSTOM_PRICES = await adb.load_prices()
+    CUSTOM_PUBG_PRICES = await adb.load_pubg_prices()
+    _rebuild_price_catalog()
+
+async def load_prices():
+    """Load custom prices from DB"""
+    return await adb.load_prices()
+
+async def save_prices(prices):
+    """(Write-through) Save prices to DB and refresh the catalog"""
+    global CUSTOM_PRICES
+    await adb.save_prices(prices)
+    CUSTOM_PRICES = dict(prices)
+    _rebuild_price_catalog()
+
+async def load_pubg_prices():
+    """Load PUBG custom prices from DB"""
+    return await adb.load_pubg_prices()
+
+async def save_pubg_prices(prices):
+    """(Write-through) Save PUBG prices to DB and refresh the catalog"""
+    global CUSTOM_PUBG_PRICES
+    await adb.save_pubg_prices(prices)
+    CUSTOM_PUBG_PRICES = dict(prices)
+    _rebuild_price_catalog()
 
 # --- Validation Functions ---
 
@@ -207,21 +592,8 @@ def validate_pubg_id(player_id):
     return True
 
 def get_pubg_price(uc_amount):
-    """PUBG UC အတွက် ဈေးနှုန်းကို ရှာပါ။"""
-    custom_prices = db.load_pubg_prices() # DB function အသစ်ကို ခေါ်ပါ
-    if uc_amount in custom_prices:
-        return custom_prices[uc_amount]
-
-    # (Default ဈေးနှုန်းများ - ကိုကို ကြိုက်သလို ဒီမှာ ပြင်နိုင်ပါတယ်)
-    table = {
-        "60uc": 1500,
-        "325uc": 7500,
-        "660uc": 15000,
-        "1800uc": 37500,
-        "3850uc": 75000,
-        "8100uc": 150000,
-    }
-    return table.get(uc_amount)
+    """PUBG UC အတွက် ဈေးနှုန်းကို catalog ထဲမှ ရှာပါ။"""
+    return PUBG_PRICE_CATALOG.get(uc_amount)
 
 #__________________PUBG ID FUNCTION__________________________________#
 
@@ -249,26 +621,8 @@ def is_banned_account(game_id):
     return False
 
 def get_price(diamonds):
-    """Get price for diamond amount, checking custom prices first"""
-    custom_prices = load_prices()
-    if diamonds in custom_prices:
-        return custom_prices[diamonds]
-
-    # Default prices
-    if diamonds.startswith("wp") and diamonds[2:].isdigit():
-        n = int(diamonds[2:])
-        if 1 <= n <= 10:
-            return n * 6000
-    table = {
-        "11": 950, "22": 1900, "33": 2850, "56": 4200, "112": 8200,
-        "86": 5100, "172": 10200, "257": 15300, "343": 20400,
-        "429": 25500, "514": 30600, "600": 35700, "706": 40800,
-        "878": 51000, "963": 56100, "1049": 61200, "1135": 66300,
-        "1412": 81600, "2195": 122400, "3688": 204000,
-        "5532": 306000, "9288": 510000, "12976": 714000,
-        "55": 3500, "165": 10000, "275": 16000, "565": 33000
-    }
-    return table.get(diamonds)
+    """Get price for diamond amount from the catalog (custom prices override defaults)"""
+    return PRICE_CATALOG.get(diamonds)
 
 def is_payment_screenshot(update):
     """Basic check if a message contains a photo (likely a screenshot)"""
@@ -278,20 +632,29 @@ def is_payment_screenshot(update):
 
 # --- Bot State Check Functions ---
 
-async def check_pending_topup(user_id):
-    """Check if user has pending topups in DB"""
-    user_data = db.get_user(user_id)
-    if not user_data:
-        return False
-    
-    for topup in user_data.get("topups", []):
-        if topup.get("status") == "pending":
-            return True
-    return False
+async def get_user_context(context: ContextTypes.DEFAULT_TYPE, user_id):
+    """
+    (အသစ်) Update တစ်ခုအတွင်း user doc (+ has_pending_topup) ကို DB ကနေ တစ်ကြိမ်သာ ဆွဲပါ။
+    (CallbackContext က update တစ်ခုစီအတွက် အသစ်ဖြစ်လို့ context ပေါ်မှာ cache ထားပါသည်)
+    """
+    user_ctx = getattr(context, "user_ctx", None)
+    if user_ctx is None or user_ctx["user_id"] != str(user_id):
+        user_ctx = {"user_id": str(user_id), "doc": await adb.get_user_context(user_id)}
+        context.user_ctx = user_ctx
+    return user_ctx["doc"]
+
+def invalidate_user_context(context: ContextTypes.DEFAULT_TYPE):
+    """User doc ကို ပြောင်းပြီးရင် (create_user စသည်) နောက်တစ်ခါ DB က ပြန်ဆွဲအောင်"""
+    context.user_ctx = None
+
+async def check_pending_topup(context: ContextTypes.DEFAULT_TYPE, user_id):
+    """Check if user has pending topups (per-update user context ကို သုံး)"""
+    user_doc = await get_user_context(context, user_id)
+    return bool(user_doc and user_doc.get("has_pending_topup"))
 
 async def send_pending_topup_warning(update: Update):
     """Send pending topup warning message"""
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         "⏳ ***Pending Topup ရှိနေပါတယ်!***\n\n"
         "❌ သင့်မှာ admin က approve မလုပ်သေးတဲ့ topup ရှိနေပါတယ်။\n\n"
         "***လုပ်ရမည့်အရာများ***:\n"
@@ -338,7 +701,99 @@ async def send_maintenance_message(update: Update, command_type):
             "📞 ***အရေးပေါ်ဆိုရင် Admin ကို ဆက်သွယ်ပါ။***"
         )
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    await update.effective_message.reply_text(msg, parse_mode="Markdown")
+
+# --- (အသစ်) Command Gate ---
+# User command တိုင်းရဲ့ auth / maintenance / pending-state စစ်ဆေးမှုများကို handler group -1 မှာ
+# တစ်နေရာတည်းက update တစ်ခုလျှင် တစ်ကြိမ်သာ စစ်ပါသည်။ မအောင်မြင်ရင် reply ပြီး ApplicationHandlerStop
+# ဖြင့် command handler ကို မရောက်စေပါ။ (Command အသစ်ထည့်ရင် GATED_COMMANDS ထဲမှာ check စာရင်း ထည့်ပါ)
+
+async def _gate_authorized(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+    if is_user_authorized(user_id):
+        return True
+    keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
+    await update.effective_message.reply_text(
+        "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return False
+
+async def _gate_authorized_or_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+    # Admin များက တခြား user ၏ data ကို ကြည့်နိုင်ရန် (ဥပမာ /exporthistory <user_id>)
+    return is_admin(user_id) or await _gate_authorized(update, context, user_id)
+
+def _gate_maintenance(command_type):
+    async def check(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+        if await check_maintenance_mode(command_type):
+            return True
+        await send_maintenance_message(update, command_type)
+        return False
+    return check
+
+async def _gate_not_waiting_approval(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+    if user_states.get(user_id) != "waiting_approval":
+        return True
+    await update.effective_message.reply_text(
+        "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
+        "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***",
+        parse_mode="Markdown"
+    )
+    return False
+
+async def _gate_no_topup_in_progress(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+    if user_id not in pending_topups:
+        return True
+    await update.effective_message.reply_text(
+        "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
+        "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***\n\n"
+        "***• Screenshot တင်ပါ***\n"
+        "***• သို့မဟုတ် /cancel နှိပ်ပြီး ပယ်ဖျက်ပါ***",
+        parse_mode="Markdown"
+    )
+    return False
+
+async def _gate_no_pending_topup(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id):
+    # DB read ပါတဲ့ တစ်ခုတည်းသော check (per-update user context ကို cache လုပ်ပြီး handler က ပြန်သုံး)
+    if not await check_pending_topup(context, user_id):
+        return True
+    await send_pending_topup_warning(update)
+    return False
+
+# Check များကို စျေးပေါတဲ့ (in-memory) အစဉ်အတိုင်း စီထားပါ
+_ORDER_CHECKS = (_gate_authorized, _gate_maintenance("orders"), _gate_not_waiting_approval,
+                 _gate_no_topup_in_progress, _gate_no_pending_topup)
+GATED_COMMANDS = {
+    "mmb": _ORDER_CHECKS,
+    "pubg": _ORDER_CHECKS,
+    "topup": (_gate_authorized, _gate_maintenance("topups"), _gate_not_waiting_approval,
+              _gate_no_topup_in_progress, _gate_no_pending_topup),
+    "balance": (_gate_authorized, _gate_not_waiting_approval, _gate_no_topup_in_progress, _gate_no_pending_topup),
+    "history": (_gate_authorized, _gate_not_waiting_approval, _gate_no_topup_in_progress, _gate_no_pending_topup),
+    "price": (_gate_authorized, _gate_not_waiting_approval, _gate_no_topup_in_progress),
+    "pubgprice": (_gate_authorized, _gate_not_waiting_approval, _gate_no_topup_in_progress),
+    "affiliate": (_gate_authorized,),
+    "exporthistory": (_gate_authorized_or_admin,),
+    "cancel": (_gate_authorized,),
+}
+
+# Gated command handler များကို message အသစ်မှာသာ run (edit လုပ်ပြီး command ပြန်ပို့တာ မလက်ခံ)
+GATED_COMMAND_FILTER = filters.UpdateType.MESSAGE
+
+async def command_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """(Handler group -1) Command handler မတိုင်ခင် GATED_COMMANDS ထဲက check များကို run ပါ။"""
+    # edited_message ပါ စစ်ရန် effective_message (Command handler များက MESSAGE update ကိုသာ လက်ခံ)
+    message = update.effective_message
+    if not message or not message.text or not message.text.startswith("/") or not update.effective_user:
+        return
+    command = message.text.split()[0][1:].split("@")[0].lower()
+    checks = GATED_COMMANDS.get(command)
+    if not checks:
+        return
+
+    user_id = str(update.effective_user.id)
+    for check in checks:
+        if not await check(update, context, user_id):
+            raise ApplicationHandlerStop
 
 # --- User Command Handlers ---
 
@@ -348,8 +803,6 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = user.username or "-"
     name = f"{user.first_name} {user.last_name or ''}".strip()
 
-    load_authorized_users() # 1. Auth list ကို အရင် load လုပ်ပါ
-    
     # 2. Referrer ID ကို ဖမ်းပါ
     referrer_id = context.args[0] if context.args else None
     if referrer_id and str(referrer_id) == user_id:
@@ -363,8 +816,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # --- (Auto-Approval Logic အသစ်) ---
         # User အသစ်ဖြစ်ပြီး link က ဝင်လာရင် Auto-Approve လုပ်ပါ
         print(f"New user {user_id} joined via referral from {referrer_id}. Auto-approving.")
-        db.add_authorized_user(user_id) 
-        load_authorized_users() # local list ကို ပြန်ဖြည့်ပါ
+        await authorize_user(user_id) # DB + local set ကို တစ်ခါတည်း update
         is_authorized = True # အခု approve ဖြစ်သွားပါပြီ
         
     elif not is_authorized:
@@ -390,18 +842,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- (Logic ပြီး) ---
 
     # 4. Pending Topup စစ်ဆေးပါ (User က သုံးခွင့်ရှိနေပါပြီ)
-    if await check_pending_topup(user_id):
+    if await check_pending_topup(context, user_id):
         await send_pending_topup_warning(update)
         return
 
-    # 5. User ကို DB ထဲမှာ ဖန်တီးပါ
-    user_doc = db.get_user(user_id)
-    user_doc = db.get_user(user_id)
-    # 5. User ကို DB ထဲမှာ ဖန်တီးပါ
-    user_doc = db.get_user(user_id)
+    # 5. User ကို DB ထဲမှာ ဖန်တီးပါ (ပြင်ဆင်ပြီး - pending topup စစ်တုန်းက ယူထားတဲ့ doc ကို ပြန်သုံး)
+    user_doc = await get_user_context(context, user_id)
     if not user_doc:
         # User အသစ်ဖြစ်မှသာ referrer_id ကို DB ထဲ ထည့်သိမ်းပါ
-        db.create_user(user_id, name, username, referrer_id)
+        await adb.create_user(user_id, name, username, referrer_id)
+        invalidate_user_context(context)
         
         # (Referrer ကို အကြောင်းကြားစာ ပို့ပါ)
         if referrer_id: # (Auto-approve ဖြစ်ခဲ့တဲ့ user အတွက်)
@@ -409,7 +859,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 # --- (ပြင်ဆင်ပြီး) % ကို g_settings ကနေ ယူပါ ---
                 current_percentage = g_settings.get("affiliate", {}).get("percentage", 0.03) * 100
                 
-                referrer_info = db.get_user(referrer_id)
+                referrer_info = await adb.get_user(referrer_id)
                 if referrer_info:
                     await context.bot.send_message(
                         chat_id=referrer_id,
@@ -423,7 +873,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         # --- (!!! ဒီ 'ELSE' BLOCK အသစ်ကို ထပ်ထည့်ပါ !!!) ---
         # User အဟောင်းဖြစ်ပါက Name နှင့် Username ကို DB တွင် Update လုပ်ပါ
-        db.update_user_profile(user_id, name, username)
+        await adb.update_user_profile(user_id, name, username)
         # --- (ပြီး) ---
 
     if user_id in user_states:
@@ -457,68 +907,29 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "➤ /topup amount - ငွေဖြည့်မယ် (screenshot တင်ပါ)\n"
             "➤ /price - Diamond များရဲ့ ဈေးနှုန်းများ\n"
             "➤ /history - အော်ဒါမှတ်တမ်းကြည့်မယ်\n"
+            "➤ /exporthistory - မှတ်တမ်းအပြည့်အစုံ file (CSV) ရယူမယ်\n"
             f"➤ /affiliate - လူရှာပြီး ကော်မရှင်ခ ရယူပါ။\n\n" 
             "***📌 ဥပမာ***:\n"
             "`/mmb 123456789 12345 wp1`\n\n"
             "***လိုအပ်တာရှိရင် Owner ကို ဆက်သွယ်နိုင်ပါတယ်။***"
         )
         try:
-            user_photos = await context.bot.get_user_profile_photos(user_id=int(user_id), limit=1)
-            if user_photos.total_count > 0:
+            photo_id = await get_profile_photo_id(context.bot, user_id)
+            if photo_id:
                 await context.bot.send_photo(
                     chat_id=update.effective_chat.id,
-                    photo=user_photos.photos[0][0].file_id,
+                    photo=photo_id,
                     caption=msg,
                     parse_mode="Markdown"
                 )
             else:
                 await update.message.reply_text(msg, parse_mode="Markdown")
         except Exception as e:
+            print(f"Error sending profile photo to {user_id}: {e}")
             await update.message.reply_text(msg, parse_mode="Markdown")
 
 async def mmb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
-    user_doc = db.get_user(user_id) # User info အရင်ယူထား
-
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
-            reply_markup=reply_markup
-        )
-        return
-
-    if not await check_maintenance_mode("orders"):
-        await send_maintenance_message(update, "orders")
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***\n\n"
-            "⏰ ***Admin က approve လုပ်ပြီးမှ ပြန်လည် အသုံးပြုနိုင်ပါမယ်။***\n"
-            "📞 ***အရေးပေါ်ဆိုရင် admin ကို ဆက်သွယ်ပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    if await check_pending_topup(user_id):
-        await send_pending_topup_warning(update)
-        return
-
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် အရင်ပြီးဆုံးပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***\n\n"
-            "***လုပ်ရမည့်အရာများ***:\n"
-            "***• Payment app ရွေးပြီး screenshot တင်ပါ***\n"
-            "***• သို့မဟုတ် /cancel နှိပ်ပြီး ပယ်ဖျက်ပါ***\n\n"
-            "💡 ***Topup ပြီးမှ order တင်နိုင်ပါမယ်။***",
-            parse_mode="Markdown"
-        )
-        return
 
     args = context.args
     if len(args) != 3:
@@ -582,23 +993,7 @@ async def mmb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    user_balance = user_doc.get("balance", 0) # db.get_balance() အစား ပြောင်းသုံး
-
-    if user_balance < price:
-        keyboard = [[InlineKeyboardButton("💳 ငွေဖြည့်မယ်", callback_data="topup_button")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            f"❌ ***လက်ကျန်ငွေ မလုံလောက်ပါ!***\n\n"
-            f"💰 ***လိုအပ်တဲ့ငွေ***: {price:,} MMK\n"
-            f"💳 ***သင့်လက်ကျန်***: {user_balance:,} MMK\n"
-            f"❗ ***လိုအပ်သေးတာ***: {price - user_balance:,} MMK\n\n"
-            "***ငွေဖြည့်ရန်*** `/topup amount` ***သုံးပါ။***",
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
-        return
-
-    order_id = f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    order_id = await adb.next_id("ORD")
     order = {
         "order_id": order_id,
         "game_id": game_id,
@@ -611,10 +1006,6 @@ async def mmb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "chat_id": update.effective_chat.id
     }
 
-    db.update_balance(user_id, -price)
-    db.add_order(user_id, order)
-    new_balance = user_balance - price # db.get_balance() အစား ပြောင်းသုံး
-
     keyboard = [
         [
             InlineKeyboardButton("✅ Confirm", callback_data=f"order_confirm_{order_id}"),
@@ -639,46 +1030,45 @@ async def mmb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📊 **Status:** ⏳ `စောင့်ဆိုင်းနေသည်`"
     )
 
-    load_admin_ids_global()
-    for admin_id in ADMIN_IDS:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=admin_msg,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-        except:
-            pass
-
-    try:
-        if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-            # --- (ပြင်ဆင်ပြီး) Group Message (ပုံ အတိုင်း) ---
-            group_msg = (
-                f"🔔 ***အော်ဒါအသစ်ရောက်ပါပြီ!***\n\n"
-                f"📝 **Order ID:** `{order_id}`\n"
-                f"👤 **User Name:** [{user_name}](tg://user?id={user_id})\n" # Group မှာ Clickable ထည့်
-                f"🆔 **User ID:** `{user_id}`\n"
-                f"🎮 **Game ID:** `{game_id}`\n"
-                f"🌐 **Server ID:** `{server_id}`\n"
-                f"💎 **Amount:** {amount}\n"
-                f"💰 **Price:** {price:,} MMK\n"
-                f"⏰ **Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                f"📊 **Status:** ⏳ `စောင့်ဆိုင်းနေသည်`\n\n"
-                f"#NewOrder"
-            )
-            # --- (ပြီး) ---
-            await context.bot.send_message(
-                chat_id=ADMIN_GROUP_ID, 
-                text=group_msg, 
-                parse_mode="Markdown",
-                reply_markup=reply_markup # (အသစ်) Group မှာပါ Button ထည့်
-            )
-    except Exception as e:
-        print(f"Error sending to admin group in mmb_command: {e}")
-        pass
+    # --- (ပြင်ဆင်ပြီး) Group Message (ပုံ အတိုင်း) ---
+    group_msg = (
+        f"🔔 ***အော်ဒါအသစ်ရောက်ပါပြီ!***\n\n"
+        f"📝 **Order ID:** `{order_id}`\n"
+        f"👤 **User Name:** [{user_name}](tg://user?id={user_id})\n" # Group မှာ Clickable ထည့်
+        f"🆔 **User ID:** `{user_id}`\n"
+        f"🎮 **Game ID:** `{game_id}`\n"
+        f"🌐 **Server ID:** `{server_id}`\n"
+        f"💎 **Amount:** {amount}\n"
+        f"💰 **Price:** {price:,} MMK\n"
+        f"⏰ **Time:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        f"📊 **Status:** ⏳ `စောင့်ဆိုင်းနေသည်`\n\n"
+        f"#NewOrder"
+    )
     # --- (ပြီး) ---
 
+    # (ပြင်ဆင်ပြီး) balance >= price ဖြစ်မှသာ ငွေနုတ်ပြီး order မှတ်ပါ (atomic - double-tap နဲ့ ငွေပိုမသုံးနိုင်)
+    # Admin notification များကိုပါ outbox ထဲ တစ်ခါတည်း ရေးပါ
+    notifications = admin_notifications(
+        admin_msg, reply_markup=reply_markup,
+        group_text=group_msg, group_reply_markup=reply_markup # (အသစ်) Group မှာပါ Button ထည့်
+    )
+    new_balance = await adb.place_order(user_id, order, notifications)
+    if new_balance is None:
+        user_balance = await adb.get_balance(user_id)
+        keyboard = [[InlineKeyboardButton("💳 ငွေဖြည့်မယ်", callback_data="topup_button")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text(
+            f"❌ ***လက်ကျန်ငွေ မလုံလောက်ပါ!***\n\n"
+            f"💰 ***လိုအပ်တဲ့ငွေ***: {price:,} MMK\n"
+            f"💳 ***သင့်လက်ကျန်***: {user_balance:,} MMK\n"
+            f"❗ ***လိုအပ်သေးတာ***: {price - user_balance:,} MMK\n\n"
+            "***ငွေဖြည့်ရန်*** `/topup amount` ***သုံးပါ။***",
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+        return
+
+    kick_outbox(context)
     await update.message.reply_text(
         f"✅ ***အော်ဒါ အောင်မြင်ပါပြီ!***\n\n"
         f"📝 ***Order ID:*** `{order_id}`\n"
@@ -695,24 +1085,6 @@ async def mmb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def pubg_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
-    user_doc = db.get_user(user_id) 
-
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        await update.message.reply_text("🚫 အသုံးပြုခွင့် မရှိပါ!\n\n/start နှိပ်ပြီး Register လုပ်ပါ။")
-        return
-
-    if not await check_maintenance_mode("orders"):
-        await send_maintenance_message(update, "orders")
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text("⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n❌ ***Admin approve မလုပ်မချင်း Order အသစ် တင်လို့မရပါ။***", parse_mode="Markdown")
-        return
-
-    if await check_pending_topup(user_id):
-        await send_pending_topup_warning(update)
-        return
 
     args = context.args
     if len(args) != 2:
@@ -746,19 +1118,7 @@ async def pubg_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    user_balance = user_doc.get("balance", 0)
-
-    if user_balance < price:
-        await update.message.reply_text(
-            f"❌ ***လက်ကျန်ငွေ မလုံလောက်ပါ!***\n\n"
-            f"💰 ***လိုအပ်တဲ့ငွေ***: {price:,} MMK\n"
-            f"💳 ***သင့်လက်ကျန်***: {user_balance:,} MMK\n\n"
-            "***ငွေဖြည့်ရန်*** `/topup amount` ***သုံးပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    order_id = f"PUBG{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    order_id = await adb.next_id("PUBG")
     order = {
         "order_id": order_id,
         "game": "PUBG",
@@ -771,10 +1131,6 @@ async def pubg_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "chat_id": update.effective_chat.id
     }
 
-    db.update_balance(user_id, -price)
-    db.add_order(user_id, order) # Order မှတ်တမ်းထဲ ထည့်
-    new_balance = user_balance - price
-
     keyboard = [
         [
             InlineKeyboardButton("✅ Confirm (PUBG)", callback_data=f"pubg_confirm_{order_id}"),
@@ -795,25 +1151,24 @@ async def pubg_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📊 Status: ⏳ ***စောင့်ဆိုင်းနေသည်***"
     )
 
-    load_admin_ids_global()
-    for admin_id in ADMIN_IDS:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id, text=admin_msg,
-                parse_mode="Markdown", reply_markup=reply_markup
-            )
-        except: pass
-
-    try:
-        if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-            group_msg = admin_msg + "\n#NewOrder #PUBG"
-            msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-            
-            db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-    except Exception as e:
-        print(f"Error sending to admin group in pubg_command: {e}")
-        pass
+    # (ပြင်ဆင်ပြီး) Atomic ငွေနုတ် + order မှတ် + admin notification များကို outbox ထဲ
+    notifications = admin_notifications(
+        admin_msg, reply_markup=reply_markup,
+        group_text=admin_msg + "\n#NewOrder #PUBG", auto_delete_group=True
+    )
+    new_balance = await adb.place_order(user_id, order, notifications)
+    if new_balance is None:
+        user_balance = await adb.get_balance(user_id)
+        await update.message.reply_text(
+            f"❌ ***လက်ကျန်ငွေ မလုံလောက်ပါ!***\n\n"
+            f"💰 ***လိုအပ်တဲ့ငွေ***: {price:,} MMK\n"
+            f"💳 ***သင့်လက်ကျန်***: {user_balance:,} MMK\n\n"
+            "***ငွေဖြည့်ရန်*** `/topup amount` ***သုံးပါ။***",
+            parse_mode="Markdown"
+        )
+        return
 
+    kick_outbox(context)
     await update.message.reply_text(
         f"✅ ***PUBG UC အော်ဒါ အောင်မြင်ပါပြီ!***\n\n"
         f"📝 ***Order ID:*** `{order_id}`\n"
@@ -833,59 +1188,24 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     name = f"{user.first_name} {user.last_name or ''}".strip()
     username = user.username or "-"
-    db.update_user_profile(user_id, name, username)
+    await adb.update_user_profile(user_id, name, username)
     # --- (ပြီး) ---
 
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
-            reply_markup=reply_markup
-        )
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***\n\n"
-            "***• Screenshot တင်ပါ***\n"
-            "***• သို့မဟုတ် /cancel နှိပ်ပြီး ပယ်ဖျက်ပါ***",
-            parse_mode="Markdown"
-        )
-        return
-
-    if await check_pending_topup(user_id):
-        await send_pending_topup_warning(update)
-        return
-
-    user_data = db.get_user(user_id)
+    user_data = await get_user_context(context, user_id)
     if not user_data:
         await update.message.reply_text("❌ အရင်ဆုံး /start နှိပ်ပါ။")
         return
 
     balance = user_data.get("balance", 0)
-    total_orders = len(user_data.get("orders", []))
-    total_topups = len(user_data.get("topups", []))
+    # (ပြင်ဆင်ပြီး) History ကို မရေတွက်တော့ဘဲ user doc ပေါ်က counter များကို သုံး
+    total_orders = user_data.get("order_count", 0)
+    total_topups = user_data.get("topup_count", 0)
+    pending_topups_count = user_data.get("pending_topup_count", 0)
+    pending_amount = user_data.get("pending_topup_amount", 0)
 
-    pending_topups_count = 0
-    pending_amount = 0
-    for topup in user_data.get("topups", []):
-        if topup.get("status") == "pending":
-            pending_topups_count += 1
-            pending_amount += topup.get("amount", 0)
-
-    name = user_data.get('name', 'Unknown').replace('*', '').replace('_', '').replace('`', '')
-    username = user_data.get('username', 'None').replace('*', '').replace('_', '').replace('`', '')
+    # (ပြင်ဆင်ပြီး) အပေါ်မှာ update_user_profile နဲ့ ရေးပြီးသား name/username ကို တိုက်ရိုက်သုံး
+    name = name.replace('*', '').replace('_', '').replace('`', '')
+    username = username.replace('*', '').replace('_', '').replace('`', '')
 
     status_msg = ""
     if pending_topups_count > 0:
@@ -904,62 +1224,26 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     try:
-        user_photos = await context.bot.get_user_profile_photos(user_id=int(user_id), limit=1)
-        if user_photos.total_count > 0:
+        photo_id = await get_profile_photo_id(context.bot, user_id)
+        if photo_id:
             await context.bot.send_photo(
                 chat_id=update.effective_chat.id,
-                photo=user_photos.photos[0][0].file_id,
+                photo=photo_id,
                 caption=balance_text,
                 parse_mode="Markdown",
                 reply_markup=reply_markup
             )
         else:
-            await update.message.reply_text(
-                balance_text, parse_mode="Markdown", reply_markup=reply_markup
-            )
-    except:
-        await update.message.reply_text(
-            balance_text, parse_mode="Markdown", reply_markup=reply_markup
-        )
-
-async def topup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = str(update.effective_user.id)
-
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
-            reply_markup=reply_markup
-        )
-        return
-
-    if not await check_maintenance_mode("topups"):
-        await send_maintenance_message(update, "topups")
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
+            await update.message.reply_text(
+                balance_text, parse_mode="Markdown", reply_markup=reply_markup
+            )
+    except:
         await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***",
-            parse_mode="Markdown"
+            balance_text, parse_mode="Markdown", reply_markup=reply_markup
         )
-        return
-
-    if await check_pending_topup(user_id):
-        await send_pending_topup_warning(update)
-        return
 
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***\n\n"
-            "***• Screenshot တင်ပါ***\n"
-            "***• သို့မဟုတ် /cancel နှိပ်ပြီး ပယ်ဖျက်ပါ***",
-            parse_mode="Markdown"
-        )
-        return
+async def topup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
 
     args = context.args
     if len(args) != 1:
@@ -989,6 +1273,10 @@ async def topup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
+    # Gate စစ်ပြီးနောက် await များအတွင်း တခြား /topup က ဦးသွားနိုင်သည် (await မပါဘဲ ပြန်စစ်ပြီး သတ်မှတ်)
+    if user_id in pending_topups:
+        await update.message.reply_text("⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***", parse_mode="Markdown")
+        return
     pending_topups[user_id] = {
         "amount": amount,
         "timestamp": datetime.now().isoformat()
@@ -1012,148 +1300,14 @@ async def topup_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 async def price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = str(update.effective_user.id)
-
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
-            reply_markup=reply_markup
-        )
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***\n\n"
-            "***• Screenshot တင်ပါ***\n"
-            "***• သို့မဟုတ် /cancel နှိပ်ပြီး ပယ်ဖျက်ပါ***",
-            parse_mode="Markdown"
-        )
-        return
-
-    custom_prices = load_prices() # From DB
-
-    default_prices = {
-        "wp1": 6000, "wp2": 12000, "wp3": 18000, "wp4": 24000, "wp5": 30000,
-        "wp6": 36000, "wp7": 42000, "wp8": 48000, "wp9": 54000, "wp10": 60000,
-        "11": 950, "22": 1900, "33": 2850, "56": 4200, "86": 5100, "112": 8200,
-        "172": 10200, "257": 15300, "343": 20400, "429": 25500, "514": 30600,
-        "600": 35700, "706": 40800, "878": 51000, "963": 56100, "1049": 61200,
-        "1135": 66300, "1412": 81600, "2195": 122400, "3688": 204000,
-        "5532": 306000, "9288": 510000, "12976": 714000,
-        "55": 3500, "165": 10000, "275": 16000, "565": 33000
-    }
-
-    current_prices = {**default_prices, **custom_prices}
-    price_msg = "💎 ***MLBB Diamond ဈေးနှုန်းများ***\n\n"
-
-    price_msg += "🎟️ ***Weekly Pass***:\n"
-    for i in range(1, 11):
-        wp_key = f"wp{i}"
-        if wp_key in current_prices:
-            price_msg += f"• {wp_key} = {current_prices[wp_key]:,} MMK\n"
-    price_msg += "\n"
-
-    price_msg += "💎 ***Regular Diamonds***:\n"
-    regular_diamonds = ["11", "22", "33", "56", "86", "112", "172", "257", "343",
-                        "429", "514", "600", "706", "878", "963", "1049", "1135",
-                        "1412", "2195", "3688", "5532", "9288", "12976"]
-    for diamond in regular_diamonds:
-        if diamond in current_prices:
-            price_msg += f"• {diamond} = {current_prices[diamond]:,} MMK\n"
-    price_msg += "\n"
-
-    price_msg += "💎 ***2X Diamond Pass***:\n"
-    double_pass = ["55", "165", "275", "565"]
-    for dp in double_pass:
-        if dp in current_prices:
-            price_msg += f"• {dp} = {current_prices[dp]:,} MMK\n"
-    price_msg += "\n"
-
-    other_customs = {k: v for k, v in custom_prices.items() if k not in default_prices}
-    if other_customs:
-        price_msg += "🔥 ***Special Items***:\n"
-        for item, price in other_customs.items():
-            price_msg += f"• {item} = {price:,} MMK\n"
-        price_msg += "\n"
-
-    price_msg += (
-        "***📝 အသုံးပြုနည်း***:\n"
-        "`/mmb gameid serverid amount`\n\n"
-        "***ဥပမာ***:\n"
-        "`/mmb 123456789 12345 wp1`\n"
-        "`/mmb 123456789 12345 86`"
-    )
-
-    await update.message.reply_text(price_msg, parse_mode="Markdown")
+    await update.message.reply_text(PRICE_TEXT, parse_mode="Markdown")
 
 async def pubg_price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """(User) PUBG UC ဈေးနှုန်းများကို ကြည့်ပါ။"""
-    user_id = str(update.effective_user.id)
-
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        await update.message.reply_text("🚫 အသုံးပြုခွင့် မရှိပါ!\n\n/start နှိပ်ပြီး Register လုပ်ပါ။")
-        return
-
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin approve မလုပ်မချင်း commands တွေ သုံးလို့မရပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***",
-            parse_mode="Markdown"
-        )
-        return
-
-    custom_prices = db.load_pubg_prices() # From DB
-
-    default_prices = {
-        "60uc": 1500, "325uc": 7500, "660uc": 15000,
-        "1800uc": 37500, "3850uc": 75000, "8100uc": 150000
-    }
-
-    current_prices = {**default_prices, **custom_prices}
-    price_msg = "💎 ***PUBG UC ဈေးနှုန်းများ***\n\n"
-
-    # Sort keys (60, 325, 660, ...)
-    sorted_keys = sorted(current_prices.keys(), key=lambda x: int(re.sub(r'\D', '', x)))
-
-    for uc in sorted_keys:
-        price_msg += f"• {uc} = {current_prices[uc]:,} MMK\n"
-    
-    price_msg += "\n"
-    price_msg += (
-        "***📝 အသုံးပြုနည်း***:\n"
-        "`/pubg <player_id> <amount>`\n\n"
-        "***ဥပမာ***:\n"
-        "`/pubg 12345678 60uc`"
-    )
-
-    await update.message.reply_text(price_msg, parse_mode="Markdown")
+    await update.message.reply_text(PUBG_PRICE_TEXT, parse_mode="Markdown")
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
-    if not is_user_authorized(user_id):
-        return
-
     if user_id in pending_topups:
         del pending_topups[user_id]
         await update.message.reply_text(
@@ -1172,63 +1326,101 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
 
-    load_authorized_users()
-    if not is_user_authorized(user_id):
-        keyboard = [[InlineKeyboardButton("👑 Contact Owner", url=f"tg://user?id={ADMIN_ID}")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "🚫 အသုံးပြုခွင့် မရှိပါ!\n\nOwner ထံ bot အသုံးပြုခွင့် တောင်းဆိုပါ။",
-            reply_markup=reply_markup
-        )
+    user_data = await get_user_context(context, user_id)
+    if not user_data:
+        await update.message.reply_text("❌ အရင်ဆုံး /start နှိပ်ပါ။")
         return
 
-    if user_id in user_states and user_states[user_id] == "waiting_approval":
-        await update.message.reply_text(
-            "⏳ ***Screenshot ပို့ပြီးပါပြီ!***\n\n"
-            "❌ ***Admin က လက်ခံပြီးကြောင်း အတည်ပြုတဲ့အထိ commands တွေ အသုံးပြုလို့ မရပါ။***",
-            parse_mode="Markdown"
-        )
+    if not user_data.get("order_count") and not user_data.get("topup_count"):
+        await update.message.reply_text("📋 သင့်မှာ မည်သည့် မှတ်တမ်းမှ မရှိသေးပါ။")
         return
 
-    if user_id in pending_topups:
-        await update.message.reply_text(
-            "⏳ ***Topup လုပ်ငန်းစဉ် ဆက်လက်လုပ်ဆောင်ပါ!***\n\n"
-            "❌ ***လက်ရှိ topup လုပ်ငန်းစဉ်ကို မပြီးသေးပါ။***",
-            parse_mode="Markdown"
-        )
-        return
+    # (ပြင်ဆင်ပြီး) History အကုန်မဆွဲတော့ဘဲ page တစ်ခုစီ (Prev/Next button ဖြင့်)
+    kind = "orders" if user_data.get("order_count") else "topups"
+    msg, reply_markup = await render_history_page(user_id, kind)
+    await update.message.reply_text(msg, parse_mode="Markdown", reply_markup=reply_markup)
 
-    if await check_pending_topup(user_id):
-        await send_pending_topup_warning(update)
-        return
+HISTORY_PAGE_SIZE = 5
+EXPORT_SPOOL_SIZE = 1024 * 1024 # 1MB ထက်ကြီးရင် temp file (disk) ပေါ်ကို ရွှေ့
 
-    user_data = db.get_user(user_id)
-    if not user_data:
-        await update.message.reply_text("❌ အရင်ဆုံး /start နှိပ်ပါ။")
-        return
+async def send_export_file(update: Update, export_func, filename, caption, *args, **kwargs):
+    """
+    (အသစ်) export_func (DB layer) ကို SpooledTemporaryFile ထဲ ရေးခိုင်းပြီး document အဖြစ် ပို့ပါ။
+    Row မရှိရင် False ပြန်ပေးပါ။
+    """
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as export_file:
+        row_count = await export_func(*args, fileobj=export_file, **kwargs)
+        if not row_count:
+            return False
+        export_file.seek(0)
+        await update.message.reply_document(
+            document=export_file, filename=filename,
+            caption=caption.format(count=row_count), parse_mode="Markdown"
+        )
+    return True
 
-    orders = db.get_user_orders(user_id, limit=999999999)
-    topups = db.get_user_topups(user_id, limit=999999999)
+async def export_history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    (အသစ်) Order/Topup history အပြည့်အစုံကို CSV (.csv.gz) file အဖြစ် ပို့ပါ။
+    User - /exporthistory (ကိုယ့် history)၊ Admin - /exporthistory <user_id>
+    """
+    user_id = str(update.effective_user.id)
+    target_user_id = user_id
+    if context.args:
+        if not is_admin(user_id):
+            await update.message.reply_text("❌ တခြား user ၏ history ကို Admin များသာ export လုပ်နိုင်ပါတယ်!")
+            return
+        target_user_id = context.args[0]
+
+    await update.message.reply_text("⏳ ***History file ပြင်ဆင်နေပါသည်...***", parse_mode="Markdown")
+    sent = await send_export_file(
+        update, adb.export_user_history_csv,
+        f"history_{target_user_id}_{datetime.now().strftime('%Y%m%d')}.csv.gz",
+        f"📋 ***History Export***\n🆔 User ID: `{target_user_id}`\n📊 မှတ်တမ်း: {{count}} ခု",
+        target_user_id
+    )
+    if not sent:
+        await update.message.reply_text("📋 မည်သည့် မှတ်တမ်းမှ မရှိသေးပါ။")
 
-    if not orders and not topups:
-        await update.message.reply_text("📋 သင့်မှာ မည်သည့် မှတ်တမ်းမှ မရှိသေးပါ။")
-        return
+async def render_history_page(user_id, kind, cursor=None, direction="older"):
+    """
+    (အသစ်) /history page တစ်ခုအတွက် message နဲ့ button များ (Orders/Topups tab + Prev/Next)
+    Callback data: hist_<kind>_<direction>_<cursor row _id> (64 bytes အောက်)
+    """
+    items, has_more = await adb.get_history_page(user_id, kind, cursor, direction, HISTORY_PAGE_SIZE)
+    if direction == "newer" and not items:
+        return await render_history_page(user_id, kind) # Cursor ထက် အသစ် မရှိတော့ရင် ပထမ page
+    if direction == "newer":
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = cursor is not None, has_more
 
     msg = "📋 သင့်ရဲ့ မှတ်တမ်းများ\n\n"
-    if orders:
-        msg += "🛒 အော်ဒါများ (နောက်ဆုံး 5 ခု):\n"
-        for order in orders:
+    if kind == "orders":
+        msg += "🛒 အော်ဒါများ:\n"
+        for order in items:
             status_emoji = "✅" if order.get("status") == "confirmed" else "⏳" if order.get("status") == "pending" else "❌"
             msg += f"{status_emoji} {order['order_id']} - {order['amount']} ({order['price']:,} MMK)\n"
-        msg += "\n"
-
-    if topups:
-        msg += "💳 ငွေဖြည့်များ (နောက်ဆုံး 5 ခု):\n"
-        for topup in topups:
+    else:
+        msg += "💳 ငွေဖြည့်များ:\n"
+        for topup in items:
             status_emoji = "✅" if topup.get("status") == "approved" else "⏳" if topup.get("status") == "pending" else "❌"
             msg += f"{status_emoji} {topup['amount']:,} MMK - {topup.get('timestamp', 'Unknown')[:10]}\n"
+    if not items:
+        msg += "မှတ်တမ်း မရှိသေးပါ။\n"
 
-    await update.message.reply_text(msg, parse_mode="Markdown")
+    keyboard = [[
+        InlineKeyboardButton("🛒 Orders", callback_data="hist_orders_older_"),
+        InlineKeyboardButton("💳 Topups", callback_data="hist_topups_older_"),
+    ]]
+    nav_row = []
+    if items and has_newer:
+        nav_row.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"hist_{kind}_newer_{items[0]['_id']}"))
+    if items and has_older:
+        nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=f"hist_{kind}_older_{items[-1]['_id']}"))
+    if nav_row:
+        keyboard.append(nav_row)
+    return msg, InlineKeyboardMarkup(keyboard)
 
 # --- (အသစ်) Affiliate Command ---
 async def affiliate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1236,16 +1428,12 @@ async def affiliate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = str(user.id)
 
-    if not is_user_authorized(user_id):
-        await update.message.reply_text("🚫 အသုံးပြုခွင့် မရှိပါ!\n\n/start နှိပ်ပြီး Register လုပ်ပါ။")
-        return
-        
-    user_doc = db.get_user(user_id)
+    user_doc = await get_user_context(context, user_id)
     if not user_doc:
         await update.message.reply_text("❌ User မတွေ့ပါ။ /start ကို အရင်နှိပ်ပါ။")
         return
 
-    bot_username = (await context.bot.get_me()).username
+    bot_username = (await get_bot_user(context.bot)).username
     referral_link = f"https://t.me/{bot_username}?start={user_id}"
     
     earnings = user_doc.get("referral_earnings", 0)
@@ -1291,16 +1479,9 @@ async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ ငွေပမာဏမှားနေပါတယ်!")
         return
 
-    user_data = db.get_user(target_user_id)
-    if not user_data:
-        await update.message.reply_text("❌ User မတွေ့ရှိပါ!")
-        return
-
-    topup_id_to_approve = None
-    for topup in reversed(user_data.get("topups", [])):
-        if topup.get("status") == "pending" and topup.get("amount") == amount:
-            topup_id_to_approve = topup.get("topup_id")
-            break
+    # (ပြင်ဆင်ပြီး) Pending topup ရှိရင် user ရှိပြီးသားမို့ user doc ကို သီးသန့် မဆွဲတော့
+    pending_topup = await adb.find_pending_topup(target_user_id, amount)
+    topup_id_to_approve = pending_topup.get("topup_id") if pending_topup else None
 
     if not topup_id_to_approve:
         await update.message.reply_text(
@@ -1315,17 +1496,17 @@ async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "approved_at": datetime.now().isoformat()
     }
     
-    approved_user_id = db.find_and_update_topup(topup_id_to_approve, updates) # This also updates balance
+    approved_user_doc = await adb.find_and_update_topup(topup_id_to_approve, updates) # This also updates balance
 
-    if not approved_user_id:
+    if not approved_user_doc:
         await update.message.reply_text("❌ Topup approve လုပ်ရာတွင် အမှားဖြစ်သွားသည်!")
         return
 
     if target_user_id in user_states:
         del user_states[target_user_id]
 
+    new_balance = approved_user_doc.get("balance", 0) # (ပြင်ဆင်ပြီး) Approve ပြီးသား document ကနေ ယူ
     try:
-        user_balance = db.get_balance(target_user_id)
         keyboard = [[InlineKeyboardButton("💎 Order တင်မယ်", url=f"https://t.me/{context.bot.username}?start=order")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -1333,7 +1514,7 @@ async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             chat_id=int(target_user_id),
             text=f"✅ ***ငွေဖြည့်မှု အတည်ပြုပါပြီ!*** 🎉\n\n"
                  f"💰 ***ပမာဏ:*** `{amount:,} MMK`\n"
-                 f"💳 ***လက်ကျန်ငွေ:*** `{user_balance:,} MMK`\n"
+                 f"💳 ***လက်ကျန်ငွေ:*** `{new_balance:,} MMK`\n"
                  f"👤 ***Approved by:*** [{admin_name}](tg://user?id={user_id})\n"
                  f"⏰ ***အချိန်:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
                  f"🎉 ***ယခုအခါ diamonds များ ဝယ်ယူနိုင်ပါပြီ!***\n"
@@ -1348,7 +1529,7 @@ async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"✅ ***Approve အောင်မြင်ပါပြီ!***\n\n"
         f"👤 ***User ID:*** `{target_user_id}`\n"
         f"💰 ***Amount:*** `{amount:,} MMK`\n"
-        f"💳 ***User's new balance:*** `{db.get_balance(target_user_id):,} MMK`\n"
+        f"💳 ***User's new balance:*** `{new_balance:,} MMK`\n"
         f"🔓 ***User restrictions cleared!***",
         parse_mode="Markdown"
     )
@@ -1378,11 +1559,11 @@ async def deduct_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ ငွေပမာဏမှားနေပါတယ်!")
         return
 
-    if not db.get_user(target_user_id):
+    if not await adb.get_user(target_user_id):
         await update.message.reply_text("❌ User မတွေ့ရှိပါ!")
         return
 
-    current_balance = db.get_balance(target_user_id)
+    current_balance = await adb.get_balance(target_user_id)
     if current_balance < amount:
         await update.message.reply_text(
             f"❌ ***နှုတ်လို့မရပါ!***\n\n"
@@ -1392,8 +1573,8 @@ async def deduct_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    db.update_balance(target_user_id, -amount)
-    new_balance = db.get_balance(target_user_id)
+    await adb.update_balance(target_user_id, -amount)
+    new_balance = await adb.get_balance(target_user_id)
 
     try:
         user_msg = (
@@ -1471,7 +1652,7 @@ async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
         
     target_user_id = args[0]
-    user_data = db.get_user(target_user_id) # DB ထဲက user ကို ရှာပါ
+    user_data = await adb.get_user_context(target_user_id) # DB ထဲက user ကို ရှာပါ (projection)
 
     if not user_data:
         await update.message.reply_text(f"❌ User ID `{target_user_id}` ကို မတွေ့ရှိပါ။")
@@ -1479,8 +1660,8 @@ async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     # User Data တွေ ထုတ်ပါ
     balance = user_data.get("balance", 0)
-    total_orders = len(user_data.get("orders", []))
-    total_topups = len(user_data.get("topups", []))
+    total_orders = user_data.get("order_count", 0)
+    total_topups = user_data.get("topup_count", 0)
     name = user_data.get('name', 'Unknown').replace('*', '').replace('_', '').replace('`', '')
     username = user_data.get('username', 'None').replace('*', '').replace('_', '').replace('`', '')
     joined_at = user_data.get('joined_at', 'Unknown')[:10]
@@ -1490,12 +1671,8 @@ async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     referral_earnings = user_data.get('referral_earnings', 0)
 
     # Pending topup တွေကို စစ်ဆေးပါ
-    pending_topups_count = 0
-    pending_amount = 0
-    for topup in user_data.get("topups", []):
-        if topup.get("status") == "pending":
-            pending_topups_count += 1
-            pending_amount += topup.get("amount", 0)
+    pending_topups_count = user_data.get("pending_topup_count", 0)
+    pending_amount = user_data.get("pending_topup_amount", 0)
 
     status_msg = ""
     if pending_topups_count > 0:
@@ -1520,7 +1697,10 @@ async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await update.message.reply_text(report_msg, parse_mode="Markdown")
 
 async def check_all_users_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """(Owner Only) User အားလုံး၏ data များကို list ဖြင့် စစ်ဆေးပါ။"""
+    """
+    (ပြင်ဆင်ပြီး) (Owner Only) User အားလုံး၏ data ကို CSV file တစ်ခုတည်းအဖြစ် ပို့ပါ။
+    Options (key=value): sort=balance|orders|topups|commission|name, balance_above=<ငွေ> (0 = လက်ကျန်ရှိသူများ), top=<N>
+    """
     user_id = str(update.effective_user.id)
     
     # Owner (ADMIN_ID) သာ သုံးခွင့်ပြုပါ
@@ -1528,58 +1708,47 @@ async def check_all_users_command(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("❌ ဤ command ကို Bot Owner (ADMIN_ID) တစ်ဦးတည်းသာ အသုံးပြုနိုင်ပါသည်။")
         return
 
+    usage = (
+        "❌ Format မှားနေပါပြီ!\n"
+        "`/checkallusers [sort=balance|orders|topups|commission|name] [balance_above=0] [top=50]`\n\n"
+        "ဥပမာ: `/checkallusers sort=balance balance_above=0 top=50` (လက်ကျန်ရှိသူ ထိပ်ဆုံး 50)"
+    )
+    options = {}
+    for arg in context.args:
+        key, sep, value = arg.partition("=")
+        if not sep or key not in ("sort", "balance_above", "top"):
+            await update.message.reply_text(usage, parse_mode="Markdown")
+            return
+        options[key] = value.lower()
+
+    sort_by = options.get("sort")
+    if sort_by is not None and sort_by not in db.USER_EXPORT_SORTS:
+        await update.message.reply_text(usage, parse_mode="Markdown")
+        return
     try:
-        all_users = db.get_all_users()
-    except Exception as e:
-        await update.message.reply_text(f"❌ User data များကို DB မှ ဆွဲထုတ်ရာတွင် Error ဖြစ်နေပါသည်: {e}")
+        balance_above = int(options["balance_above"]) if "balance_above" in options else None
+        top_n = int(options["top"]) if "top" in options else None
+    except ValueError:
+        await update.message.reply_text(usage, parse_mode="Markdown")
         return
-
-    if not all_users:
-        await update.message.reply_text("ℹ️ Bot မှာ User တစ်ယောက်မှ မရှိသေးပါဘူး။")
+    if top_n is not None and top_n <= 0:
+        await update.message.reply_text(usage, parse_mode="Markdown")
         return
 
-    await update.message.reply_text(
-        f"📊 **All User Report**\n\n"
-        f"User စုစုပေါင်း `{len(all_users)}` ယောက်၏ data ကို စတင် စစ်ဆေးပါပြီ။\n"
-        f"User အရေအတွက် များပါက message များ ခွဲပို့ပါမည်။ ခဏစောင့်ပါ...",
-        parse_mode="Markdown"
-    )
-
-    message_chunk = "--- 📊 **All User Data Report** ---\n\n"
-    users_count = 0
-    
-    for user_data in all_users:
-        users_count += 1
-        
-        # DB မှ data များကို ဆွဲထုတ်ပါ
-        uid = user_data.get("user_id", "N/A")
-        name = user_data.get("name", "Unknown").replace('`', '').replace('*', '') # Markdown error မတက်အောင် clean လုပ်
-        balance = user_data.get("balance", 0)
-        orders_count = len(user_data.get("orders", []))
-        topups_count = len(user_data.get("topups", []))
-        commission = user_data.get("referral_earnings", 0) # Affiliate commission
-        
-        # User တစ်ယောက်ချင်းစီအတွက် စာကြောင်း
-        line = (
-            f"❖ **{name}** ● `{uid}` ●\n"
-            f"  ◈Bᴀʟᴀɴᴄᴇ↝ {balance:,} | ◈Oʀᴅᴇʀ↝ {orders_count} | ◈Tᴏᴘᴜᴘ↝ {topups_count} | ◈Cᴏᴍᴍɪssɪᴏɴ↝ {commission:,}\n"
-            f"----------------------------\n"
+    filters_text = ", ".join(f"{key}={value}" for key, value in options.items()) or "-"
+    try:
+        sent = await send_export_file(
+            update, adb.export_users_csv,
+            f"users_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+            f"📊 ***All User Report***\n👥 User: `{{count}}` ယောက်\n⚙️ Options: `{filters_text}`",
+            sort_by=sort_by, balance_above=balance_above, limit=top_n
         )
-        
-        # Telegram Message Limit (4096) မကျော်အောင် စစ်ဆေးပါ
-        if len(message_chunk) + len(line) > 4000:
-            # Message အရမ်းရှည်လာရင် အပိုင်းဖြတ်ပြီး ပို့ပါ
-            await update.message.reply_text(message_chunk, parse_mode="Markdown")
-            # Message အသစ် ပြန်စပါ
-            message_chunk = ""
-        
-        message_chunk += line
+    except Exception as e:
+        await update.message.reply_text(f"❌ User data များကို DB မှ ဆွဲထုတ်ရာတွင် Error ဖြစ်နေပါသည်: {e}")
+        return
 
-    # နောက်ဆုံး ကျန်နေတဲ့ message chunk ကို ပို့ပါ
-    if message_chunk:
-        await update.message.reply_text(message_chunk, parse_mode="Markdown")
-        
-    await update.message.reply_text(f"✅ Report ပြီးပါပြီ။ User `{users_count}` ယောက်လုံးကို စစ်ဆေးပြီးပါပြီ။")
+    if not sent:
+        await update.message.reply_text("ℹ️ သတ်မှတ်ချက်နှင့် ကိုက်ညီသော User တစ်ယောက်မှ မရှိပါဘူး။")
 
 
 async def clean_python_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1668,24 +1837,9 @@ async def _send_registration_to_admins(user: User, context: ContextTypes.DEFAULT
     )
 
     try:
-        user_photos = await context.bot.get_user_profile_photos(user_id=int(user_id), limit=1)
-        photo_id = user_photos.photos[0][0].file_id if user_photos.total_count > 0 else None
-        
-        load_admin_ids_global() # Admin list ကို DB မှ ပြန်ခေါ်ပါ
-        for admin_id in ADMIN_IDS:
-            try:
-                if photo_id:
-                    await context.bot.send_photo(
-                        chat_id=admin_id, photo=photo_id, caption=owner_msg,
-                        parse_mode="Markdown", reply_markup=reply_markup
-                    )
-                else:
-                    await context.bot.send_message(
-                        chat_id=admin_id, text=owner_msg, 
-                        parse_mode="Markdown", reply_markup=reply_markup
-                    )
-            except Exception as e_inner:
-                 print(f"Failed to send register request to admin {admin_id}: {e_inner}")
+        photo_id = await get_profile_photo_id(context.bot, user_id)
+        await adb.enqueue_notifications(admin_notifications(owner_msg, reply_markup=reply_markup, photo=photo_id))
+        kick_outbox(context)
     except Exception as e:
         print(f"Error sending registration request to admins: {e}")
 
@@ -1696,7 +1850,6 @@ async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = str(user.id)
     
-    load_authorized_users()
     if is_user_authorized(user_id):
         await update.message.reply_text("✅ သင်သည် အသုံးပြုခွင့် ရပြီးသား ဖြစ်ပါတယ်!\n\n🚀 /start နှိပ်ပါ။")
         return
@@ -1712,10 +1865,10 @@ async def register_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     try:
         # Try to reply with photo
-        user_photos = await context.bot.get_user_profile_photos(user_id=int(user_id), limit=1)
-        if user_photos.total_count > 0:
+        photo_id = await get_profile_photo_id(context.bot, user_id)
+        if photo_id:
             await update.message.reply_photo(
-                photo=user_photos.photos[0][0].file_id,
+                photo=photo_id,
                 caption=user_confirm_msg,
                 parse_mode="Markdown"
             )
@@ -1738,14 +1891,12 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     target_user_id = args[0]
-    load_authorized_users()
 
     if target_user_id not in AUTHORIZED_USERS:
         await update.message.reply_text("ℹ️ User သည် authorize မလုပ်ထားပါ။")
         return
 
-    db.remove_authorized_user(target_user_id)
-    load_authorized_users()
+    await unauthorize_user(target_user_id)
 
     try:
         await context.bot.send_message(
@@ -1759,7 +1910,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
     try:
-        user_doc = db.get_user(target_user_id)
+        user_doc = await adb.get_user(target_user_id)
         user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
         await context.bot.send_message(
             chat_id=ADMIN_ID,
@@ -1773,7 +1924,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
     try:
-        user_doc = db.get_user(target_user_id)
+        user_doc = await adb.get_user(target_user_id)
         user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
         group_msg = (
             f"🚫 ***User Ban ဖြစ်ပါပြီ!***\n\n"
@@ -1785,7 +1936,7 @@ async def ban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
             msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
             
-            db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
+            await queue_auto_delete(context, msg_obj)
     except Exception as e:
         print(f"Error sending to admin group in ban_command: {e}")
         pass
@@ -1811,14 +1962,12 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     target_user_id = args[0]
-    load_authorized_users()
 
     if target_user_id in AUTHORIZED_USERS:
         await update.message.reply_text("ℹ️ User သည် authorize ပြုလုပ်ထားပြီးပါပြီ။")
         return
 
-    db.add_authorized_user(target_user_id)
-    load_authorized_users()
+    await authorize_user(target_user_id)
 
     if target_user_id in user_states:
         del user_states[target_user_id]
@@ -1835,7 +1984,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
     try:
-        user_doc = db.get_user(target_user_id)
+        user_doc = await adb.get_user(target_user_id)
         user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
         await context.bot.send_message(
             chat_id=ADMIN_ID,
@@ -1849,7 +1998,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         pass
 
     try:
-        user_doc = db.get_user(target_user_id)
+        user_doc = await adb.get_user(target_user_id)
         user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
         
         group_msg = (
@@ -1862,7 +2011,7 @@ async def unban_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
             msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
             
-            db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
+            await queue_auto_delete(context, msg_obj)
             
     except Exception as e:
         print(f"Error sending to admin group in unban_command: {e}")
@@ -1903,9 +2052,9 @@ async def maintenance_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     new_status = (status == "on")
     
     # Update DB
-    db.update_setting(f"maintenance.{feature}", new_status)
+    await adb.update_setting(f"maintenance.{feature}", new_status)
     # Reload local settings from DB
-    load_global_settings()
+    await load_global_settings()
 
     status_text = "🟢 ***ဖွင့်ထား***" if new_status else "🔴 ***ပိတ်ထား***"
     feature_text = {
@@ -1979,7 +2128,7 @@ async def setprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    custom_prices = load_prices()
+    custom_prices = await load_prices()
     item = args[0].lower()
 
     # Handle batch updates
@@ -2012,7 +2161,7 @@ async def setprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ ဈေးနှုန်းများ ကိန်းဂဏန်းဖြင့် ထည့်ပါ!")
             return
         
-        save_prices(custom_prices)
+        await save_prices(custom_prices)
         await update.message.reply_text(
             f"✅ ***Normal Diamonds ဈေးနှုန်းများ ပြောင်းလဲပါပြီ!***\n\n"
             f"💎 ***Update လုပ်ပြီး***: {len(updated_items)} items\n\n"
@@ -2048,7 +2197,7 @@ async def setprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ ဈေးနှုန်းများ ကိန်းဂဏန်းဖြင့် ထည့်ပါ!")
             return
         
-        save_prices(custom_prices)
+        await save_prices(custom_prices)
         await update.message.reply_text(
             f"✅ ***2X Diamonds ဈေးနှုန်းများ ပြောင်းလဲပါပြီ!***\n\n"
             f"💎 ***Update လုပ်ပြီး***: {len(updated_items)} items\n\n"
@@ -2093,7 +2242,7 @@ async def setprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     custom_prices[wp_key] = wp_price
                     updated_items.append(f"{wp_key}={wp_price:,}")
                 
-                save_prices(custom_prices)
+                await save_prices(custom_prices)
                 
                 items_text = "\n".join([f"• {item}" for item in updated_items])
                 await update.message.reply_text(
@@ -2109,7 +2258,7 @@ async def setprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Single item update
     custom_prices[item] = price
-    save_prices(custom_prices)
+    await save_prices(custom_prices)
 
     await update.message.reply_text(
         f"✅ ***ဈေးနှုန်း ပြောင်းလဲပါပြီ!***\n\n"
@@ -2134,13 +2283,13 @@ async def removeprice_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     item = args[0]
-    custom_prices = load_prices()
+    custom_prices = await load_prices()
     if item not in custom_prices:
         await update.message.reply_text(f"❌ `{item}` မှာ custom price မရှိပါ!")
         return
 
     del custom_prices[item]
-    save_prices(custom_prices) # Save to DB
+    await save_prices(custom_prices) # Save to DB
 
     await update.message.reply_text(
         f"✅ ***Custom Price ဖျက်ပါပြီ!***\n\n"
@@ -2172,7 +2321,7 @@ async def setpubgprice_command(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return
 
-    custom_prices = db.load_pubg_prices()
+    custom_prices = await load_pubg_prices()
     updated_items = []
     
     try:
@@ -2195,7 +2344,7 @@ async def setpubgprice_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text(f"❌ Error: {e}")
         return
 
-    db.save_pubg_prices(custom_prices) # DB function အသစ်ကို ခေါ်ပါ
+    await save_pubg_prices(custom_prices) # DB + catalog ကို update
 
     await update.message.reply_text(
         f"✅ ***PUBG ဈေးနှုန်း ပြောင်းလဲပါပြီ!***\n\n"
@@ -2221,13 +2370,13 @@ async def removepubgprice_command(update: Update, context: ContextTypes.DEFAULT_
         return
 
     item = args[0].lower()
-    custom_prices = db.load_pubg_prices()
+    custom_prices = await load_pubg_prices()
     if item not in custom_prices:
         await update.message.reply_text(f"❌ `{item}` မှာ custom price မရှိပါ!")
         return
 
     del custom_prices[item]
-    db.save_pubg_prices(custom_prices) # DB function အသစ်ကို ခေါ်ပါ
+    await save_pubg_prices(custom_prices) # DB + catalog ကို update
 
     await update.message.reply_text(
         f"✅ ***PUBG Custom Price ဖျက်ပါပြီ!***\n\n"
@@ -2249,8 +2398,8 @@ async def setwavenum_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     new_number = args[0]
-    db.update_setting("payment_info.wave_number", new_number)
-    load_global_settings()
+    await adb.update_setting("payment_info.wave_number", new_number)
+    await load_global_settings()
 
     await update.message.reply_text(
         f"✅ ***Wave နံပါတ် ပြောင်းလဲပါပြီ!***\n\n"
@@ -2270,8 +2419,8 @@ async def setkpaynum_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     new_number = args[0]
-    db.update_setting("payment_info.kpay_number", new_number)
-    load_global_settings()
+    await adb.update_setting("payment_info.kpay_number", new_number)
+    await load_global_settings()
 
     await update.message.reply_text(
         f"✅ ***KPay နံပါတ် ပြောင်းလဲပါပြီ!***\n\n"
@@ -2291,8 +2440,8 @@ async def setwavename_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     new_name = " ".join(args)
-    db.update_setting("payment_info.wave_name", new_name)
-    load_global_settings()
+    await adb.update_setting("payment_info.wave_name", new_name)
+    await load_global_settings()
 
     await update.message.reply_text(
         f"✅ ***Wave နာမည် ပြောင်းလဲပါပြီ!***\n\n"
@@ -2312,8 +2461,8 @@ async def setkpayname_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     new_name = " ".join(args)
-    db.update_setting("payment_info.kpay_name", new_name)
-    load_global_settings()
+    await adb.update_setting("payment_info.kpay_name", new_name)
+    await load_global_settings()
 
     await update.message.reply_text(
         f"✅ ***KPay နာမည် ပြောင်းလဲပါပြီ!***\n\n"
@@ -2332,8 +2481,8 @@ async def setkpayqr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     photo = update.message.reply_to_message.photo[-1].file_id
-    db.update_setting("payment_info.kpay_image", photo)
-    load_global_settings()
+    await adb.update_setting("payment_info.kpay_image", photo)
+    await load_global_settings()
     await update.message.reply_text("✅ KPay QR Code ထည့်သွင်းပြီးပါပြီ!")
 
 async def removekpayqr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2342,8 +2491,8 @@ async def removekpayqr_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("❌ Owner သာ payment QR ဖျက်နိုင်ပါတယ်!")
         return
 
-    db.update_setting("payment_info.kpay_image", None)
-    load_global_settings()
+    await adb.update_setting("payment_info.kpay_image", None)
+    await load_global_settings()
     await update.message.reply_text("✅ KPay QR Code ဖျက်ပြီးပါပြီ!")
 
 async def setwaveqr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2356,8 +2505,8 @@ async def setwaveqr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     photo = update.message.reply_to_message.photo[-1].file_id
-    db.update_setting("payment_info.wave_image", photo)
-    load_global_settings()
+    await adb.update_setting("payment_info.wave_image", photo)
+    await load_global_settings()
     await update.message.reply_text("✅ Wave QR Code ထည့်သွင်းပြီးပါပြီ!")
 
 async def removewaveqr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2366,8 +2515,8 @@ async def removewaveqr_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("❌ Owner သာ payment QR ဖျက်နိုင်ပါတယ်!")
         return
 
-    db.update_setting("payment_info.wave_image", None)
-    load_global_settings()
+    await adb.update_setting("payment_info.wave_image", None)
+    await load_global_settings()
     await update.message.reply_text("✅ Wave QR Code ဖျက်ပြီးပါပြီ!")
 
 async def addadm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -2386,8 +2535,7 @@ async def addadm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ User သည် admin ဖြစ်နေပြီးပါပြီ။")
         return
 
-    db.add_admin(new_admin_id)
-    load_admin_ids_global()
+    await grant_admin(new_admin_id)
 
     try:
         await context.bot.send_message(
@@ -2426,8 +2574,7 @@ async def unadm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ User သည် admin မဟုတ်ပါ။")
         return
 
-    db.remove_admin(target_admin_id)
-    load_admin_ids_global()
+    await revoke_admin(target_admin_id)
 
     try:
         await context.bot.send_message(
@@ -2445,6 +2592,158 @@ async def unadm_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+# --- (အသစ်) Broadcast Engine ---
+# Broadcast ကို background job အဖြစ် run ပြီး cursor checkpoint ကို DB (broadcasts) ထဲ သိမ်းပါသည်။
+# Bot restart ဖြစ်ရင် post_init က ကျန်နေတဲ့ နေရာကနေ ဆက်ပို့ပါသည်။
+
+BROADCAST_RATE = 25 # တစ်စက္ကန့် message အများဆုံး (Telegram limit ~30/s)
+BROADCAST_BATCH_SIZE = 200 # DB ကနေ တစ်ခါ ဆွဲမယ့် chat ID အရေအတွက် (= checkpoint တစ်ခု)
+BROADCAST_PROGRESS_INTERVAL = 5 # စက္ကန့် - progress message ကို ဘယ်နှစ်ခါ edit မလဲ
+BROADCAST_MAX_RETRIES = 3 # RetryAfter ဖြစ်ရင် chat တစ်ခုကို ပြန်ကြိုးစားမယ့် အကြိမ်
+_broadcast_bucket = {"tokens": BROADCAST_RATE, "updated": 0.0, "paused_until": 0.0}
+_broadcast_lock = asyncio.Lock()
+_active_broadcasts = set()
+
+async def _broadcast_acquire():
+    """Token bucket - BROADCAST_RATE ထက် မမြန်စေရ။ (RetryAfter ခံရရင် ပို့တာအားလုံး ခဏရပ်)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        async with _broadcast_lock:
+            now = loop.time()
+            if now < _broadcast_bucket["paused_until"]:
+                wait = _broadcast_bucket["paused_until"] - now
+            else:
+                elapsed = now - _broadcast_bucket["updated"]
+                _broadcast_bucket["tokens"] = min(BROADCAST_RATE, _broadcast_bucket["tokens"] + elapsed * BROADCAST_RATE)
+                _broadcast_bucket["updated"] = now
+                if _broadcast_bucket["tokens"] >= 1:
+                    _broadcast_bucket["tokens"] -= 1
+                    return
+                wait = (1 - _broadcast_bucket["tokens"]) / BROADCAST_RATE
+        await asyncio.sleep(wait)
+
+def _broadcast_pause(seconds):
+    """Telegram က RetryAfter ပြန်ရင် bucket တစ်ခုလုံးကို ရပ်ထားပါ။"""
+    now = asyncio.get_running_loop().time()
+    _broadcast_bucket["paused_until"] = max(_broadcast_bucket["paused_until"], now + seconds)
+    _broadcast_bucket["tokens"] = 0
+
+async def _broadcast_send(bot, chat_id, broadcast, is_group):
+    """Chat တစ်ခုကို မူရင်း message ကို copy ပို့ပါ။ (အောင်မြင်ရင် True)"""
+    for _ in range(BROADCAST_MAX_RETRIES):
+        await _broadcast_acquire()
+        try:
+            msg_id = await bot.copy_message(
+                chat_id=chat_id, from_chat_id=broadcast["from_chat_id"], message_id=broadcast["message_id"]
+            )
+        except RetryAfter as e:
+            _broadcast_pause(_retry_after_seconds(e))
+            continue
+        except (Forbidden, BadRequest, ChatMigrated) as e:
+            # (အသစ်) Block/kick/migrate ဖြစ်တဲ့ chat ကို နောက်တစ်ခါ မပို့တော့အောင် ဖယ် (migrate ဆိုရင် ID အသစ်ကို ပြန်ပို့)
+            new_chat_id = await prune_unreachable_chat(chat_id, e)
+            if new_chat_id:
+                chat_id = new_chat_id
+                continue
+            if not _is_unreachable_chat(e):
+                print(f"Failed to broadcast to {chat_id}: {e}")
+            return False
+        except Exception as e:
+            print(f"Failed to broadcast to {chat_id}: {e}")
+            return False
+
+        if is_group and broadcast.get("should_pin"):
+            if await is_bot_admin_in_group(bot, chat_id):
+                try:
+                    await bot.pin_chat_message(chat_id=chat_id, message_id=msg_id.message_id, disable_notification=False)
+                except Exception as pin_e:
+                    print(f"Failed to pin message in group {chat_id}: {pin_e}")
+            else:
+                print(f"Cannot pin in group {chat_id}: Bot is not admin.")
+        return True
+    return False
+
+def _broadcast_report(broadcast, title):
+    targets = [f"Groups: {broadcast['group_success']} အောင်မြင်, {broadcast['group_fail']} မအောင်မြင်"]
+    if broadcast.get("send_to_users"):
+        targets.append(f"Users: {broadcast['user_success']} အောင်မြင်, {broadcast['user_fail']} မအောင်မြင်")
+    return (
+        f"{title}\n\n"
+        f"🆔 Broadcast ID: `{broadcast['_id']}`\n"
+        f"👥 {chr(10).join(targets)}\n"
+        f"📊 စုစုပေါင်း: {broadcast['user_success'] + broadcast['group_success']} ပို့ပြီး"
+    )
+
+async def _edit_broadcast_progress(bot, broadcast, text):
+    try:
+        await bot.edit_message_text(
+            chat_id=broadcast["progress_chat_id"], message_id=broadcast["progress_message_id"],
+            text=text, parse_mode="Markdown"
+        )
+    except Exception:
+        pass
+
+async def broadcast_job(context: ContextTypes.DEFAULT_TYPE):
+    """(Background Job) Broadcast တစ်ခုကို checkpoint ရှိတဲ့ နေရာကနေ ဆက်ပို့ပါ။"""
+    broadcast_id = context.job.data
+    if broadcast_id in _active_broadcasts:
+        return
+    _active_broadcasts.add(broadcast_id) # await မတိုင်ခင် ယူထားပါ (concurrent run နှစ်ခု မဖြစ်စေရန်)
+    bot = context.bot
+    try:
+        broadcast = await adb.get_broadcast(broadcast_id)
+        if not broadcast or broadcast.get("status") != "running":
+            return
+
+        phases = (["users"] if broadcast.get("send_to_users") else []) + ["groups"]
+        phases = phases[phases.index(broadcast["phase"]):]
+        cursor = broadcast.get("cursor")
+        loop = asyncio.get_running_loop()
+        last_progress = loop.time()
+
+        for phase in phases:
+            if phase != broadcast["phase"]:
+                cursor = None
+                broadcast["phase"] = phase
+                if not await adb.checkpoint_broadcast(broadcast_id, cursor, phase=phase):
+                    break # Cancel လုပ်ထား
+
+            prefix = "user" if phase == "users" else "group"
+            while True:
+                targets = await adb.get_broadcast_targets(phase, cursor, BROADCAST_BATCH_SIZE)
+                if not targets:
+                    break
+
+                results = await asyncio.gather(*[
+                    _broadcast_send(bot, int(chat_id), broadcast, phase == "groups") for chat_id in targets
+                ])
+                counters = {f"{prefix}_success": sum(results), f"{prefix}_fail": len(results) - sum(results)}
+                for key, value in counters.items():
+                    broadcast[key] += value
+                cursor = targets[-1]
+
+                if not await adb.checkpoint_broadcast(broadcast_id, cursor, counters):
+                    break # Cancel လုပ်ထား
+
+                if loop.time() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+                    last_progress = loop.time()
+                    await _edit_broadcast_progress(bot, broadcast, _broadcast_report(
+                        broadcast, f"📡 ***Broadcast ပို့နေသည်...*** ({phase})\n🛑 ရပ်ရန်: `/cancelbroadcast {broadcast_id}`"
+                    ))
+
+        finished = await adb.finish_broadcast(broadcast_id)
+        if finished:
+            await _edit_broadcast_progress(bot, finished, _broadcast_report(finished, "✅ Broadcast အောင်မြင်ပါပြီ!"))
+        else:
+            # Cancel ထားပြီးသား - DB ထဲက နောက်ဆုံး count နဲ့ ပြ
+            cancelled = await adb.get_broadcast(broadcast_id) or broadcast
+            await _edit_broadcast_progress(bot, cancelled, _broadcast_report(cancelled, "🛑 Broadcast ရပ်လိုက်ပါပြီ!"))
+    except Exception as e:
+        # Status က "running" အတိုင်း ကျန်နေမို့ bot ပြန်တက်ရင် checkpoint ကနေ ဆက်ပို့ပါမယ်
+        print(f"Error in broadcast {broadcast_id}: {e}")
+    finally:
+        _active_broadcasts.discard(broadcast_id)
+
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
     
@@ -2468,118 +2767,47 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # --- (ကိုကို ပို့ထားတဲ့ Logic အတိုင်း) ---
     should_pin = "-pin" in args
-    send_to_users = "-user" in args # True if -user exists
-    send_to_groups = True           # Always True
-    # --- (ပြီး) ---
-
-    replied_msg = update.message.reply_to_message
-    user_success = 0
-    user_fail = 0
-    group_success = 0
-    group_fail = 0
-
-    all_users = db.get_all_users()
-
-    if replied_msg.photo:
-        photo_file_id = replied_msg.photo[-1].file_id
-        caption = replied_msg.caption or ""
-        caption_entities = replied_msg.caption_entities or None
-
-        if send_to_users:
-            for user_doc in all_users:
-                uid = user_doc.get("user_id")
-                try:
-                    await context.bot.send_photo(
-                        chat_id=int(uid), photo=photo_file_id, caption=caption, caption_entities=caption_entities
-                    )
-                    user_success += 1
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    print(f"Failed to send photo to user {uid}: {e}")
-                    user_fail += 1
-        
-        if send_to_groups:
-            # (db.get_all_groups() ကို သုံးထားပြီးသား)
-            group_chats = db.get_all_groups() 
-            
-            for chat_id in group_chats:
-                try:
-                    msg_obj = await context.bot.send_photo(
-                        chat_id=chat_id, photo=photo_file_id, caption=caption, caption_entities=caption_entities
-                    )
-                    
-                    if should_pin:
-                        if await is_bot_admin_in_group(context.bot, chat_id):
-                            try:
-                                await msg_obj.pin(disable_notification=False)
-                            except Exception as pin_e:
-                                print(f"Failed to pin message in group {chat_id}: {pin_e}")
-                        else:
-                            print(f"Cannot pin in group {chat_id}: Bot is not admin.")
-                            
-                    group_success += 1
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    print(f"Failed to send photo to group {chat_id}: {e}")
-                    group_fail += 1
-
-    elif replied_msg.text:
-        message = replied_msg.text
-        entities = replied_msg.entities or None
-
-        if send_to_users:
-            for user_doc in all_users:
-                uid = user_doc.get("user_id")
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(uid), text=message, entities=entities
-                    )
-                    user_success += 1
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    print(f"Failed to send to user {uid}: {e}")
-                    user_fail += 1
-
-        if send_to_groups:
-            # (db.get_all_groups() ကို သုံးထားပြီးသား)
-            group_chats = db.get_all_groups()
-
-            for chat_id in group_chats:
-                try:
-                    msg_obj = await context.bot.send_message(
-                        chat_id=chat_id, text=message, entities=entities
-                    )
-                    
-                    if should_pin:
-                        if await is_bot_admin_in_group(context.bot, chat_id):
-                            try:
-                                await msg_obj.pin(disable_notification=False)
-                            except Exception as pin_e:
-                                print(f"Failed to pin message in group {chat_id}: {pin_e}")
-                        else:
-                            print(f"Cannot pin in group {chat_id}: Bot is not admin.")
-                            
-                    group_success += 1
-                    await asyncio.sleep(0.05)
-                except Exception as e:
-                    print(f"Failed to send to group {chat_id}: {e}")
-                    group_fail += 1
-    else:
+    send_to_users = "-user" in args # True if -user exists
+    # (Group တွေကို အမြဲပို့)
+    # --- (ပြီး) ---
+
+    replied_msg = update.message.reply_to_message
+    if not (replied_msg.photo or replied_msg.text):
         await update.message.reply_text("❌ Text သို့မဟုတ် Photo သာ broadcast လုပ်နိုင်ပါတယ်!")
         return
 
-    targets = []
-    if send_to_groups:
-        targets.append(f"Groups: {group_success} အောင်မြင်, {group_fail} မအောင်မြင်")
-    if send_to_users:
-        targets.append(f"Users: {user_success} အောင်မြင်, {user_fail} မအောင်မြင်")
-
-    await update.message.reply_text(
-        f"✅ Broadcast အောင်မြင်ပါပြီ!\n\n"
-        f"👥 {chr(10).join(targets)}\n"
-        f"📊 စုစုပေါင်း: {user_success + group_success} ပို့ပြီး",
+    # (ပြင်ဆင်ပြီး) Background job အဖြစ် run - bot က တခြား update များကို ဆက်ကိုင်နိုင်
+    broadcast_id = await adb.next_id("BC")
+    progress_msg = await update.message.reply_text(
+        f"📡 ***Broadcast စတင်ပါပြီ...***\n\n"
+        f"🆔 Broadcast ID: `{broadcast_id}`\n"
+        f"🛑 ရပ်ရန်: `/cancelbroadcast {broadcast_id}`",
         parse_mode="Markdown"
     )
+    await adb.create_broadcast(broadcast_id, {
+        "from_chat_id": replied_msg.chat_id,
+        "message_id": replied_msg.message_id,
+        "send_to_users": send_to_users,
+        "should_pin": should_pin,
+        "started_by": user_id,
+        "progress_chat_id": progress_msg.chat_id,
+        "progress_message_id": progress_msg.message_id,
+    })
+    context.job_queue.run_once(broadcast_job, 0, data=broadcast_id)
+
+async def cancel_broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """(အသစ်) Run နေသော broadcast ကို ရပ်ပါ။ (ID မပေးရင် အားလုံး)"""
+    user_id = str(update.effective_user.id)
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ Admin များသာ broadcast ရပ်နိုင်ပါတယ်!")
+        return
+
+    broadcast_id = context.args[0] if context.args else None
+    count = await adb.cancel_broadcasts(broadcast_id)
+    if count:
+        await update.message.reply_text(f"🛑 Broadcast {count} ခု ရပ်လိုက်ပါပြီ။")
+    else:
+        await update.message.reply_text("ℹ️ Run နေသော broadcast မရှိပါ။")
 
 async def clean_mongodb_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -2619,7 +2847,7 @@ async def clean_mongodb_command(update: Update, context: ContextTypes.DEFAULT_TY
     )
     
     try:
-        success = db.wipe_all_data()
+        success = await adb.wipe_all_data()
         
         if success:
             await update.message.reply_text(
@@ -2630,9 +2858,10 @@ async def clean_mongodb_command(update: Update, context: ContextTypes.DEFAULT_TY
             )
             
             # Data များ ဖျက်ပြီးပါက၊ Bot ၏ in-memory settings များကိုပါ default သို့ ပြန် reload လုပ်ပါ
-            load_global_settings()
-            load_authorized_users()
-            load_admin_ids_global()
+            await load_global_settings()
+            await load_authorized_users()
+            await load_admin_ids_global()
+            await load_price_catalog()
             
         else:
             await update.message.reply_text("❌ ***FAILED***\n\nDatabase ကို ဖျက်ရာတွင် အမှားတစ်ခုခု ဖြစ်ပွားခဲ့သည်။")
@@ -2640,8 +2869,42 @@ async def clean_mongodb_command(update: Update, context: ContextTypes.DEFAULT_TY
     except Exception as e:
         await update.message.reply_text(f"❌ ***CRITICAL ERROR***\n\nAn error occurred: {str(e)}")
 
+AUTO_DELETE_BATCH_SIZE = 100 # Telegram delete_messages တစ်ခါ ခေါ်ရင် အများဆုံး message ID
+AUTO_DELETE_JOB_NAME = "auto_delete"
+
+# --- (အသစ်) Auto-Delete Scheduling ---
+# Queue entry တိုင်းမှာ delete_at (deadline) ကို DB ထဲ သိမ်းပြီး အစောဆုံး deadline ရောက်မှ
+# auto_delete_job ကို run_once ဖြင့် တစ်ကြိမ်သာ နှိုးပါသည်။ (Queue လွတ်နေရင် ဘာ job မှ မရှိ)
+# Bot restart ဖြစ်ရင် post_init က DB ထဲက deadline ကနေ timer ကို ပြန်ချိန်ပါသည်။
+
+def arm_auto_delete(job_queue, delete_at):
+    """delete_at မှာ auto_delete_job ကို run မယ့် timer ချိန်ပါ။ (ချိန်ထားပြီးသား timer က ပိုစောရင် မပြောင်း)"""
+    jobs = job_queue.get_jobs_by_name(AUTO_DELETE_JOB_NAME)
+    if jobs and jobs[0].next_t and jobs[0].next_t <= delete_at.astimezone():
+        return
+    for job in jobs:
+        job.schedule_removal()
+    delay = max((delete_at - datetime.now()).total_seconds(), 0)
+    job_queue.run_once(auto_delete_job, delay, name=AUTO_DELETE_JOB_NAME)
+
+async def schedule_auto_delete(job_queue):
+    """DB ထဲက အစောဆုံး deadline အတိုင်း timer ကို ပြန်ချိန်ပါ။ (Auto-delete ပိတ်ထားရင် မချိန်)"""
+    if not g_settings.get("auto_delete", {}).get("enabled", False):
+        return
+    next_deadline = await adb.get_next_delete_deadline()
+    if next_deadline:
+        arm_auto_delete(job_queue, next_deadline)
+
+async def queue_auto_delete(context: ContextTypes.DEFAULT_TYPE, msg_obj):
+    """ပို့ပြီးသား message ကို setting ထဲက hours ကြာရင် ဖျက်ဖို့ queue ထဲ ထည့်ပါ။"""
+    hours_to_keep = g_settings.get("auto_delete", {}).get("hours", 24)
+    delete_at = datetime.now() + timedelta(hours=hours_to_keep)
+    await adb.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, delete_at)
+    if g_settings.get("auto_delete", {}).get("enabled", False):
+        arm_auto_delete(context.job_queue, delete_at)
+
 async def auto_delete_job(context: ContextTypes.DEFAULT_TYPE):
-    """(Timer Job) DB ထဲက message အဟောင်းတွေကို လိုက်ဖျက်မယ့် function"""
+    """(Timer Job) ဖျက်ရမယ့်အချိန် ရောက်ပြီးသား message တွေကို ဖျက်ပြီး နောက် deadline ကို ချိန်ပါ။"""
     
     # (၁) Setting ကို အရင်စစ်
     if not g_settings.get("auto_delete", {}).get("enabled", False):
@@ -2650,33 +2913,47 @@ async def auto_delete_job(context: ContextTypes.DEFAULT_TYPE):
         
     print(f"Running auto-delete job... (Time: {datetime.now()})")
     
-    hours_to_keep = g_settings.get("auto_delete", {}).get("hours", 24)
-    delete_before_time = datetime.now() - timedelta(hours=hours_to_keep)
-    
-    messages_to_delete = db.get_all_messages_to_delete()
-    
     deleted_count = 0
     failed_count = 0
-    
-    for msg in messages_to_delete:
-        try:
-            msg_timestamp = datetime.fromisoformat(msg["timestamp"])
-            
-            # (၂) အချိန်စစ်
-            if msg_timestamp < delete_before_time:
-                await context.bot.delete_message(chat_id=msg["chat_id"], message_id=msg["message_id"])
-                db.remove_message_from_delete_queue(msg["message_id"])
-                deleted_count += 1
-                await asyncio.sleep(0.5) # API limit မမိအောင် ခဏနား
-                
-        except Exception as e:
-            # Message က 48 နာရီ ကျော်သွားလို့ ဖျက်မရတော့ရင် (ဒါမှမဟုတ်) Bot က Admin မဟုတ်တော့ရင်
-            print(f"Failed to delete message {msg['message_id']}: {e}")
-            db.remove_message_from_delete_queue(msg["message_id"]) # DB ထဲကနေ ဖယ်ထုတ်
-            failed_count += 1
+
+    # (ပြင်ဆင်ပြီး) (၂) ဖျက်ရမယ့်အချိန် ရောက်ပြီးသား message များကိုသာ DB မှာ စစ်ယူ
+    while True:
+        messages_to_delete = await adb.get_expired_messages(datetime.now())
+        if not messages_to_delete:
+            break
+
+        # Chat အလိုက် စုပြီး 100 ခုစီ batch ဖြင့် ဖျက်
+        by_chat = {}
+        for msg in messages_to_delete:
+            by_chat.setdefault(msg["chat_id"], []).append(msg["message_id"])
+
+        for chat_id, message_ids in by_chat.items():
+            for i in range(0, len(message_ids), AUTO_DELETE_BATCH_SIZE):
+                batch = message_ids[i:i + AUTO_DELETE_BATCH_SIZE]
+                try:
+                    await context.bot.delete_messages(chat_id=chat_id, message_ids=batch)
+                    deleted_count += len(batch)
+                except RetryAfter as e:
+                    await asyncio.sleep(_retry_after_seconds(e))
+                    try:
+                        await context.bot.delete_messages(chat_id=chat_id, message_ids=batch)
+                        deleted_count += len(batch)
+                    except Exception as retry_e:
+                        print(f"Failed to delete messages in {chat_id}: {retry_e}")
+                        failed_count += len(batch)
+                except Exception as e:
+                    # Message က 48 နာရီ ကျော်သွားလို့ ဖျက်မရတော့ရင် (ဒါမှမဟုတ်) Bot က Admin မဟုတ်တော့ရင်
+                    print(f"Failed to delete messages in {chat_id}: {e}")
+                    failed_count += len(batch)
+
+        # ဖျက်ပြီး/ဖျက်မရတာ အားလုံးကို DB ထဲကနေ တစ်ခါတည်း ဖယ်ထုတ်
+        await adb.remove_messages_from_delete_queue([msg["_id"] for msg in messages_to_delete])
 
     print(f"Auto-delete job finished. Deleted: {deleted_count}, Failed/Removed: {failed_count}")
 
+    # (အသစ်) နောက် deadline အတွက် timer ကို ပြန်ချိန်
+    await schedule_auto_delete(context.job_queue)
+
 async def set_auto_delete_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """(Owner Only) Admin Group message များကို auto ဖျက်မလား ဖွင့်/ပိတ်။"""
     user_id = str(update.effective_user.id)
@@ -2692,11 +2969,12 @@ async def set_auto_delete_command(update: Update, context: ContextTypes.DEFAULT_
     new_status = (args[0].lower() == "on") # True or False
     
     # DB ကို update လုပ်ပါ
-    db.update_setting("auto_delete.enabled", new_status)
+    await adb.update_setting("auto_delete.enabled", new_status)
     # Local settings ကို reload လုပ်ပါ
-    load_global_settings()
+    await load_global_settings()
     
     if new_status:
+        await schedule_auto_delete(context.job_queue) # (အသစ်) Queue ထဲ ကျန်နေတာတွေအတွက် timer ပြန်ချိန်
         hours = g_settings.get("auto_delete", {}).get("hours", 24)
         await update.message.reply_text(
             f"✅ **Auto-Delete ဖွင့်လိုက်ပါပြီ။**\n\n"
@@ -2732,10 +3010,10 @@ async def setpercentage_command(update: Update, context: ContextTypes.DEFAULT_TY
         percentage_float = percentage_input / 100.0
         
         # DB ကို update လုပ်ပါ
-        db.update_setting("affiliate.percentage", percentage_float)
+        await adb.update_setting("affiliate.percentage", percentage_float)
         
         # Local settings ကို reload လုပ်ပါ
-        load_global_settings() 
+        await load_global_settings() 
         
         await update.message.reply_text(
             f"✅ **Commission Percentage ပြောင်းလဲပါပြီ!**\n\n"
@@ -2776,6 +3054,7 @@ async def sasukemlbbtopup_command(update: Update, context: ContextTypes.DEFAULT_
 `/cancel` - ငွေဖြည့်ခြင်း ပယ်ဖျက်ရန်
 `/register` - Bot သုံးခွင့် တောင်းဆိုရန်
 `/affiliate` - ကော်မရှင်လင့်ရယူရန်
+`/exporthistory` - မှတ်တမ်းအပြည့်အစုံ CSV file ရယူရန်
 
 ---
 🔧 **Admin Commands** (Admin များ)
@@ -2784,6 +3063,7 @@ async def sasukemlbbtopup_command(update: Update, context: ContextTypes.DEFAULT_
 `/deduct` - (user\_id amount) - Balance နှုတ်ရန်
 `/reply` - (user\_id message) - User ထံ reply ပြန်ရန်
 `/done` - (user\_id) - "Order Done" message ပို့ရန်
+`/exporthistory` - (user\_id) - User ၏ မှတ်တမ်း CSV file ရယူရန်
 `/ban` - (user\_id) - User ကို ban ရန်
 `/unban` - (user\_id) - User ကို unban ရန်
 `/adminhelp` - Admin command များ ကြည့်ရန်
@@ -2807,6 +3087,7 @@ async def sasukemlbbtopup_command(update: Update, context: ContextTypes.DEFAULT_
 `/addadm` - (user\_id) - Admin အသစ်ခန့်ရန်
 `/unadm` - (user\_id) - Admin ဖြုတ်ရန်
 `/broadcast` - (Reply) - Message အားလုံး ပို့ရန်
+`/cancelbroadcast` - (id) - Run နေသော broadcast ရပ်ရန်
 `/setkpayqr` - (Reply Photo) - KPay QR ထည့်ရန်
 `/removekpayqr` - KPay QR ဖျက်ရန်
 `/setwaveqr` - (Reply Photo) - Wave QR ထည့်ရန်
@@ -2821,6 +3102,8 @@ async def sasukemlbbtopup_command(update: Update, context: ContextTypes.DEFAULT_
 `/d` - Daily report
 `/m` - Monthly report
 `/y` - Yearly report
+`/rebuildstats` - Report data ပြန်တွက်ရန် (Order မဝင်ချိန်မှာ run ပါ)
+`/indexreport` - (fix) - DB index အခြေအနေ စစ်ရန်
 """
     
     await update.message.reply_text(command_list_text, parse_mode="Markdown")
@@ -2834,9 +3117,8 @@ async def adminhelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_user_owner = is_owner(user_id)
     
     # Reload all settings from DB for accurate status
-    load_global_settings()
-    load_authorized_users()
-    load_admin_ids_global()
+    await load_global_settings()
+    await load_admin_ids_global()
 
     help_msg = "🔧 *Admin Commands List* 🔧\n\n"
 
@@ -2847,13 +3129,15 @@ async def adminhelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "• /unadm <user\\_id> - Admin ဖြုတ်ခြင်း\n"
             "• /ban <user\\_id> - User ban လုပ်\n"
             "• /unban <user\\_id> - User unban လုပ်\n"
-            "• /broadcast - (Reply) Users/Groups သို့ message ပို့\n\n"
+            "• /broadcast - (Reply) Users/Groups သို့ message ပို့\n"
+            "• /cancelbroadcast - Run နေသော broadcast ရပ်\n\n"
         )
 
     help_msg += (
         "💰 *Balance Management:*\n"
         "• /approve <user\\_id> <amount> - Topup approve လုပ်\n"
-        "• /deduct <user\\_id> <amount> - Balance နှုတ်ခြင်း\n\n"
+        "• /deduct <user\\_id> <amount> - Balance နှုတ်ခြင်း\n"
+        "• /exporthistory <user\\_id> - User မှတ်တမ်း CSV file ရယူ\n\n"
         "💬 *Communication:*\n"
         "• /reply <user\\_id> <message> - User ကို message ပို့\n"
         "• /done <user\\_id> - Order complete message ပို့\n"
@@ -2883,6 +3167,7 @@ async def adminhelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # --- (ပြင်ဆင်ပြီး) % ကို g_settings ကနေ ယူပါ ---
     current_percentage = g_settings.get("affiliate", {}).get("percentage", 0.03) * 100
+    outbox_stats = await adb.get_outbox_stats() # (အသစ်) မပို့ရသေးသော / dead-letter notification များ
     help_msg += (
         "📊 *Current Status (from DB):*\n"
         f"• Orders: {'🟢 Enabled' if g_settings['maintenance']['orders'] else '🔴 Disabled'}\n"
@@ -2890,7 +3175,8 @@ async def adminhelp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• General: {'🟢 Enabled' if g_settings['maintenance']['general'] else '🔴 Disabled'}\n"
         f"• Affiliate Commission: {current_percentage:.2f}%\n"
         f"• Authorized Users: {len(AUTHORIZED_USERS)}\n"
-        f"• Total Admins: {len(ADMIN_IDS)}\n\n"
+        f"• Total Admins: {len(ADMIN_IDS)}\n"
+        f"• Outbox: {outbox_stats['pending']} pending, {outbox_stats['dead']} dead-letter\n\n"
         f"💳 *Current Payment Info (from DB):*\n"
         f"• Wave: {g_settings['payment_info']['wave_number']} ({g_settings['payment_info']['wave_name']})\n"
         f"• KPay: {g_settings['payment_info']['kpay_number']} ({g_settings['payment_info']['kpay_name']})"
@@ -2910,6 +3196,8 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_type = update.effective_chat.type
 
     if user_id not in pending_topups:
+        if user_states.get(user_id) == "waiting_approval":
+            return # Album ၏ ကျန်ပုံများ / ထပ်ပို့သော screenshot (ပထမပုံက topup တင်ပြီးပါပြီ)
         if chat_type == "private":
             # Private chat မှာ Topup မရှိဘဲ ပုံပို့ရင် စာပြန်
             await update.message.reply_text(
@@ -2925,7 +3213,6 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # --- (ပြီး) ---
     
     # (ဒီနေရာကို ရောက်လာရင် user က topup လုပ်နေတာ သေချာပြီ)
-    load_authorized_users()
     if not is_user_authorized(user_id):
         return
 
@@ -2949,78 +3236,70 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
+    # (ပြင်ဆင်ပြီး) concurrent_updates ကြောင့် - ပထမ await မတိုင်ခင် pending state ကို ယူထားပါ
+    # (Album / အမြန်ထပ်ပို့သော screenshot က payment တစ်ခုအတွက် topup နှစ်ခု မဖြစ်စေရန်)
+    pending = pending_topups.pop(user_id)
     user_states[user_id] = "waiting_approval"
-    topup_id = f"TOP{datetime.now().strftime('%Y%m%d%H%M%S')}{user_id[-4:]}"
-    user_name = f"{update.effective_user.first_name} {update.effective_user.last_name or ''}".strip()
-
-    admin_msg = (
-        f"💳 ***ငွေဖြည့်တောင်းဆိုမှု***\n\n"
-        f"👤 User Name: [{user_name}](tg://user?id={user_id})\n"
-        f"🆔 User ID: `{user_id}`\n"
-        f"💰 Amount: `{amount:,} MMK`\n"
-        f"📱 Payment: {payment_method.upper()}\n"
-        f"🔖 Topup ID: `{topup_id}`\n"
-        f"📊 ***Status:*** ⏳ စောင့်ဆိုင်းနေသည်"
-    )
+    try:
+        topup_id = await adb.next_id("TOP")
+        user_name = f"{update.effective_user.first_name} {update.effective_user.last_name or ''}".strip()
 
-    keyboard = [[
-        InlineKeyboardButton("✅ Approve", callback_data=f"topup_approve_{topup_id}"),
-        InlineKeyboardButton("❌ Reject", callback_data=f"topup_reject_{topup_id}")
-    ]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        admin_msg = (
+            f"💳 ***ငွေဖြည့်တောင်းဆိုမှု***\n\n"
+            f"👤 User Name: [{user_name}](tg://user?id={user_id})\n"
+            f"🆔 User ID: `{user_id}`\n"
+            f"💰 Amount: `{amount:,} MMK`\n"
+            f"📱 Payment: {payment_method.upper()}\n"
+            f"🔖 Topup ID: `{topup_id}`\n"
+            f"📊 ***Status:*** ⏳ စောင့်ဆိုင်းနေသည်"
+        )
 
-    topup_request = {
-        "topup_id": topup_id,
-        "amount": amount,
-        "payment_method": payment_method,
-        "status": "pending",
-        "timestamp": datetime.now().isoformat(),
-        "chat_id": update.effective_chat.id
-    }
-    db.add_topup(user_id, topup_request)
+        keyboard = [[
+            InlineKeyboardButton("✅ Approve", callback_data=f"topup_approve_{topup_id}"),
+            InlineKeyboardButton("❌ Reject", callback_data=f"topup_reject_{topup_id}")
+        ]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
 
-    load_admin_ids_global()
-    try:
-        for admin_id in ADMIN_IDS:
-            try:
-                # (Auto-Delete Logic)
-                msg_obj = await context.bot.send_photo(
-                    chat_id=admin_id,
-                    photo=update.message.photo[-1].file_id,
-                    caption=admin_msg,
-                    parse_mode="Markdown",
-                    reply_markup=reply_markup
-                )
-                db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
+        topup_request = {
+            "topup_id": topup_id,
+            "amount": amount,
+            "payment_method": payment_method,
+            "status": "pending",
+            "timestamp": datetime.now().isoformat(),
+            "chat_id": update.effective_chat.id
+        }
+        group_msg = (
+            f"💳 ***ငွေဖြည့်တောင်းဆိုမှု***\n\n"
+            f"👤 User Name: [{user_name}](tg://user?id={user_id})\n"
+            f"🆔 ***User ID:*** `{user_id}`\n"
+            f"💰 ***Amount:*** `{amount:,} MMK`\n"
+            f"📱 Payment: {payment_method.upper()}\n"
+            f"🔖 ***Topup ID:*** `{topup_id}`\n"
+            f"📊 ***Status:*** ⏳ စောင့်ဆိုင်းနေသည်\n\n"
+            f"***Approve လုပ်ရန်:*** `/approve {user_id} {amount}`\n"
+            f"#TopupRequest"
+        )
 
-        if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-            group_msg = (
-                f"💳 ***ငွေဖြည့်တောင်းဆိုမှု***\n\n"
-                f"👤 User Name: [{user_name}](tg://user?id={user_id})\n"
-                f"🆔 ***User ID:*** `{user_id}`\n"
-                f"💰 ***Amount:*** `{amount:,} MMK`\n"
-                f"📱 Payment: {payment_method.upper()}\n"
-                f"🔖 ***Topup ID:*** `{topup_id}`\n"
-                f"📊 ***Status:*** ⏳ စောင့်ဆိုင်းနေသည်\n\n"
-                f"***Approve လုပ်ရန်:*** `/approve {user_id} {amount}`\n"
-                f"#TopupRequest"
-            )
-            # (Auto-Delete Logic)
-            msg_obj_group = await context.bot.send_photo(
-                chat_id=ADMIN_GROUP_ID,
-                photo=update.message.photo[-1].file_id,
-                caption=group_msg,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            db.add_message_to_delete_queue(msg_obj_group.message_id, msg_obj_group.chat_id, datetime.now().isoformat())
-            
+        # (ပြင်ဆင်ပြီး) Topup request နဲ့ admin notification များကို တစ်ခါတည်း ရေးပါ (Auto-Delete Logic ပါ)
+        notifications = admin_notifications(
+            admin_msg, reply_markup=reply_markup,
+            photo=update.message.photo[-1].file_id,
+            group_text=group_msg, group_reply_markup=reply_markup,
+            auto_delete_admins=True, auto_delete_group=True
+        )
+        await adb.add_topup(user_id, topup_request, notifications)
     except Exception as e:
-        print(f"Error in topup process: {e}")
-
-    del pending_topups[user_id]
+        # Topup မမှတ်ရရင် state ကို ပြန်ထားပါ (screenshot ပြန်ပို့ပြီး ထပ်ကြိုးစားနိုင်ရန်)
+        print(f"Error saving topup for {user_id}: {e}")
+        pending_topups[user_id] = pending
+        user_states.pop(user_id, None)
+        await update.message.reply_text(
+            "❌ ***Screenshot ကို မှတ်သားရာတွင် အမှားဖြစ်သွားပါတယ်။***\n\n"
+            "🔄 ***ခဏနေမှ screenshot ကို ပြန်ပို့ပေးပါ။***",
+            parse_mode="Markdown"
+        )
+        return
+    kick_outbox(context)
 
     await update.message.reply_text(
         f"✅ ***Screenshot လက်ခံပါပြီ!***\n\n"
@@ -3068,7 +3347,6 @@ async def handle_restricted_content(update: Update, context: ContextTypes.DEFAUL
     user_id = str(update.effective_user.id)
     chat_type = update.effective_chat.type
 
-    load_authorized_users()
     if not is_user_authorized(user_id):
         # --- (ပြင်ဆင်ပြီး) update.message.text ရှိမှ simple_reply လုပ်ရန် ---
         if update.message.text and chat_type == "private":
@@ -3139,7 +3417,7 @@ async def handle_restricted_content(update: Update, context: ContextTypes.DEFAUL
 
 async def on_new_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot က Group အသစ်ထဲ ဝင်လာရင် (ဒါမှမဟုတ် member သစ် ဝင်လာရင်) အလုပ်လုပ်မည်။"""
-    me = await context.bot.get_me()
+    me = await get_bot_user(context.bot)
     chat = update.effective_chat
     
     if chat.type in ["group", "supergroup"]:
@@ -3147,7 +3425,7 @@ async def on_new_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE
             if new_member.id == me.id:
                 # Bot ကိုယ်တိုင် အသစ်ဝင်လာတာ
                 print(f"Bot joined a new group: {chat.title} (ID: {chat.id})")
-                db.add_group(chat.id, chat.title)
+                await adb.add_group(chat.id, chat.title)
                 # (Optional) Group ထဲကို ကြိုဆို message ပို့
                 try:
                     await context.bot.send_message(
@@ -3160,16 +3438,16 @@ async def on_new_chat_members(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def on_left_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot က Group ကနေ ထွက်သွားရင် (ဒါမှမဟုတ် အထုတ်ခံရရင်) အလုပ်လုပ်မည်။"""
-    me = await context.bot.get_me()
+    me = await get_bot_user(context.bot)
     chat = update.effective_chat
     
     if chat.type in ["group", "supergroup"]:
         if update.message.left_chat_member.id == me.id:
             # Bot ကိုယ်တိုင် ထွက်သွား/အထုတ်ခံရတာ
             print(f"Bot left/was kicked from group: (ID: {chat.id})")
-            db.remove_group(chat.id)
+            await adb.remove_group(chat.id)
 
-# --- Report Commands (Using DB iteration) ---
+# --- Report Commands (Using DB aggregation) ---
 
 async def daily_report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = str(update.effective_user.id)
@@ -3207,25 +3485,11 @@ async def daily_report_command(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("❌ ***Format မှားနေပါတယ်!***")
         return
     
-    all_users = db.get_all_users()
-    total_sales = 0
-    total_orders = 0
-    total_topups = 0
-    topup_count = 0
-
-    for user_data in all_users:
-        for order in user_data.get("orders", []):
-            if order.get("status") == "confirmed":
-                order_date = order.get("confirmed_at", order.get("timestamp", ""))[:10]
-                if start_date <= order_date <= end_date:
-                    total_sales += order["price"]
-                    total_orders += 1
-        for topup in user_data.get("topups", []):
-            if topup.get("status") == "approved":
-                topup_date = topup.get("approved_at", topup.get("timestamp", ""))[:10]
-                if start_date <= topup_date <= end_date:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+    report = await adb.get_sales_report(start_date, end_date)
+    total_sales = report["total_sales"]
+    total_orders = report["total_orders"]
+    total_topups = report["total_topups"]
+    topup_count = report["topup_count"]
     
     await update.message.reply_text(
         f"📊 ***ရောင်းရငွေ & ငွေဖြည့် မှတ်တမ်း***\n\n"
@@ -3276,25 +3540,11 @@ async def monthly_report_command(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("❌ ***Format မှားနေပါတယ်!***")
         return
 
-    all_users = db.get_all_users()
-    total_sales = 0
-    total_orders = 0
-    total_topups = 0
-    topup_count = 0
-
-    for user_data in all_users:
-        for order in user_data.get("orders", []):
-            if order.get("status") == "confirmed":
-                order_month = order.get("confirmed_at", order.get("timestamp", ""))[:7]
-                if start_month <= order_month <= end_month:
-                    total_sales += order["price"]
-                    total_orders += 1
-        for topup in user_data.get("topups", []):
-            if topup.get("status") == "approved":
-                topup_month = topup.get("approved_at", topup.get("timestamp", ""))[:7]
-                if start_month <= topup_month <= end_month:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+    report = await adb.get_sales_report(start_month, end_month)
+    total_sales = report["total_sales"]
+    total_orders = report["total_orders"]
+    total_topups = report["total_topups"]
+    topup_count = report["topup_count"]
 
     await update.message.reply_text(
         f"📊 ***ရောင်းရငွေ & ငွေဖြည့် မှတ်တမ်း***\n\n"
@@ -3344,25 +3594,11 @@ async def yearly_report_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text("❌ ***Format မှားနေပါတယ်!***")
         return
 
-    all_users = db.get_all_users()
-    total_sales = 0
-    total_orders = 0
-    total_topups = 0
-    topup_count = 0
-
-    for user_data in all_users:
-        for order in user_data.get("orders", []):
-            if order.get("status") == "confirmed":
-                order_year = order.get("confirmed_at", order.get("timestamp", ""))[:4]
-                if start_year <= order_year <= end_year:
-                    total_sales += order["price"]
-                    total_orders += 1
-        for topup in user_data.get("topups", []):
-            if topup.get("status") == "approved":
-                topup_year = topup.get("approved_at", topup.get("timestamp", ""))[:4]
-                if start_year <= topup_year <= end_year:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+    report = await adb.get_sales_report(start_year, end_year)
+    total_sales = report["total_sales"]
+    total_orders = report["total_orders"]
+    total_topups = report["total_topups"]
+    topup_count = report["topup_count"]
 
     await update.message.reply_text(
         f"📊 ***ရောင်းရငွေ & ငွေဖြည့် မှတ်တမ်း***\n\n"
@@ -3376,6 +3612,51 @@ async def yearly_report_command(update: Update, context: ContextTypes.DEFAULT_TY
         parse_mode="Markdown"
     )
 
+async def rebuild_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """(Owner Only) daily_stats report rollup ကို order/topup history မှ ပြန်တွက်ပါ။ (Order traffic မရှိချိန်မှာ run ရန်)"""
+    user_id = str(update.effective_user.id)
+    if not is_owner(user_id):
+        await update.message.reply_text("❌ Owner သာ အသုံးပြုနိုင်ပါတယ်!")
+        return
+
+    await update.message.reply_text("⏳ ***Report data များကို ပြန်တွက်နေပါသည်...***", parse_mode="Markdown")
+    try:
+        days_count = await adb.rebuild_daily_stats()
+    except Exception as e:
+        await update.message.reply_text(f"❌ Rebuild မအောင်မြင်ပါ: {e}")
+        return
+
+    await update.message.reply_text(
+        f"✅ ***Report Rollup ပြန်တွက်ပြီးပါပြီ!***\n\n"
+        f"📅 ***ရက်အရေအတွက်:*** {days_count}",
+        parse_mode="Markdown"
+    )
+
+async def index_report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """(Owner Only) MongoDB index အခြေအနေ (missing / unused / undeclared) ကို ပြပါ။"""
+    user_id = str(update.effective_user.id)
+    if not is_owner(user_id):
+        await update.message.reply_text("❌ Owner သာ အသုံးပြုနိုင်ပါတယ်!")
+        return
+
+    try:
+        if context.args and context.args[0].lower() == "fix":
+            await adb.ensure_indexes()
+        report = await adb.get_index_report()
+    except Exception as e:
+        await update.message.reply_text(f"❌ Index report မရပါ: {e}")
+        return
+
+    msg = "🗂️ Index Report\n\n"
+    for collection_name, status in report.items():
+        msg += f"📁 {collection_name}\n"
+        msg += f"  • Missing: {', '.join(status['missing']) or '-'}\n"
+        msg += f"  • Unused: {', '.join(status['unused']) or '-'}\n"
+        msg += f"  • Undeclared: {', '.join(status['undeclared']) or '-'}\n\n"
+    msg += "💡 /indexreport fix - Missing index များကို ဆောက်ရန်"
+
+    await update.message.reply_text(msg)
+
 # --- Callback Handler ---
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -3436,11 +3717,22 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
         # ... ( topup_pay_ logic ဤနေရာတွင် ပြီးဆုံး ) ...
 
+    elif query.data.startswith("hist_"):
+        # (အသစ်) /history Prev/Next/tab (ကိုယ့် history ကိုသာ ကြည့်နိုင် - user_id က query.from_user)
+        _, kind, direction, cursor = query.data.split("_", 3)
+        if kind not in ("orders", "topups") or (direction == "newer" and not cursor):
+            return
+        msg, reply_markup = await render_history_page(user_id, kind, cursor or None, direction)
+        try:
+            await query.edit_message_text(msg, parse_mode="Markdown", reply_markup=reply_markup)
+        except BadRequest:
+            pass # Message is not modified
+        return
+
     elif query.data == "request_register":
         user = query.from_user 
         user_id = str(user.id)
         
-        load_authorized_users()
         if is_user_authorized(user_id):
             await query.answer("✅ သင်သည် အသုံးပြုခွင့် ရပြီးသား ဖြစ်ပါတယ်!", show_alert=True)
             return
@@ -3464,13 +3756,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         target_user_id = query.data.replace("register_approve_", "")
-        load_authorized_users()
         if target_user_id in AUTHORIZED_USERS:
             await query.answer("ℹ️ User ကို approve လုပ်ပြီးပါပြီ!", show_alert=True)
             return
 
-        db.add_authorized_user(target_user_id)
-        load_authorized_users()
+        await authorize_user(target_user_id)
 
         if target_user_id in user_states:
             del user_states[target_user_id]
@@ -3504,7 +3794,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         try:
             if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                user_doc = db.get_user(target_user_id)
+                user_doc = await adb.get_user(target_user_id)
                 user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
                 group_msg = (
                     f"✅ ***Registration လက်ခံပြီး!***\n\n"
@@ -3515,7 +3805,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
                 
-                db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
+                await queue_auto_delete(context, msg_obj)
         except:
             pass
 
@@ -3574,15 +3864,58 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         topup_id = query.data.replace("topup_approve_", "")
+        topup_data = await adb.get_topup_by_id(topup_id)
+        if not topup_data or topup_data.get("status") != "pending":
+            await query.answer("❌ Topup မတွေ့ရှိပါ သို့မဟုတ် လုပ်ဆောင်ပြီးပါပြီ!")
+            return
+
+        target_user_id = topup_data.get("user_id")
+        topup_amount = topup_data.get("amount", 0)
+        # (ပြင်ဆင်ပြီး) User + Admin notification များကို topup approve နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပါ
+        # (Approve ပြီးသား user doc ကနေ တည်ဆောက် - လက်ကျန်ငွေက concurrent update များနဲ့ မလွဲစေရန်)
+        keyboard = [[InlineKeyboardButton("💎 Order တင်မယ်", url=f"https://t.me/{context.bot.username}?start=order")]]
+        def build_notifications(user_doc):
+            user_name = user_doc.get("name", "Unknown")
+            user_balance = user_doc.get("balance", 0)
+            notifications = [outbox_message(
+                int(target_user_id),
+                f"✅ ငွေဖြည့်မှု အတည်ပြုပါပြီ! 🎉\n\n"
+                f"💰 ပမာဏ: `{topup_amount:,} MMK`\n"
+                f"💳 လက်ကျန်ငွေ: `{user_balance:,} MMK`\n"
+                f"👤 Approved by: [{admin_name}](tg://user?id={user_id})\n\n"
+                f"🎉 ယခုအခါ diamonds များ ဝယ်ယူနိုင်ပါပြီ!\n"
+                f"🔓 Bot လုပ်ဆောင်ချက်များ ပြန်လည် အသုံးပြုနိုင်ပါပြီ!",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )]
+            notifications += admin_notifications(
+                f"✅ ***Topup Approved!***\n"
+                f"🔖 ***Topup ID:*** `{topup_id}`\n"
+                f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
+                f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
+                f"👤 ***Approved by:*** {admin_name}",
+                group_text=(
+                    f"✅ ***Topup လက်ခံပြီး!***\n\n"
+                    f"🔖 ***Topup ID:*** `{topup_id}`\n"
+                    f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+                    f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
+                    f"💳 ***New Balance:*** `{user_balance:,} MMK`\n"
+                    f"👤 ***လက်ခံသူ:*** {admin_name}\n"
+                    f"#TopupApproved"
+                ),
+                exclude_admin=int(user_id), auto_delete_group=True
+            )
+            return notifications
+
         updates = {
             "status": "approved",
             "approved_by": admin_name,
             "approved_at": datetime.now().isoformat()
         }
         
-        target_user_id = db.find_and_update_topup(topup_id, updates) # This also updates balance
+        spending_user_doc = await adb.find_and_update_topup(topup_id, updates, build_notifications) # This also updates balance
 
-        if target_user_id:
+        if spending_user_doc:
+            kick_outbox(context)
             if target_user_id in user_states:
                 del user_states[target_user_id]
 
@@ -3596,67 +3929,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 pass # Failed to edit caption
             # --- (ပြီး) ---
-            
-            topup_data = db.get_topup_by_id(topup_id)
-            topup_amount = topup_data.get("amount", 0) if topup_data else 0
-
-            try:
-                user_balance = db.get_balance(target_user_id)
-                keyboard = [[InlineKeyboardButton("💎 Order တင်မယ်", url=f"https://t.me/{context.bot.username}?start=order")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await context.bot.send_message(
-                    chat_id=int(target_user_id),
-                    text=f"✅ ငွေဖြည့်မှု အတည်ပြုပါပြီ! 🎉\n\n"
-                         f"💰 ပမာဏ: `{topup_amount:,} MMK`\n"
-                         f"💳 လက်ကျန်ငွေ: `{user_balance:,} MMK`\n"
-                         f"👤 Approved by: [{admin_name}](tg://user?id={user_id})\n\n"
-                         f"🎉 ယခုအခါ diamonds များ ဝယ်ယူနိုင်ပါပြီ!\n"
-                         f"🔓 Bot လုပ်ဆောင်ချက်များ ပြန်လည် အသုံးပြုနိုင်ပါပြီ!",
-                    parse_mode="Markdown",
-                    reply_markup=reply_markup
-                )
-            except:
-                pass
 
-            load_admin_ids_global()
-            user_doc = db.get_user(target_user_id)
-            user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
-            
-            for admin_id in ADMIN_IDS:
-                if admin_id != int(user_id):
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"✅ ***Topup Approved!***\n"
-                                 f"🔖 ***Topup ID:*** `{topup_id}`\n"
-                                 f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
-                                 f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
-                                 f"👤 ***Approved by:*** {admin_name}",
-                            parse_mode="Markdown"
-                        )
-                    except:
-                        pass
-            
-            try:
-                if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                    user_balance = db.get_balance(target_user_id)
-                    group_msg = (
-                        f"✅ ***Topup လက်ခံပြီး!***\n\n"
-                        f"🔖 ***Topup ID:*** `{topup_id}`\n"
-                        f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                        f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
-                        f"💳 ***New Balance:*** `{user_balance:,} MMK`\n"
-                        f"👤 ***လက်ခံသူ:*** {admin_name}\n"
-                        f"#TopupApproved"
-                    )
-                    msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-                    
-                    db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
+            await query.answer("✅ Topup approved!", show_alert=True)
 
             # === (COMMISSION LOGIC - နေရာ ၁) ===
-            spending_user_doc = db.get_user(target_user_id)
+            user_name = spending_user_doc.get("name", "Unknown")
             commission_rate = g_settings.get("affiliate", {}).get("percentage", 0.03) # DB မှ ယူ
             commission_percent_display = commission_rate * 100
             
@@ -3667,12 +3944,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 if referrer_id: # Referrer ရှိမှ ဒီ logic အလုပ်လုပ်
                     commission = int(topup_amount * commission_rate) 
                     if commission > 0:
-                        db.update_referral_earnings(referrer_id, commission)
+                        await adb.update_referral_earnings(referrer_id, commission)
+                        referrer_balance = await adb.get_balance(referrer_id)
                         await context.bot.send_message(
                             chat_id=referrer_id,
                             text=f"🎉 **ကော်မရှင်ခ ရရှိပါပြီရှင့်!**\n\n"
                                  f"👤 {spending_user_doc.get('name', 'User')} က `{topup_amount:,} MMK` ဖိုး ငွေဖြည့်သွားလို့ သင့်ဆီကို `{commission:,} MMK` ({commission_percent_display:.0f}%) ဝင်လာပါပြီရှင့်။\n"
-                                 f"💳 သင့်လက်ကျန်ငွေ: `{db.get_balance(referrer_id):,} MMK`",
+                                 f"💳 သင့်လက်ကျန်ငွေ: `{referrer_balance:,} MMK`",
                             parse_mode="Markdown"
                         )
             except Exception as e:
@@ -3685,39 +3963,72 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     master_commission = int(topup_amount * commission_rate) # (ပြင်ဆင်ပြီး) g_settings % အတိုင်း ယူ
                     
                     if master_commission > 0:
-                        db.update_referral_earnings(MASTER_COMMISSION_USER_ID, master_commission)
+                        await adb.update_referral_earnings(MASTER_COMMISSION_USER_ID, master_commission)
+                        master_balance = await adb.get_balance(MASTER_COMMISSION_USER_ID)
                         await context.bot.send_message(
                             chat_id=MASTER_COMMISSION_USER_ID,
                             text=f"🎉 **ကော်မရှင်ခ ရရှိပါပြီရှင့်!**\n\n"
                                  f"👤 {user_name} က `{topup_amount:,} MMK` ဖိုး ငွေဖြည့်သွားလို့ သင့်ဆီကို `{master_commission:,} MMK` ({commission_percent_display:.0f}%) ဝင်လာပါပြီရှင့်။\n"
-                                 f"💳 သင့်လက်ကျန်ငွေ: `{db.get_balance(MASTER_COMMISSION_USER_ID):,} MMK`",
+                                 f"💳 သင့်လက်ကျန်ငွေ: `{master_balance:,} MMK`",
                             parse_mode="Markdown"
                         )
             except Exception as e:
                 print(f"Error processing master commission for topup_approve: {e}")
             # === (COMMISSION LOGIC ပြီး) ===
-
-            await query.answer("✅ Topup approved!", show_alert=True)
         else:
             await query.answer("❌ Topup မတွေ့ရှိပါ သို့မဟုတ် လုပ်ဆောင်ပြီးပါပြီ!")
         return
 
     elif query.data.startswith("topup_reject_"):
-        # ... (ဤနေရာမှ code များ မပြောင်းပါ ... ) ...
         if not is_admin(user_id):
             await query.answer("❌ ***သင်သည် admin မဟုတ်ပါ!***")
             return
 
         topup_id = query.data.replace("topup_reject_", "")
+        topup_data = await adb.get_topup_by_id(topup_id)
+        if not topup_data or topup_data.get("status") != "pending":
+            await query.answer("❌ Topup မတွေ့ရှိပါ သို့မဟုတ် လုပ်ဆောင်ပြီးပါပြီ!")
+            return
+
+        target_user_id = topup_data.get("user_id")
+        topup_amount = topup_data.get("amount", 0)
+        user_doc = await adb.get_user(target_user_id)
+        user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
+
+        # (ပြင်ဆင်ပြီး) User + Admin notification များကို topup reject နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပါ
+        notifications = [outbox_message(
+            int(target_user_id),
+            f"❌ ***ငွေဖြည့်မှု ငြင်းပယ်ခံရပါပြီ!***\n\n"
+            f"💰 ***ပမာဏ:*** `{topup_amount:,} MMK`\n"
+            f"👤 ***Rejected by:*** {admin_name}\n\n"
+            f"📞 ***အကြောင်းရင်း သိရှိရန် admin ကို ဆက်သွယ်ပါ။***\n"
+            f"🔓 ***Bot လုပ်ဆောင်ချက်များ ပြန်လည် အသုံးပြုနိုင်ပါပြီ!***"
+        )]
+        notifications += admin_notifications(
+            f"❌ ***Topup Rejected!***\n"
+            f"🔖 ***Topup ID:*** `{topup_id}`\n"
+            f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
+            f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
+            f"👤 ***Rejected by:*** {admin_name}",
+            group_text=(
+                f"❌ ***Topup ငြင်းပယ်ပြီး!***\n\n"
+                f"🔖 ***Topup ID:*** `{topup_id}`\n"
+                f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+                f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
+                f"👤 ***ငြင်းပယ်သူ:*** {admin_name}\n"
+                f"#TopupRejected"
+            ),
+            exclude_admin=int(user_id), auto_delete_group=True
+        )
+
         updates = {
             "status": "rejected",
             "rejected_by": admin_name,
             "rejected_at": datetime.now().isoformat()
         }
         
-        target_user_id = db.find_and_update_topup(topup_id, updates) 
-
-        if target_user_id:
+        if await adb.find_and_update_topup(topup_id, updates, notifications):
+            kick_outbox(context)
             if target_user_id in user_states:
                 del user_states[target_user_id]
 
@@ -3731,57 +4042,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 pass 
             # --- (ပြီး) ---
-            
-            topup_data = db.get_topup_by_id(topup_id)
-            topup_amount = topup_data.get("amount", 0) if topup_data else 0
-
-            try:
-                await context.bot.send_message(
-                    chat_id=int(target_user_id),
-                    text=f"❌ ***ငွေဖြည့်မှု ငြင်းပယ်ခံရပါပြီ!***\n\n"
-                         f"💰 ***ပမာဏ:*** `{topup_amount:,} MMK`\n"
-                         f"👤 ***Rejected by:*** {admin_name}\n\n"
-                         f"📞 ***အကြောင်းရင်း သိရှိရန် admin ကို ဆက်သွယ်ပါ။***\n"
-                         f"🔓 ***Bot လုပ်ဆောင်ချက်များ ပြန်လည် အသုံးပြုနိုင်ပါပြီ!***",
-                    parse_mode="Markdown"
-                )
-            except:
-                pass
-
-            load_admin_ids_global()
-            user_doc = db.get_user(target_user_id)
-            user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
-            
-            for admin_id in ADMIN_IDS:
-                if admin_id != int(user_id):
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"❌ ***Topup Rejected!***\n"
-                                 f"🔖 ***Topup ID:*** `{topup_id}`\n"
-                                 f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
-                                 f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
-                                 f"👤 ***Rejected by:*** {admin_name}",
-                            parse_mode="Markdown"
-                        )
-                    except:
-                        pass
-            
-            try:
-                if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                    group_msg = (
-                        f"❌ ***Topup ငြင်းပယ်ပြီး!***\n\n"
-                        f"🔖 ***Topup ID:*** `{topup_id}`\n"
-                        f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                        f"💰 ***Amount:*** `{topup_amount:,} MMK`\n"
-                        f"👤 ***ငြင်းပယ်သူ:*** {admin_name}\n"
-                        f"#TopupRejected"
-                    )
-                    msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-                    
-                    db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
 
             await query.answer("❌ Topup rejected!", show_alert=True)
         else:
@@ -3796,15 +4056,48 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         order_id = query.data.replace("pubg_confirm_", "")
+        order_details = await adb.get_order_by_id(order_id)
+        if not order_details or order_details.get("status") != "pending":
+            await query.answer("❌ Order မတွေ့ရှိပါ သို့မဟုတ် လုပ်ဆောင်ပြီးပါပြီ!", show_alert=True)
+            return
+
+        target_user_id = order_details.get("user_id")
+        user_doc = await adb.get_user(target_user_id)
+        user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
+
+        # (ပြင်ဆင်ပြီး) User + Admin notification များကို order confirm နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပါ
+        notifications = [outbox_message(
+            order_details.get("chat_id", int(target_user_id)),
+            f"✅ ***PUBG Order လက်ခံပြီးပါပြီ!***\n\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+            f"📊 Status: ✅ ***လက်ခံပြီး***\n\n"
+            "💎 ***UC များကို ထည့်သွင်းပေးလိုက်ပါပြီ။***"
+        )]
+        notifications += admin_notifications(
+            f"✅ ***PUBG Order Confirmed!***\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***Confirmed by:*** {admin_name}",
+            group_text=(
+                f"✅ ***PUBG Order လက်ခံပြီး!***\n\n"
+                f"📝 ***Order ID:*** `{order_id}`\n"
+                f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+                f"👤 ***လက်ခံသူ:*** {admin_name}\n"
+                f"#OrderConfirmed #PUBG"
+            ),
+            exclude_admin=int(user_id), auto_delete_group=True
+        )
+
         updates = {
             "status": "confirmed",
             "confirmed_by": admin_name,
             "confirmed_at": datetime.now().isoformat()
         }
         
-        target_user_id = db.find_and_update_order(order_id, updates)
+        target_user_id = await adb.find_and_update_order(order_id, updates, notifications)
         
         if target_user_id:
+            kick_outbox(context)
             # --- (မူလ Edit Logic) ---
             try:
                 await query.edit_message_text(
@@ -3814,54 +4107,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
             except: pass
             # --- (ပြီး) ---
-            
-            order_details = db.get_order_by_id(order_id)
-            if not order_details: order_details = {} 
-
-            load_admin_ids_global()
-            for admin_id in ADMIN_IDS:
-                if admin_id != int(user_id):
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"✅ ***PUBG Order Confirmed!***\n"
-                                 f"📝 ***Order ID:*** `{order_id}`\n"
-                                 f"👤 ***Confirmed by:*** {admin_name}",
-                            parse_mode="Markdown"
-                        )
-                    except: pass
-            
-            user_doc = db.get_user(target_user_id)
-            user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
-            
-            try:
-                if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                    group_msg = (
-                        f"✅ ***PUBG Order လက်ခံပြီး!***\n\n"
-                        f"📝 ***Order ID:*** `{order_id}`\n"
-                        f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                        f"👤 ***လက်ခံသူ:*** {admin_name}\n"
-                        f"#OrderConfirmed #PUBG"
-                    )
-                    msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-                    
-                    db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
-
-            try:
-                chat_id = order_details.get("chat_id", int(target_user_id))
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=f"✅ ***PUBG Order လက်ခံပြီးပါပြီ!***\n\n"
-                         f"📝 ***Order ID:*** `{order_id}`\n"
-                         f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                         f"📊 Status: ✅ ***လက်ခံပြီး***\n\n"
-                         "💎 ***UC များကို ထည့်သွင်းပေးလိုက်ပါပြီ။***",
-                    parse_mode="Markdown"
-                )
-            except:
-                pass
 
             # === (Commission Logic နေရာ ၂ ကို ဒီကနေ ဖျက်လိုက်ပါပြီ) ===
 
@@ -3877,15 +4122,48 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         order_id = query.data.replace("order_confirm_", "")
+        order_details = await adb.get_order_by_id(order_id)
+        if not order_details or order_details.get("status") != "pending":
+            await query.answer("❌ Order မတွေ့ရှိပါ သို့မဟုတ် လုပ်ဆောင်ပြီးပါပြီ!", show_alert=True)
+            return
+
+        target_user_id = order_details.get("user_id")
+        user_doc = await adb.get_user(target_user_id)
+        user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
+
+        # (ပြင်ဆင်ပြီး) User + Admin notification များကို order confirm နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပါ
+        notifications = [outbox_message(
+            order_details.get("chat_id", int(target_user_id)),
+            f"✅ ***Order လက်ခံပြီးပါပြီ!***\n\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+            f"📊 Status: ✅ ***လက်ခံပြီး***\n\n"
+            "💎 ***Diamonds များကို ထည့်သွင်းပေးလိုက်ပါပြီ။***"
+        )]
+        notifications += admin_notifications(
+            f"✅ ***Order Confirmed!***\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***Confirmed by:*** {admin_name}",
+            group_text=(
+                f"✅ ***Order လက်ခံပြီး!***\n\n"
+                f"📝 ***Order ID:*** `{order_id}`\n"
+                f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+                f"👤 ***လက်ခံသူ:*** {admin_name}\n"
+                f"#OrderConfirmed"
+            ),
+            exclude_admin=int(user_id), auto_delete_group=True
+        )
+
         updates = {
             "status": "confirmed",
             "confirmed_by": admin_name,
             "confirmed_at": datetime.now().isoformat()
         }
         
-        target_user_id = db.find_and_update_order(order_id, updates)
+        target_user_id = await adb.find_and_update_order(order_id, updates, notifications)
         
         if target_user_id:
+            kick_outbox(context)
             # --- (မူလ Edit Logic) ---
             try:
                 await query.edit_message_text(
@@ -3895,54 +4173,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
             except: pass
             # --- (ပြီး) ---
-            
-            order_details = db.get_order_by_id(order_id)
-            if not order_details: order_details = {} 
-
-            load_admin_ids_global()
-            for admin_id in ADMIN_IDS:
-                if admin_id != int(user_id):
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"✅ ***Order Confirmed!***\n"
-                                 f"📝 ***Order ID:*** `{order_id}`\n"
-                                 f"👤 ***Confirmed by:*** {admin_name}",
-                            parse_mode="Markdown"
-                        )
-                    except: pass
-            
-            user_doc = db.get_user(target_user_id)
-            user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
-            
-            try:
-                if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                    group_msg = (
-                        f"✅ ***Order လက်ခံပြီး!***\n\n"
-                        f"📝 ***Order ID:*** `{order_id}`\n"
-                        f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                        f"👤 ***လက်ခံသူ:*** {admin_name}\n"
-                        f"#OrderConfirmed"
-                    )
-                    msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-                    
-                    db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
-
-            try:
-                chat_id = order_details.get("chat_id", int(target_user_id))
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=f"✅ ***Order လက်ခံပြီးပါပြီ!***\n\n"
-                         f"📝 ***Order ID:*** `{order_id}`\n"
-                         f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                         f"📊 Status: ✅ ***လက်ခံပြီး***\n\n"
-                         "💎 ***Diamonds များကို ထည့်သွင်းပေးလိုက်ပါပြီ။***",
-                    parse_mode="Markdown"
-                )
-            except:
-                pass
 
             # === (COMMISSION LOGIC - နေရာ ၃ - ဖြုတ်ထားပါသည်) ===
 
@@ -3958,7 +4188,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         order_id = query.data.replace("order_cancel_", "")
-        order_details = db.get_order_by_id(order_id)
+        order_details = await adb.get_order_by_id(order_id)
         if not order_details:
              await query.answer("❌ Order မတွေ့ရှိပါ!", show_alert=True)
              return
@@ -3971,16 +4201,46 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
             
         refund_amount = order_details.get("price", 0)
+        target_user_id = order_details.get("user_id")
+        user_doc = await adb.get_user(target_user_id)
+        user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
+
+        # (ပြင်ဆင်ပြီး) User + Admin notification များကို order cancel (refund ပါ) နဲ့ တစ်ခါတည်း outbox ထဲ ရေးပါ
+        notifications = [outbox_message(
+            order_details.get("chat_id", int(target_user_id)),
+            f"❌ ***Order ငြင်းပယ်ခံရပါပြီ!***\n\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
+            f"📊 Status: ❌ ငြင်းပယ်ပြီး\n"
+            f"💰 ***ငွေပြန်အမ်း:*** {refund_amount:,} MMK\n\n"
+            "📞 ***အကြောင်းရင်း သိရှိရန် admin ကို ဆက်သွယ်ပါ။***"
+        )]
+        notifications += admin_notifications(
+            f"❌ ***Order Cancelled!***\n"
+            f"📝 ***Order ID:*** `{order_id}`\n"
+            f"👤 ***Cancelled by:*** {admin_name}\n"
+            f"💰 ***Refunded:*** {refund_amount:,} MMK",
+            group_text=(
+                f"❌ ***Order ငြင်းပယ်ပြီး!***\n\n"
+                f"📝 ***Order ID:*** `{order_id}`\n"
+                f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
+                f"💰 ***Refunded:*** {refund_amount:,} MMK`\n"
+                f"👤 ***ငြင်းပယ်သူ:*** {admin_name}\n"
+                f"#OrderCancelled"
+            ),
+            exclude_admin=int(user_id), auto_delete_group=True
+        )
+
         updates = {
             "status": "cancelled",
             "cancelled_by": admin_name,
             "cancelled_at": datetime.now().isoformat()
         }
         
-        target_user_id = db.find_and_update_order(order_id, updates)
+        target_user_id = await adb.find_and_update_order(order_id, updates, notifications) # Refund ပါ တစ်ခါတည်း
         
         if target_user_id:
-            db.update_balance(target_user_id, refund_amount) # Refund balance
+            kick_outbox(context)
 
             # --- (မူလ Edit Logic) ---
             try:
@@ -3993,55 +4253,6 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 pass
             # --- (ပြီး) ---
 
-            load_admin_ids_global()
-            for admin_id in ADMIN_IDS:
-                if admin_id != int(user_id):
-                    try:
-                        await context.bot.send_message(
-                            chat_id=admin_id,
-                            text=f"❌ ***Order Cancelled!***\n"
-                                 f"📝 ***Order ID:*** `{order_id}`\n"
-                                 f"👤 ***Cancelled by:*** {admin_name}\n"
-                                 f"💰 ***Refunded:*** {refund_amount:,} MMK",
-                            parse_mode="Markdown"
-                        )
-                    except:
-                        pass
-            
-            user_doc = db.get_user(target_user_id)
-            user_name = user_doc.get("name", "Unknown") if user_doc else "Unknown"
-
-            try:
-                if await is_bot_admin_in_group(context.bot, ADMIN_GROUP_ID):
-                    group_msg = (
-                        f"❌ ***Order ငြင်းပယ်ပြီး!***\n\n"
-                        f"📝 ***Order ID:*** `{order_id}`\n"
-                        f"👤 ***User:*** [{user_name}](tg://user?id={target_user_id})\n"
-                        f"💰 ***Refunded:*** {refund_amount:,} MMK`\n"
-                        f"👤 ***ငြင်းပယ်သူ:*** {admin_name}\n"
-                        f"#OrderCancelled"
-                    )
-                    msg_obj = await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=group_msg, parse_mode="Markdown")
-                    
-                    db.add_message_to_delete_queue(msg_obj.message_id, msg_obj.chat_id, datetime.now().isoformat())
-            except:
-                pass
-
-            try:
-                chat_id = order_details.get("chat_id", int(target_user_id))
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=f"❌ ***Order ငြင်းပယ်ခံရပါပြီ!***\n\n"
-                         f"📝 ***Order ID:*** `{order_id}`\n"
-                         f"👤 ***User Name:*** [{user_name}](tg://user?id={target_user_id})\n"
-                         f"📊 Status: ❌ ငြင်းပယ်ပြီး\n"
-                         f"💰 ***ငွေပြန်အမ်း:*** {refund_amount:,} MMK\n\n"
-                         "📞 ***အကြောင်းရင်း သိရှိရန် admin ကို ဆက်သွယ်ပါ။***",
-                    parse_mode="Markdown"
-                )
-            except:
-                pass
-
             await query.answer("❌ ***Order ငြင်းပယ်ပြီး ငွေပြန်အမ်းပါပြီ!**", show_alert=True)
         else:
             await query.answer("❌ Order မတွေ့ရှိပါ!", show_alert=True)
@@ -4064,17 +4275,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             end_date = parts[2]
             period_text = f"ရက် ({start_date} မှ {end_date})"
 
-        all_users = db.get_all_users()
-        total_sales = total_orders = total_topups = topup_count = 0
-        for user_data in all_users:
-            for order in user_data.get("orders", []):
-                if order.get("status") == "confirmed" and start_date <= order.get("confirmed_at", "")[:10] <= end_date:
-                    total_sales += order["price"]
-                    total_orders += 1
-            for topup in user_data.get("topups", []):
-                if topup.get("status") == "approved" and start_date <= topup.get("approved_at", "")[:10] <= end_date:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+        report = await adb.get_sales_report(start_date, end_date)
+        total_sales = report["total_sales"]
+        total_orders = report["total_orders"]
+        total_topups = report["total_topups"]
+        topup_count = report["topup_count"]
 
         await query.edit_message_text(
             f"📊 ***Daily Report***\n📅 ***ကာလ:*** {period_text}\n\n"
@@ -4101,17 +4306,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             end_month = parts[2]
             period_text = f"လ ({start_month} မှ {end_month})"
 
-        all_users = db.get_all_users()
-        total_sales = total_orders = total_topups = topup_count = 0
-        for user_data in all_users:
-            for order in user_data.get("orders", []):
-                if order.get("status") == "confirmed" and start_month <= order.get("confirmed_at", "")[:7] <= end_month:
-                    total_sales += order["price"]
-                    total_orders += 1
-            for topup in user_data.get("topups", []):
-                if topup.get("status") == "approved" and start_month <= topup.get("approved_at", "")[:7] <= end_month:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+        report = await adb.get_sales_report(start_month, end_month)
+        total_sales = report["total_sales"]
+        total_orders = report["total_orders"]
+        total_topups = report["total_topups"]
+        topup_count = report["topup_count"]
 
         await query.edit_message_text(
             f"📊 ***Monthly Report***\n📅 ***ကာလ:*** {period_text}\n\n"
@@ -4138,17 +4337,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             end_year = parts[2]
             period_text = f"နှစ် ({start_year} မှ {end_year})"
 
-        all_users = db.get_all_users()
-        total_sales = total_orders = total_topups = topup_count = 0
-        for user_data in all_users:
-            for order in user_data.get("orders", []):
-                if order.get("status") == "confirmed" and start_year <= order.get("confirmed_at", "")[:4] <= end_year:
-                    total_sales += order["price"]
-                    total_orders += 1
-            for topup in user_data.get("topups", []):
-                if topup.get("status") == "approved" and start_year <= topup.get("approved_at", "")[:4] <= end_year:
-                    total_topups += topup["amount"]
-                    topup_count += 1
+        report = await adb.get_sales_report(start_year, end_year)
+        total_sales = report["total_sales"]
+        total_orders = report["total_orders"]
+        total_topups = report["total_topups"]
+        topup_count = report["topup_count"]
 
         await query.edit_message_text(
             f"📊 ***Yearly Report***\n📅 ***ကာလ:*** {period_text}\n\n"
@@ -4217,15 +4410,31 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
 
-def main():
-    if not BOT_TOKEN:
-        print("❌ BOT_TOKEN environment variable မရှိပါ!")
-        return
+async def post_init(application: Application):
+    """(အသစ်) Bot စတက်ချိန် (event loop ပေါ်မှာ) DB မှ state များကို load လုပ်ပါ။"""
+    # (ပြင်ဆင်ပြီး) Migration ၏ upsert များ index ပေါ်မှာ run ရန် index များကို အရင်ဆောက်ပါ
+    # (Data အဟောင်း ထပ်နေနိုင်လို့ unique မပါဘဲ - migration ပြီးမှ unique သို့ upgrade)
+    await adb.ensure_indexes(allow_unique=False)
+    # (အသစ်) User document ထဲက history အဟောင်းများကို collection သီးသန့်သို့ ရွှေ့ပါ
+    await adb.migrate_embedded_history()
+    await adb.ensure_indexes()
+    await adb.ensure_daily_stats() # (အသစ်) Report rollup မရှိသေးရင် backfill
+    await adb.migrate_auth_list() # (အသစ်) auth_list array အဟောင်းကို per-user document သို့ ရွှေ့
+    await adb.backfill_user_counters() # (အသစ်) User doc ပေါ်က order/topup counter များ မရှိသေးရင် ဖြည့်
 
     # Load all settings from DB on startup
-    load_global_settings()
-    load_authorized_users() 
-    load_admin_ids_global()
+    await load_global_settings()
+    await load_authorized_users() 
+    await load_admin_ids_global()
+    await load_price_catalog()
+
+    # (အသစ်) Auto-delete queue entry အဟောင်းများကို datetime + delete_at သို့ ပြောင်းပြီး timer ချိန်
+    await adb.migrate_delete_queue_timestamps(g_settings.get("auto_delete", {}).get("hours", 24))
+    await schedule_auto_delete(application.job_queue)
+
+    # (အသစ်) Restart မတိုင်ခင် မပြီးသေးတဲ့ broadcast များကို checkpoint ကနေ ဆက်ပို့ပါ
+    for broadcast in await adb.get_running_broadcasts():
+        application.job_queue.run_once(broadcast_job, 5, data=broadcast["_id"])
 
     # --- User 555555 အတွက် Auto Balance & Authorize လုပ်မည့် အပိုင်း ---
     try:
@@ -4234,18 +4443,18 @@ def main():
         print(f"Checking initial setup for special user: {target_user_id}...")
         
         # --- 1. Balance Check ---
-        user_doc = db.get_user(target_user_id)
+        user_doc = await adb.get_user(target_user_id)
         
         if not user_doc:
             print(f"User not found. Creating user {target_user_id}...")
-            db.create_user(target_user_id, "", "") # Placeholder name
+            await adb.create_user(target_user_id, "", "") # Placeholder name
             
-            db.update_balance(target_user_id, initial_balance)
+            await adb.update_balance(target_user_id, initial_balance)
             print(f"Balance {initial_balance:,} MMK set for new user {target_user_id}.")
         
-        elif user_doc.get("balance") == 0 and not user_doc.get("orders") and not user_doc.get("topups"):
+        elif user_doc.get("balance") == 0 and not user_doc.get("order_count") and not user_doc.get("topup_count"):
             print(f"User found with 0 balance. Setting balance to {initial_balance:,} MMK...")
-            db.update_balance(target_user_id, initial_balance)
+            await adb.update_balance(target_user_id, initial_balance)
         else:
             print(f"User {target_user_id} already has balance or activity. No changes made to balance.")
             
@@ -4253,8 +4462,7 @@ def main():
         print(f"Checking authorization for special user: {target_user_id}...")
         if target_user_id not in AUTHORIZED_USERS:
             print(f"User {target_user_id} is not authorized. Adding to authorized list...")
-            db.add_authorized_user(target_user_id)
-            load_authorized_users() # Global set ကို DB မှ ပြန် reload လုပ်ပါ
+            await authorize_user(target_user_id) # DB + Global set ကို တစ်ခါတည်း update
             print(f"✅ User {target_user_id} is now authorized.")
         else:
             print(f"User {target_user_id} is already authorized.")
@@ -4262,28 +4470,50 @@ def main():
     except Exception as e:
         print(f"Error during special user init: {e}")
 
-    application = Application.builder().token(BOT_TOKEN).build()
+async def post_shutdown(application: Application):
+    """Bot ပိတ်ချိန်မှာ DB thread pool ကို ရှင်းပါ။"""
+    adb.shutdown()
+
+
+def main():
+    if not BOT_TOKEN:
+        print("❌ BOT_TOKEN environment variable မရှိပါ!")
+        return
+
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(True) # (အသစ်) Balance ငွေနုတ်ခြင်းက atomic ဖြစ်ပြီမို့ update များကို ပြိုင်တူ run နိုင်
+        .build()
+    )
     
     # --- (အသစ်) Job Queue ကို ထည့်ပါ ---
     job_queue = application.job_queue
-    # Bot စပြီး (၁၀) စက္ကန့်မှာ ပထမဆုံး (၁) ခါ run မယ်၊
-    # ပြီးရင် (၁) နာရီ (3600 seconds) တိုင်း (၁) ခါ run မယ်။
-    job_queue.run_repeating(auto_delete_job, interval=3600, first=10) 
+    # (ပြင်ဆင်ပြီး) Auto-delete က deadline အလိုက် run_once ဖြင့်သာ run (post_init / queue_auto_delete မှာ ချိန်)
+    job_queue.run_repeating(outbox_worker_job, interval=OUTBOX_POLL_INTERVAL, first=5) # (အသစ်) Notification outbox
+    # (အသစ်) Auth cache version စစ်ဆေးမှု (တခြား instance က ပြောင်းထားရင် reload)
+    job_queue.run_repeating(auth_cache_sync_job, interval=AUTH_SYNC_INTERVAL, first=AUTH_SYNC_INTERVAL)
+
+    # (အသစ်) User command များ၏ auth / maintenance / pending စစ်ဆေးမှု (command handler များထက် အရင် run)
+    application.add_handler(TypeHandler(Update, command_gate), group=-1)
 
     # User commands
     application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("mmb", mmb_command))
-    application.add_handler(CommandHandler("pubg", pubg_command)) # <-- PUBG command ထည့်ပြီး
-    application.add_handler(CommandHandler("balance", balance_command))
-    application.add_handler(CommandHandler("topup", topup_command))
-    application.add_handler(CommandHandler("cancel", cancel_command))
+    application.add_handler(CommandHandler("mmb", mmb_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("pubg", pubg_command, filters=GATED_COMMAND_FILTER)) # <-- PUBG command ထည့်ပြီး
+    application.add_handler(CommandHandler("balance", balance_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("topup", topup_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("cancel", cancel_command, filters=GATED_COMMAND_FILTER))
     # application.add_handler(CommandHandler("c", c_command)) # Auto-calc ကြောင့် ဖြုတ်ထား
-    application.add_handler(CommandHandler("price", price_command))
-    application.add_handler(CommandHandler("pubgprice", pubg_price_command))
-    application.add_handler(CommandHandler("history", history_command))
+    application.add_handler(CommandHandler("price", price_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("pubgprice", pubg_price_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("history", history_command, filters=GATED_COMMAND_FILTER))
+    application.add_handler(CommandHandler("exporthistory", export_history_command, filters=GATED_COMMAND_FILTER))
     application.add_handler(CommandHandler("register", register_command))
     application.add_handler(CommandHandler("clearhistory", clear_history_command)) # history.py မှ
-    application.add_handler(CommandHandler("affiliate", affiliate_command)) # <-- Affiliate command ထည့်ပြီး
+    application.add_handler(CommandHandler("affiliate", affiliate_command, filters=GATED_COMMAND_FILTER)) # <-- Affiliate command ထည့်ပြီး
 
     # Admin commands
     application.add_handler(CommandHandler("approve", approve_command))
@@ -4300,6 +4530,7 @@ def main():
     application.add_handler(CommandHandler("testgroup", testgroup_command))
     application.add_handler(CommandHandler("adminhelp", adminhelp_command))
     application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("cancelbroadcast", cancel_broadcast_command))
     application.add_handler(CommandHandler("cleanmongodb", clean_mongodb_command))
     application.add_handler(CommandHandler("setpercentage", setpercentage_command))
     application.add_handler(CommandHandler("autodelete", set_auto_delete_command))
@@ -4324,6 +4555,8 @@ def main():
     application.add_handler(CommandHandler("d", daily_report_command))
     application.add_handler(CommandHandler("m", monthly_report_command))
     application.add_handler(CommandHandler("y", yearly_report_command))
+    application.add_handler(CommandHandler("rebuildstats", rebuild_stats_command))
+    application.add_handler(CommandHandler("indexreport", index_report_command))
 
     
     # .sasukemlbbtopup command
@@ -4334,6 +4567,7 @@ def main():
 
     # Message handlers
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    application.add_handler(ChatMemberHandler(on_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
     application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, on_new_chat_members))
     application.add_handler(MessageHandler(filters.StatusUpdate.LEFT_CHAT_MEMBER, on_left_chat_member))
     application.add_handler(MessageHandler(
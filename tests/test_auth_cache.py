@@ -0,0 +1,42 @@
+# tests/test_auth_cache.py
+# Authorized-user cache က DB version ပြောင်းမှသာ ပြန် load လုပ်ကြောင်း
+
+import asyncio
+
+import main
+
+
+def fake_auth_db(monkeypatch, version, users):
+    calls = {"load": 0}
+
+    async def get_auth_version():
+        return version
+
+    async def load_authorized_users():
+        calls["load"] += 1
+        return set(users)
+
+    monkeypatch.setattr(main.adb, "get_auth_version", get_auth_version)
+    monkeypatch.setattr(main.adb, "load_authorized_users", load_authorized_users)
+    return calls
+
+
+def test_sync_reloads_cache_when_version_changed(monkeypatch):
+    monkeypatch.setattr(main, "AUTH_CACHE_VERSION", 3)
+    monkeypatch.setattr(main, "AUTHORIZED_USERS", {"10"})
+    calls = fake_auth_db(monkeypatch, version=4, users={"10", "20"})
+
+    assert asyncio.run(main.sync_authorized_users())
+    assert calls["load"] == 1
+    assert main.AUTHORIZED_USERS == {"10", "20"}
+    assert main.AUTH_CACHE_VERSION == 4
+
+
+def test_sync_skips_reload_when_version_unchanged(monkeypatch):
+    monkeypatch.setattr(main, "AUTH_CACHE_VERSION", 4)
+    monkeypatch.setattr(main, "AUTHORIZED_USERS", {"10"})
+    calls = fake_auth_db(monkeypatch, version=4, users={"10", "20"})
+
+    assert not asyncio.run(main.sync_authorized_users())
+    assert calls["load"] == 0
+    assert main.AUTHORIZED_USERS == {"10"}
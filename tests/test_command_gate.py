@@ -0,0 +1,61 @@
+# tests/test_command_gate.py
+# Command gate (handler group -1) က edit လုပ်ထားတဲ့ command များကိုပါ စစ်ကြောင်း
+
+import asyncio
+
+import pytest
+from telegram import Message, Update
+from telegram.ext import ApplicationHandlerStop
+
+import main
+
+USER_ID = 42
+
+
+def make_command_update(text, edited=False):
+    message = {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Test"},
+        "text": text,
+        "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+    }
+    if edited:
+        message["edit_date"] = 1
+    return Update.de_json({"update_id": 1, ("edited_message" if edited else "message"): message}, None)
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+
+    async def fake_reply_text(self, text, *args, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(Message, "reply_text", fake_reply_text)
+    return sent
+
+
+def test_edited_command_from_unauthorized_user_is_stopped(monkeypatch, replies):
+    monkeypatch.setattr(main, "AUTHORIZED_USERS", set())
+    update = make_command_update("/mmb 123 456 wp1", edited=True)
+
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(main.command_gate(update, None))
+    assert len(replies) == 1
+
+
+def test_edited_command_during_maintenance_is_stopped(monkeypatch, replies):
+    monkeypatch.setattr(main, "AUTHORIZED_USERS", {str(USER_ID)})
+    monkeypatch.setattr(main, "g_settings", {"maintenance": {"orders": False}})
+    update = make_command_update("/pubg 123 60", edited=True)
+
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(main.command_gate(update, None))
+    assert len(replies) == 1
+
+
+def test_gated_handler_filter_ignores_edited_messages():
+    assert not main.GATED_COMMAND_FILTER.check_update(make_command_update("/mmb 123 456 wp1", edited=True))
+    assert main.GATED_COMMAND_FILTER.check_update(make_command_update("/mmb 123 456 wp1"))
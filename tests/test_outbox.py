@@ -0,0 +1,36 @@
+# tests/test_outbox.py
+# Group migrate ဖြစ်ရင် outbox notification ကို ID အသစ်ဖြင့် ပြန်ပို့ကြောင်း (dead-letter မလုပ်)
+
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import ChatMigrated
+
+import main
+
+OLD_GROUP_ID = -100
+NEW_GROUP_ID = -100200
+
+
+def test_chat_migrated_retargets_instead_of_dead_lettering(monkeypatch):
+    calls = []
+
+    async def deliver(bot, doc):
+        raise ChatMigrated(NEW_GROUP_ID)
+
+    async def record(name, *args, **kwargs):
+        calls.append((name, args, kwargs))
+
+    monkeypatch.setattr(main, "_deliver_outbox_message", deliver)
+    monkeypatch.setattr(main, "ADMIN_GROUP_ID", OLD_GROUP_ID)
+    for name in ("retarget_outbox_messages", "fail_outbox_message", "migrate_group"):
+        monkeypatch.setattr(main.adb, name, lambda *a, _name=name, **k: record(_name, *a, **k))
+
+    doc = {"_id": "outbox-1", "chat_id": OLD_GROUP_ID, "admin_group": True}
+    asyncio.run(main._process_outbox_message(SimpleNamespace(bot=None), doc))
+
+    names = [name for name, _, _ in calls]
+    assert ("retarget_outbox_messages", ("outbox-1", OLD_GROUP_ID, NEW_GROUP_ID), {}) in calls
+    assert "fail_outbox_message" not in names
+    assert "migrate_group" in names
+    assert main.ADMIN_GROUP_ID == NEW_GROUP_ID
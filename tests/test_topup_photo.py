@@ -0,0 +1,51 @@
+# tests/test_topup_photo.py
+# Screenshot တင်ရာမှာ DB error ဖြစ်ရင် topup state ပြန်ရကြောင်း
+
+import asyncio
+
+import pytest
+from telegram import Message, Update
+
+import main
+
+USER_ID = 42
+
+
+def make_photo_update():
+    message = {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Test"},
+        "photo": [{"file_id": "photo", "file_unique_id": "photo", "width": 10, "height": 10}],
+    }
+    return Update.de_json({"update_id": 1, "message": message}, None)
+
+
+@pytest.fixture
+def replies(monkeypatch):
+    sent = []
+
+    async def fake_reply_text(self, text, *args, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(Message, "reply_text", fake_reply_text)
+    return sent
+
+
+def test_failed_topup_save_restores_pending_state(monkeypatch, replies):
+    pending = {"amount": 5000, "payment_method": "kpay"}
+    monkeypatch.setattr(main, "AUTHORIZED_USERS", {str(USER_ID)})
+    monkeypatch.setattr(main, "pending_topups", {str(USER_ID): pending})
+    monkeypatch.setattr(main, "user_states", {})
+
+    async def failing_next_id(prefix):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(main.adb, "next_id", failing_next_id)
+
+    asyncio.run(main.handle_photo(make_photo_update(), None))
+
+    assert main.pending_topups == {str(USER_ID): pending}
+    assert str(USER_ID) not in main.user_states
+    assert len(replies) == 1